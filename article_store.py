@@ -0,0 +1,328 @@
+import argparse
+import json
+import mmap
+import os
+
+import numpy as np
+import pandas as pd
+
+from dedup import content_digest
+
+# 每条新闻一条定长记录：日期（int64 纳秒，缺失为 _NAT_KEY）、正文在文本堆中的偏移和字节数、来源编号、(日期, 正文) 的 128 位摘要
+RECORD_DTYPE = np.dtype([('date', '<i8'), ('offset', '<u8'), ('digest_hi', '<u8'), ('digest_lo', '<u8'),
+                         ('length', '<u4'), ('source', '<i2')], align=True)
+# 正文缺失的行：长度记为该值，不占用文本堆
+_MISSING_LENGTH = np.iinfo(np.uint32).max
+_NAT_KEY = np.iinfo(np.int64).max
+_DAY_NS = 86400 * 10 ** 9
+FORMAT_VERSION = 1
+
+HEAP_FILE = 'heap.bin'
+RECORDS_FILE = 'records.bin'
+DAYS_FILE = 'days.npy'
+META_FILE = 'meta.json'
+
+
+def _keys_to_dates(keys):
+    return pd.DatetimeIndex(np.where(keys == _NAT_KEY, np.iinfo(np.int64).min, keys).view('datetime64[ns]'))
+
+
+def _day_starts(keys):
+    """按日索引：第 d 天（自 first_day 起）的记录为 starts[d] ~ starts[d + 1]；记录按日期排列，缺失日期的行在最后"""
+    dated = keys[keys != _NAT_KEY]
+    if not len(dated):
+        return None, np.zeros(1, dtype=np.int64)
+    days = dated // _DAY_NS
+    first_day = int(days[0])
+    starts = np.searchsorted(days, np.arange(first_day, int(days[-1]) + 2), side='left').astype(np.int64)
+    return first_day, starts
+
+
+class ArticleStoreCorpus:
+    """
+    合并结果的文章库形式，供按日期或按编号随机读取（读取见 ArticleStore）：
+    heap.bin 为所有正文（UTF-8）首尾相接的文本堆，records.bin 为定长记录数组，
+    days.npy 为每天第一条记录的编号，meta.json 记录行数、来源文件名和按日索引的起始日期。
+    与 merge.CsvCorpus 接口相同，由 merge.py 逐块写入已按日期排好序的数据。
+    """
+
+    def __init__(self, directory, state=None):
+        self.path = directory
+        self.source_names = []
+        self.rows = 0
+        self.tail_note = ''
+        state = state or {}
+        self.last_key = state.get('last_key')
+        self._bytes = state.get('bytes')
+        self._tail_cut = None
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _total_bytes(self):
+        return sum(os.path.getsize(self._file(name)) for name in (HEAP_FILE, RECORDS_FILE))
+
+    def _read_records(self):
+        size = os.path.getsize(self._file(RECORDS_FILE))
+        if not size:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        return np.memmap(self._file(RECORDS_FILE), dtype=RECORD_DTYPE, mode='r')
+
+    def open_full(self):
+        os.makedirs(self.path, exist_ok=True)
+        for name in (HEAP_FILE, RECORDS_FILE):
+            open(self._file(name), 'wb').close()
+        self.last_key = None
+
+    def tail_blocks(self, min_key, chunk_size=100000):
+        """增量写入：读回日期不早于 min_key 的记录（这些记录将与新数据一起重写），逐批产出 KEY、CONTENT、SOURCE"""
+        self._tail_cut = None
+        if self.last_key is None or min_key >= self.last_key:
+            self.tail_note = '追加到文件末尾'
+            return
+        with open(self._file(META_FILE), encoding='utf-8') as f:
+            stored_sources = json.load(f)['sources']
+        # 记录中的来源编号按本次的来源列表重新编号
+        source_map = np.array([self.source_names.index(name) if name in self.source_names else -1
+                               for name in stored_sources] + [-1], dtype=np.int16)
+        records = self._read_records()
+        cut = int(np.searchsorted(records['date'], min_key, side='left'))
+        self._tail_cut = (cut, int(records['offset'][cut]))
+        cut_key = int(records['date'][cut])
+        self.tail_note = f"重写自第 {cut} 条记录（{'缺失日期' if cut_key == _NAT_KEY else pd.Timestamp(cut_key)}）起的部分"
+        with open(self._file(HEAP_FILE), 'rb') as heap:
+            for start in range(cut, len(records), chunk_size):
+                chunk = np.array(records[start:start + chunk_size])
+                heap.seek(int(chunk['offset'][0]))
+                data = heap.read(int(chunk['offset'][-1]) - int(chunk['offset'][0])
+                                 + int(0 if chunk['length'][-1] == _MISSING_LENGTH else chunk['length'][-1]))
+                base = int(chunk['offset'][0])
+                contents = np.empty(len(chunk), dtype=object)
+                contents[:] = [None if length == _MISSING_LENGTH
+                               else data[offset - base:offset - base + length].decode('utf-8')
+                               for offset, length in zip(chunk['offset'].tolist(), chunk['length'].tolist())]
+                yield pd.DataFrame({'KEY': chunk['date'], 'CONTENT': contents,
+                                    'SOURCE': source_map[chunk['source']]})
+        del records
+
+    def drop_tail(self):
+        """截断 tail_blocks 读回的记录和对应的文本，之后写入的数据会重新生成它们"""
+        if self._tail_cut is not None:
+            cut, heap_offset = self._tail_cut
+            os.truncate(self._file(RECORDS_FILE), cut * RECORD_DTYPE.itemsize)
+            os.truncate(self._file(HEAP_FILE), heap_offset)
+            self._tail_cut = None
+
+    @staticmethod
+    def encode_block(block):
+        """
+        把一块数据编码为要追加的文本和定长记录（offset 暂为块内偏移，写入时再加上文本堆的当前大小）；
+        不依赖写入状态，可以在其他进程中执行，由 write_encoded 按顺序写入
+        """
+        if not len(block):
+            return None
+        keys = block['KEY'].to_numpy()
+        contents = block['CONTENT'].to_numpy()
+        missing = pd.isna(contents)
+        encoded = [b'' if is_missing else str(text).encode('utf-8') for text, is_missing in zip(contents, missing)]
+        lengths = np.fromiter(map(len, encoded), dtype=np.uint64, count=len(encoded))
+
+        records = np.zeros(len(block), dtype=RECORD_DTYPE)
+        records['date'] = keys
+        records['offset'] = np.cumsum(lengths) - lengths
+        records['length'] = np.where(missing, _MISSING_LENGTH, lengths)
+        records['source'] = block['SOURCE'].to_numpy()
+        # 摘要与合并时跨文件去重使用的相同：以“日”为单位的日期和正文
+        digests = content_digest(_keys_to_dates(keys).strftime('%Y-%m-%d').to_numpy(dtype=object), contents)
+        records['digest_hi'] = digests['hi']
+        records['digest_lo'] = digests['lo']
+        return records, b''.join(encoded)
+
+    def write_encoded(self, encoded):
+        if encoded is None:
+            return
+        records, heap = encoded
+        records['offset'] += os.path.getsize(self._file(HEAP_FILE))
+        with open(self._file(HEAP_FILE), 'ab') as f:
+            f.write(heap)
+        with open(self._file(RECORDS_FILE), 'ab') as f:
+            f.write(records.tobytes())
+        self.rows += len(records)
+        self.last_key = int(records['date'][-1])
+
+    def write(self, block):
+        self.write_encoded(self.encode_block(block))
+
+    def close(self):
+        """写入完成后重建按日索引和元数据"""
+        records = self._read_records()
+        first_day, starts = _day_starts(np.asarray(records['date']))
+        rows = len(records)
+        del records
+        np.save(self._file(DAYS_FILE), starts)
+        meta = {'version': FORMAT_VERSION, 'rows': rows, 'sources': list(self.source_names), 'first_day': first_day,
+                'record_dtype': RECORD_DTYPE.descr}
+        tmp_path = self._file(META_FILE) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._file(META_FILE))
+        self._bytes = self._total_bytes()
+
+    def is_valid(self):
+        """文章库是否仍是上次写入后的状态"""
+        return (self._bytes is not None
+                and all(os.path.exists(self._file(name)) for name in (HEAP_FILE, RECORDS_FILE, META_FILE))
+                and self._total_bytes() == self._bytes)
+
+    def state(self):
+        return {'path': self.path, 'bytes': self._bytes, 'last_key': self.last_key}
+
+
+class ArticleView:
+    """文章库中连续的一段记录（例如某一天的所有新闻），正文在访问时才解码"""
+
+    def __init__(self, store, start, stop):
+        self.store = store
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        return self.store[self.start + i % len(self)]
+
+    def __iter__(self):
+        for n in range(self.start, self.stop):
+            yield self.store[n]
+
+    @property
+    def records(self):
+        """这一段的定长记录（内存映射，不复制）"""
+        return self.store.records[self.start:self.stop]
+
+    @property
+    def dates(self):
+        return _keys_to_dates(np.asarray(self.records['date']))
+
+    def raw_texts(self):
+        """
+        范围内的正文在文本堆中首尾相接：返回 (这一段文本堆的 memoryview，不复制；每条正文的起止偏移 int64[n + 1]；正文是否缺失)，
+        可以据此直接构造 Arrow 字符串数组等，不必逐条解码
+        """
+        records = self.records
+        lengths = np.asarray(records['length'])
+        missing = lengths == _MISSING_LENGTH
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        if not len(lengths):
+            return self.store._view[0:0], offsets, missing
+        base = int(records['offset'][0])
+        offsets[:-1] = np.asarray(records['offset']).astype(np.int64) - base
+        offsets[-1] = offsets[-2] + (0 if missing[-1] else int(lengths[-1]))
+        return self.store._view[base:base + int(offsets[-1])], offsets, missing
+
+    def to_frame(self):
+        """解码为 DataFrame（DATE, CONTENT, SOURCE）"""
+        sources = np.array(self.store.sources + [None], dtype=object)
+        return pd.DataFrame({'DATE': self.dates, 'CONTENT': list(self),
+                             'SOURCE': sources[np.asarray(self.records['source'])]})
+
+
+class ArticleStore:
+    """
+    以内存映射方式打开 ArticleStoreCorpus 写出的文章库，打开时不读取文本堆和记录，耗时与语料大小无关。
+    store[n] 返回第 n 条新闻的正文（访问时才解码），store.raw(n) 返回文本堆中的原始字节（memoryview，不复制）；
+    store.on_day(date) 返回某一天的所有新闻。按编号和按日期查找都是 O(1)。
+    """
+
+    def __init__(self, directory):
+        self.path = directory
+        with open(os.path.join(directory, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['version'] != FORMAT_VERSION:
+            raise ValueError(f"不支持的文章库版本: {meta['version']}")
+        self.sources = meta['sources']
+        self.first_day = meta['first_day']
+        self.days = np.load(os.path.join(directory, DAYS_FILE), mmap_mode='r')
+        records_path = os.path.join(directory, RECORDS_FILE)
+        heap_path = os.path.join(directory, HEAP_FILE)
+        self.records = (np.memmap(records_path, dtype=RECORD_DTYPE, mode='r', shape=(meta['rows'],))
+                        if meta['rows'] else np.zeros(0, dtype=RECORD_DTYPE))
+        self._heap_file = open(heap_path, 'rb')
+        self._heap = (mmap.mmap(self._heap_file.fileno(), 0, access=mmap.ACCESS_READ)
+                      if os.path.getsize(heap_path) else b'')
+        self._view = memoryview(self._heap)
+
+    def __len__(self):
+        return len(self.records)
+
+    def raw(self, n):
+        """第 n 条新闻正文的 UTF-8 字节（文本堆的切片，不复制）；正文缺失时返回 None"""
+        record = self.records[n]
+        length = int(record['length'])
+        if length == _MISSING_LENGTH:
+            return None
+        offset = int(record['offset'])
+        return self._view[offset:offset + length]
+
+    def __getitem__(self, n):
+        raw = self.raw(n)
+        return None if raw is None else str(raw, 'utf-8')
+
+    def date(self, n):
+        key = int(self.records[n]['date'])
+        return pd.NaT if key == _NAT_KEY else pd.Timestamp(key)
+
+    def source(self, n):
+        source_id = int(self.records[n]['source'])
+        return self.sources[source_id] if source_id >= 0 else None
+
+    def digest(self, n):
+        record = self.records[n]
+        return int(record['digest_hi']), int(record['digest_lo'])
+
+    def day_range(self, date):
+        """某一天的记录编号范围 (start, stop)；没有这一天的数据时为空范围"""
+        if self.first_day is None:
+            return 0, 0
+        day = pd.Timestamp(date).normalize().value // _DAY_NS - self.first_day
+        if not 0 <= day < len(self.days) - 1:
+            return 0, 0
+        return int(self.days[day]), int(self.days[day + 1])
+
+    def on_day(self, date):
+        """某一天的所有新闻"""
+        return ArticleView(self, *self.day_range(date))
+
+    def close(self):
+        self._view.release()
+        if isinstance(self._heap, mmap.mmap):
+            self._heap.close()
+        self._heap_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='从文章库中按日期或按编号读取新闻')
+    parser.add_argument('directory', help='文章库目录')
+    parser.add_argument('--date', help='显示这一天的所有新闻，如 2020-01-01')
+    parser.add_argument('--index', type=int, help='显示第 N 条新闻')
+    args = parser.parse_args()
+
+    with ArticleStore(args.directory) as store:
+        print(f"文章库共 {len(store)} 条新闻，来源 {len(store.sources)} 个。")
+        if args.index is not None:
+            print(f"[{args.index}] {store.date(args.index)} {store.source(args.index)}")
+            print(store[args.index])
+        if args.date:
+            articles = store.on_day(args.date)
+            print(f"{args.date} 共 {len(articles)} 条新闻。")
+            for n, text in zip(range(articles.start, articles.stop), articles):
+                print(f"[{n}] {store.source(n)}: {text}")
@@ -0,0 +1,164 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+import pipeline_config as config
+import source_cache
+from merge import CsvCorpus, merge_outputs
+from metrics import StageRecorder, append_metrics, new_run_id
+from pipeline import process_source
+from synthetic_data import DEFAULT_WORDS, synthetic_sources
+
+# --- 配置 ---
+# 合成数据、处理结果和列式缓存的存放目录（与真实数据分开）
+bench_dir = '数据/benchmark'
+# 基准测试结果（JSON Lines，与 pipeline_metrics.jsonl 字段相同，另有 size、cache、commit）
+results_file = 'benchmark_results.jsonl'
+# 每个数据源的行数规模
+DEFAULT_SIZES = [10000, 100000, 1000000]
+# 比较两次基准测试时，耗时增加超过该百分比视为退化；基准耗时不足 MIN_SECONDS 秒的步骤误差较大，不参与判断
+REGRESSION_THRESHOLD = 10.0
+MIN_SECONDS = 0.5
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(sizes=None, names=None, batch_size=50000, warm_cache=False, seed=0, mean_words=DEFAULT_WORDS):
+    """
+    在每种规模的合成数据上运行流水线的各步骤（load / dedup / date_parse / title_merge / write），
+    再合并全部数据源的结果（combine），返回各步骤的记录（字段见 metrics.RECORD_FIELDS，另有 size、cache、commit）。
+    warm_cache 为 False 时每次都删除列式缓存，load 步骤测的是解析原始文件的时间；为 True 时测的是读取缓存的时间。
+    """
+    bench_id = new_run_id()
+    commit = _git_commit()
+    data_dir = os.path.join(bench_dir, 'data')
+    source_cache.cache_dir = os.path.join(bench_dir, 'cache')
+    # 合成数据源与真实数据源同名，检查点和模板行统计也放在 bench_dir 中，不覆盖真实数据的同名文件
+    config.checkpoint_dir = os.path.join(bench_dir, 'checkpoints')
+    config.boilerplate_dir = os.path.join(bench_dir, 'boilerplate')
+    records = []
+    for size in sizes or DEFAULT_SIZES:
+        sources = synthetic_sources(size, data_dir, names, seed, mean_words)
+        size_records = []
+        for source in sources:
+            if warm_cache:
+                # 先读一遍生成缓存，计时的一次读取缓存
+                for _ in source_cache.iter_source_batches(source['path'], batch_size=batch_size,
+                                                          **source['read_options']):
+                    pass
+            else:
+                for path in source_cache.cache_paths(source['path']):
+                    if os.path.exists(path):
+                        os.remove(path)
+            print(f"[{size}] 正在处理 {source['name']}...")
+            stats = process_source(source, batch_size, enable_near_dedup=False, run_id=bench_id)
+            if 'error' in stats:
+                print(f"[{size}] 错误：{source['name']} 处理失败：{stats['error']}")
+            size_records.extend(stats.get('stages', []))
+
+        print(f"[{size}] 正在合并 {len(sources)} 个数据源的结果...")
+        recorder = StageRecorder('merge', bench_id)
+        merged_path = os.path.join(bench_dir, f'merged_{size}.csv')
+        index_dir = os.path.join(bench_dir, f'global_digest_index_{size}')
+        with recorder.stage('combine', rows_in=sum(record['rows_out'] for record in size_records
+                                                   if record['stage'] == 'write')) as counts:
+            corpus = merge_outputs([source['output'] for source in sources], {'csv': CsvCorpus(merged_path)},
+                                   log_file_name=os.path.join(bench_dir, 'benchmark_log.txt'),
+                                   global_index_dir=index_dir)
+            counts.update(rows_out=corpus['rows'] if corpus else 0, bytes_written=os.path.getsize(merged_path),
+                          bytes_read=sum(os.path.getsize(source['output']) for source in sources))
+        shutil.rmtree(index_dir, ignore_errors=True)
+        size_records.extend(recorder.records())
+        records.extend({**record, 'size': size, 'cache': 'warm' if warm_cache else 'cold', 'commit': commit}
+                       for record in size_records)
+    return records
+
+
+def load_results(path=None):
+    return pd.read_json(path or results_file, lines=True, dtype={'run_id': str, 'commit': str})
+
+
+def summarize(df, run_id):
+    """一次基准测试中各规模、各步骤的耗时（所有数据源相加）与吞吐量（行/秒，按输入行数计）"""
+    run = df[df['run_id'] == run_id]
+    table = run.groupby(['size', 'stage'], sort=False).agg(
+        wall_seconds=('wall_seconds', 'sum'), cpu_seconds=('cpu_seconds', 'sum'),
+        peak_rss_mb=('peak_rss_mb', 'max'), process_peak_mb=('process_peak_mb', 'max'), rows_in=('rows_in', 'sum'),
+        rows_out=('rows_out', 'sum'))
+    rows = table['rows_in'].where(table['rows_in'] > 0, table['rows_out'])
+    table['rows_per_sec'] = (rows / table['wall_seconds'].replace(0, np.nan)).round(0)
+    return table
+
+
+def compare(df, base_run, new_run, threshold=REGRESSION_THRESHOLD, min_seconds=MIN_SECONDS):
+    """比较两次基准测试中都测过的数据源，change 为耗时的相对变化（%），超过 threshold 的步骤标记为退化"""
+    common = set(df.loc[df['run_id'] == base_run, 'source']) & set(df.loc[df['run_id'] == new_run, 'source'])
+    df = df[df['source'].isin(common)]
+    base, new = summarize(df, base_run), summarize(df, new_run)
+    table = base[['wall_seconds', 'peak_rss_mb']].join(new[['wall_seconds', 'peak_rss_mb']], how='inner',
+                                                      lsuffix='_base', rsuffix='_new')
+    table['change'] = ((table['wall_seconds_new'] / table['wall_seconds_base'] - 1) * 100).round(1)
+    table['regression'] = (table['change'] > threshold) & (table['wall_seconds_base'] >= min_seconds)
+    return table
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='在合成数据上测试流水线各步骤的性能，并与之前的结果比较')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='运行基准测试并保存结果')
+    run_parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help='每个数据源的行数，逗号分隔')
+    run_parser.add_argument('--sources', nargs='*', help='只测试这些数据源，默认为全部')
+    run_parser.add_argument('--batch-size', type=int, default=50000, help='每批处理的行数')
+    run_parser.add_argument('--warm-cache', action='store_true', help='读取列式缓存而不是原始文件')
+    run_parser.add_argument('--seed', type=int, default=0, help='合成数据的随机数种子')
+    run_parser.add_argument('--words', type=int, default=DEFAULT_WORDS, help='合成正文的平均词数')
+    compare_parser = subparsers.add_parser('compare', help='比较两次基准测试（默认为最近两次）')
+    compare_parser.add_argument('runs', nargs='*', help='基准运行编号和新运行编号')
+    compare_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                                help='耗时增加超过该百分比视为退化')
+    subparsers.add_parser('list', help='列出所有基准测试')
+    args = parser.parse_args()
+    pd.set_option('display.width', 200)
+    pd.set_option('display.max_columns', 20)
+    pd.set_option('display.max_rows', 200)
+
+    if args.command == 'run':
+        records = run_benchmark([int(size) for size in args.sizes.split(',')], args.sources, args.batch_size,
+                                args.warm_cache, args.seed, args.words)
+        append_metrics(records, results_file)
+        print(summarize(pd.DataFrame(records), records[0]['run_id']))
+    else:
+        results = load_results()
+        run_ids = list(dict.fromkeys(results['run_id']))
+        if args.command == 'list':
+            for run_id in run_ids:
+                run = results[results['run_id'] == run_id]
+                commit = run['commit'].dropna()
+                print(f"{run_id}  {run['time'].max()}  commit {commit.iloc[0] if len(commit) else '未知'}  "
+                      f"缓存 {run['cache'].iloc[0]}  规模 {sorted(run['size'].unique().tolist())}")
+        elif len(args.runs) != 2 and len(run_ids) < 2:
+            print("错误：至少需要两次基准测试的结果才能比较。")
+        else:
+            base_run, new_run = args.runs if len(args.runs) == 2 else run_ids[-2:]
+            caches = [results.loc[results['run_id'] == run_id, 'cache'].iloc[0] for run_id in (base_run, new_run)]
+            if caches[0] != caches[1]:
+                print(f"注意：两次测试的缓存方式不同（{caches[0]} / {caches[1]}），load 步骤的耗时不可比。")
+            table = compare(results, base_run, new_run, args.threshold)
+            print(f"基准 {base_run} 与 {new_run} 的比较（耗时变化 %）：")
+            print(table)
+            regressions = table[table['regression']]
+            if len(regressions):
+                print(f"有 {len(regressions)} 个步骤的耗时增加超过 {args.threshold}%。")
+                sys.exit(1)
+            print("没有发现性能退化。")
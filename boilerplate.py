@@ -0,0 +1,219 @@
+import itertools
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# 默认参数：
+#   min_count      同一年中至少出现这么多次的行才可能被判为模板行
+#   min_share      同一年中出现次数至少为当年文章数的这个比例（与 min_count 取较大者）
+#   max_line_chars 超过这个长度的行不会被删除（长段落重复出现是整篇重复，交给去重处理）
+#   width / depth  Count-Min Sketch 每行的计数器个数和行数，内存占用为 width * depth * 4 字节，与语料大小无关
+DEFAULT_OPTIONS = {'min_count': 50, 'min_share': 0.002, 'max_line_chars': 300, 'width': 1 << 21, 'depth': 4}
+
+_HASH_KEY = 'news-boilerplate'
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_LOW32 = np.uint64(0xFFFFFFFF)
+
+
+def split_lines(contents):
+    """
+    把一列正文按换行拆成行，返回 (每行所属的行号, 各行原文, 每篇的行数)。
+    缺失或不是字符串的正文没有行。
+    """
+    parts = [text.split('\n') if isinstance(text, str) else [] for text in np.asarray(contents, dtype=object)]
+    counts = np.fromiter(map(len, parts), dtype=np.int64, count=len(parts))
+    lines = np.fromiter(itertools.chain.from_iterable(parts), dtype=object, count=int(counts.sum()))
+    return np.repeat(np.arange(len(parts)), counts), lines, counts
+
+
+def line_keys(lines, row_years, max_line_chars):
+    """
+    各行的计数键（规范化后的行文本与年份一起哈希）以及是否可能是模板行：
+    规范化为去掉首尾空白、转为小写；空行和超过 max_line_chars 的行不参与计数，也不会被删除。
+    """
+    normalized = np.array([line.strip().lower() for line in lines], dtype=object)
+    lengths = np.fromiter(map(len, normalized), dtype=np.int64, count=len(normalized))
+    eligible = (lengths > 0) & (lengths <= max_line_chars)
+    hashes = pd.util.hash_array(normalized, hash_key=_HASH_KEY, categorize=False)
+    with np.errstate(over='ignore'):
+        keys = hashes ^ (np.asarray(row_years, dtype=np.uint64) * _GOLDEN)
+    return keys, eligible
+
+
+class CountMinSketch:
+    """
+    Count-Min Sketch：depth 行、每行 width 个计数器，每个键在每一行中落在一个计数器上（双重哈希定位）。
+    估计值取各行对应计数器的最小值，只会高估不会低估；内存占用固定，与不同键的个数无关。
+    """
+
+    def __init__(self, width, depth, table=None):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.uint32) if table is None else table
+
+    def _positions(self, keys):
+        first = keys & _LOW32
+        step = (keys >> np.uint64(32)) | np.uint64(1)
+        with np.errstate(over='ignore'):
+            for i in range(self.depth):
+                yield i, ((first + np.uint64(i) * step) % np.uint64(self.width)).astype(np.int64)
+
+    def add(self, keys):
+        for i, positions in self._positions(keys):
+            if len(positions) >= self.width // 8:
+                self.table[i] += np.bincount(positions, minlength=self.width).astype(np.uint32)
+            else:
+                # 键比计数器少得多时，只更新用到的计数器，不必生成整行的计数
+                used, counts = np.unique(positions, return_counts=True)
+                self.table[i][used] += counts.astype(np.uint32)
+
+    def estimate(self, keys):
+        result = np.full(len(keys), np.iinfo(np.uint32).max, dtype=np.uint32)
+        for i, positions in self._positions(keys):
+            np.minimum(result, self.table[i][positions], out=result)
+        return result
+
+
+class BoilerplateStripper:
+    """
+    删除正文中反复出现的模板行（版权声明、"Write to ..."、订阅和导航文字等），分两遍完成：
+    1. count：流式读取整个数据源，按年份统计每个规范化行出现的次数（Count-Min Sketch，内存占用固定）；
+    2. strip：逐批删除出现次数达到阈值的行，其余行和换行保持原样；没有模板行的正文不做任何改动。
+    阈值按年份计算：max(min_count, min_share * 当年的文章数)。统计信息见 stats 和 summary()。
+    """
+
+    def __init__(self, **options):
+        self.options = dict(DEFAULT_OPTIONS, **options)
+        self.sketch = CountMinSketch(self.options['width'], self.options['depth'])
+        self.year_docs = {}
+        self.stats = {'docs_counted': 0, 'lines_counted': 0, 'count_seconds': 0.0, 'lines_seen': 0,
+                      'lines_removed': 0, 'rows_changed': 0, 'bytes_removed': 0, 'strip_seconds': 0.0}
+
+    def count(self, contents, years):
+        """第一遍：统计一批正文中各行的出现次数；years 为每篇文章的年份（日期无法解析时为 0）"""
+        start = time.perf_counter()
+        rows, lines, _ = split_lines(contents)
+        years = np.asarray(years, dtype=np.int64)
+        keys, eligible = line_keys(lines, years[rows], self.options['max_line_chars'])
+        self.sketch.add(keys[eligible])
+        present = np.fromiter((isinstance(text, str) for text in np.asarray(contents, dtype=object)),
+                              dtype=bool, count=len(years))
+        for year, docs in zip(*np.unique(years[present], return_counts=True)):
+            self.year_docs[int(year)] = self.year_docs.get(int(year), 0) + int(docs)
+        self.stats['docs_counted'] += int(present.sum())
+        self.stats['lines_counted'] += len(lines)
+        self.stats['count_seconds'] += time.perf_counter() - start
+
+    def _thresholds(self, years):
+        docs = np.array([self.year_docs.get(int(year), 0) for year in years], dtype=np.float64)
+        return np.maximum(self.options['min_count'], np.ceil(self.options['min_share'] * docs))
+
+    def strip(self, contents, years):
+        """第二遍：删除一批正文中的模板行，返回与 contents 对齐的新正文（Series）"""
+        start = time.perf_counter()
+        index = contents.index if isinstance(contents, pd.Series) else None
+        values = np.asarray(contents, dtype=object)
+        rows, lines, counts = split_lines(values)
+        years = np.asarray(years, dtype=np.int64)
+        keys, eligible = line_keys(lines, years[rows], self.options['max_line_chars'])
+        removed = np.zeros(len(lines), dtype=bool)
+        if eligible.any():
+            candidates = np.flatnonzero(eligible)
+            unique_years, year_codes = np.unique(years[rows[candidates]], return_inverse=True)
+            thresholds = self._thresholds(unique_years)[year_codes]
+            removed[candidates] = self.sketch.estimate(keys[candidates]) >= thresholds
+        result = values.copy()
+        changed = np.unique(rows[removed])
+        starts = np.concatenate([[0], np.cumsum(counts)])
+        bytes_removed = 0
+        for row in changed:
+            kept = ~removed[starts[row]:starts[row + 1]]
+            text = '\n'.join(lines[starts[row]:starts[row + 1]][kept])
+            bytes_removed += len(values[row].encode('utf-8')) - len(text.encode('utf-8'))
+            result[row] = text
+        self.stats['lines_seen'] += len(lines)
+        self.stats['lines_removed'] += int(removed.sum())
+        self.stats['rows_changed'] += len(changed)
+        self.stats['bytes_removed'] += bytes_removed
+        self.stats['strip_seconds'] += time.perf_counter() - start
+        return pd.Series(result, index=index, dtype=object)
+
+    def summary(self):
+        """用于打印和写入日志的统计"""
+        stats = self.stats
+        count_rate = stats['lines_counted'] / stats['count_seconds'] if stats['count_seconds'] else 0
+        strip_rate = stats['lines_seen'] / stats['strip_seconds'] if stats['strip_seconds'] else 0
+        return (f"模板行删除: {stats['lines_removed']} 行（涉及 {stats['rows_changed']} 篇文章），"
+                f"删除 {stats['bytes_removed'] / 1024 / 1024:.2f} MB；"
+                f"统计 {stats['lines_counted']} 行（{count_rate:.0f} 行/秒），删除时处理 {stats['lines_seen']} 行"
+                f"（{strip_rate:.0f} 行/秒）")
+
+    def top_lines(self, contents, years, limit=20):
+        """一批正文中会被删除的行及其估计的出现次数（去掉重复），按次数从多到少排列，用于检查阈值"""
+        rows, lines, _ = split_lines(contents)
+        years = np.asarray(years, dtype=np.int64)[rows]
+        keys, eligible = line_keys(lines, years, self.options['max_line_chars'])
+        estimates = self.sketch.estimate(keys)
+        hit = eligible & (estimates >= self._thresholds(years))
+        found = pd.DataFrame({'year': years[hit], 'line': lines[hit], 'count': estimates[hit]})
+        found['line'] = found['line'].str.strip()
+        return found.drop_duplicates(['year', 'line']).sort_values('count', ascending=False).head(limit)
+
+    def save(self, path, meta):
+        """把统计结果（和 meta，如输入文件的指纹）保存为 .npz，之后的运行可以直接加载，不必重新统计"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        header = dict(meta, options=self.options, year_docs=self.year_docs, stats=self.stats)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, table=self.sketch.table, meta=np.array(json.dumps(header, ensure_ascii=False)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """读取 save 保存的统计结果，返回 (BoilerplateStripper, meta)；文件不存在或已损坏时返回 (None, None)"""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                meta = json.loads(str(data['meta']))
+                stripper = cls(**meta['options'])
+                stripper.sketch.table = data['table']
+        except (FileNotFoundError, ValueError, KeyError, OSError):
+            return None, None
+        stripper.year_docs = {int(year): docs for year, docs in meta['year_docs'].items()}
+        for key in ('docs_counted', 'lines_counted', 'count_seconds'):
+            stripper.stats[key] = meta['stats'][key]
+        return stripper, meta
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("用法: python boilerplate.py <数据源名称> [显示条数]")
+        sys.exit(1)
+    import pipeline_config as config
+    from date_normalizer import DateNormalizer
+    from source_cache import iter_source_batches
+
+    by_name = {source['name']: source for source in config.SOURCES}
+    if sys.argv[1] not in by_name:
+        print(f"错误：未知的数据源 {sys.argv[1]}，可选: {list(by_name)}")
+        sys.exit(1)
+    source = by_name[sys.argv[1]]
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    date_col, content_col = source['columns']['date'], source['columns']['content']
+    normalizer = DateNormalizer(source['date_formats'])
+    stripper = BoilerplateStripper(**config.boilerplate_options)
+
+    def batches():
+        for df in iter_source_batches(source['path'], batch_size=config.batch_size, **source['read_options']):
+            yield df, normalizer.parse(df[date_col]).dates.dt.year.fillna(0).astype(int).to_numpy()
+
+    for df, years in batches():
+        stripper.count(df[content_col], years)
+    found = pd.concat([stripper.top_lines(df[content_col], years, limit) for df, years in batches()])
+    found = found.drop_duplicates(['year', 'line']).sort_values('count', ascending=False).head(limit)
+    print(f"统计了 {stripper.stats['docs_counted']} 篇文章、{stripper.stats['lines_counted']} 行，"
+          f"出现次数最多的模板行（年份、估计次数）：")
+    for year, line, count in found.itertuples(index=False):
+        print(f"  {year}  {count:>8}  {line[:100]}")
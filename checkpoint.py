@@ -0,0 +1,246 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+
+from source_cache import decode_column, encode_column, file_digest, pa
+
+# 检查点格式版本，修改编码方式时递增，使旧检查点自动失效
+CHECKPOINT_VERSION = 1
+# 每个数据源依次执行的步骤（读取由 source_cache.py 的列式缓存负责）
+SOURCE_STAGES = ['dedup', 'date_parse', 'write']
+# 全部数据源处理完成之后执行的步骤
+CORPUS_STAGES = ['merge', 'clean', 'index', 'export']
+# --from-stage 可以指定的步骤，按执行顺序排列
+STAGES = SOURCE_STAGES + CORPUS_STAGES
+# 数据检查点（Arrow IPC 文件）的压缩方式，lz4 的压缩和解压都很快；不可用时不压缩
+COMPRESSION = 'lz4'
+
+
+def fingerprint(*parts):
+    """输入与参数的指纹：parts 为可以序列化为 JSON 的取值，其中任何一项变化时指纹都会变化"""
+    text = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def source_fingerprints(source, near_dedup_options=None, row_filter=None, boilerplate_options=None):
+    """
+    数据源各步骤输出的指纹。每一步的指纹包含前一步的指纹和本步骤用到的配置，
+    例如修改了日期格式时 date_parse 和 write 失效，dedup 的检查点仍然可以使用。
+    原始文件的内容不计入指纹，由检查点中记录的文件大小、修改时间和内容哈希另外判断。
+    near_dedup_options 为启用近似重复检测时的参数（未启用时为 None）；
+    row_filter 为只处理部分数据时的筛选条件（row_filter.RowFilter.spec()，不筛选时为 None，指纹与原来相同）；
+    boilerplate_options 为去重前删除模板行时的参数（见 boilerplate.py，未启用时为 None）。
+    """
+    dedup = fingerprint(CHECKPOINT_VERSION, source['path'], source['read_options'], source['columns'],
+                        *([row_filter] if row_filter else []),
+                        *([{'boilerplate': boilerplate_options, 'date_formats': source['date_formats']}]
+                          if boilerplate_options else []))
+    date_parse = fingerprint(dedup, source['date_formats'])
+    write = fingerprint(date_parse, source['output'], near_dedup_options)
+    return {'dedup': dedup, 'date_parse': date_parse, 'write': write}
+
+
+def file_state(path, with_hash=False):
+    """文件的大小和修改时间（with_hash 为 True 时还有内容哈希），用于判断检查点的输入或输出是否变化"""
+    stat = os.stat(path)
+    state = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if with_hash:
+        state['content_hash'] = file_digest(path)
+    return state
+
+
+def file_unchanged(path, state):
+    """
+    文件是否仍是 state 记录的状态。与列式缓存相同：大小一致且修改时间未变时认为未变化，
+    修改时间变化时再比较内容哈希（state 中没有内容哈希时视为已变化）。
+    """
+    if state is None or not os.path.exists(path):
+        return False
+    stat = os.stat(path)
+    if stat.st_size != state['size']:
+        return False
+    if stat.st_mtime_ns == state['mtime_ns']:
+        return True
+    return 'content_hash' in state and file_digest(path) == state['content_hash']
+
+
+class CheckpointWriter:
+    """
+    逐批写出一个步骤的输出数据：日期列（date_column）按原生时间戳保存，其余列与列式缓存相同，连同取值类型一起保存。
+    先写入临时文件，finish 时才改为正式文件名；discard 删除临时文件。
+    """
+
+    def __init__(self, path, date_column=None):
+        self.path = path
+        self.date_column = date_column
+        self.columns = None
+        self.rows = 0
+        self._tmp_path = path + '.tmp'
+        self._writer = None
+
+    def _encode(self, df):
+        arrays, names = [], []
+        for i, column in enumerate(df.columns):
+            values = df[column]
+            if column == self.date_column:
+                arrays.append(pa.array(values.to_numpy(), from_pandas=True))
+                names.append(f'{i}')
+            else:
+                strings, codes = encode_column(values.to_numpy(dtype=object))
+                arrays.extend([strings, codes])
+                names.extend([f'{i}', f'{i}.type'])
+        return pa.RecordBatch.from_arrays(arrays, names=names)
+
+    def write(self, df):
+        batch = self._encode(df)
+        if self._writer is None:
+            self.columns = list(df.columns)
+            compression = COMPRESSION if pa.Codec.is_available(COMPRESSION) else None
+            self._writer = pa.ipc.new_file(self._tmp_path, batch.schema,
+                                           options=pa.ipc.IpcWriteOptions(compression=compression))
+        self._writer.write_batch(batch)
+        self.rows += len(df)
+
+    def finish(self):
+        if self._writer is None:
+            # 没有任何数据：写一个只有表结构的空文件
+            self._writer = pa.ipc.new_file(self._tmp_path, pa.schema([]))
+            self.columns = []
+        self._writer.close()
+        os.replace(self._tmp_path, self.path)
+
+    def discard(self):
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+class CheckpointStore:
+    """
+    流水线各步骤的检查点，保存在 directory 下：
+    - <键>.json 为元数据：步骤输出的指纹、输入文件的状态、到该步骤为止的统计信息等；
+    - 数据检查点另有 <键>.arrow（Arrow IPC），保存该步骤输出的全部行，恢复时内存映射读取。
+    数据源的步骤以 '数据源名称.步骤' 为键（如 '1984-2000.date_parse'），合并、清理以步骤名为键。
+    元数据在数据完整写出之后才保存，中途失败不会留下看似有效的检查点。
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, f'{key}.{suffix}')
+
+    def data_path(self, key):
+        return self._path(key, 'arrow')
+
+    def load(self, key):
+        try:
+            with open(self._path(key, 'json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save(self, key, meta):
+        os.makedirs(self.directory, exist_ok=True)
+        meta = dict(meta, version=CHECKPOINT_VERSION, created=time.strftime("%Y-%m-%d %H:%M:%S"))
+        tmp_path = self._path(key, 'json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._path(key, 'json'))
+
+    def update(self, key, **values):
+        """修改已有元数据中的字段（检查点不存在时什么也不做）"""
+        meta = self.load(key)
+        if meta is not None:
+            meta.update(values)
+            self.save(key, meta)
+
+    def remove(self, key):
+        for path in (self._path(key, 'json'), self.data_path(key)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def valid(self, key, fingerprint_value, input_path=None, output_path=None):
+        """
+        检查点仍然有效时返回元数据，否则返回 None：
+        版本和指纹必须一致；数据检查点的数据文件必须存在；
+        给出 input_path / output_path 时，输入文件内容和输出文件都必须与保存检查点时相同。
+        """
+        meta = self.load(key)
+        if meta is None or meta.get('version') != CHECKPOINT_VERSION or meta.get('fingerprint') != fingerprint_value:
+            return None
+        if meta.get('columns') is not None and not os.path.exists(self.data_path(key)):
+            return None
+        if input_path is not None and not file_unchanged(input_path, meta.get('input')):
+            return None
+        if output_path is not None and not file_unchanged(output_path, meta.get('output')):
+            return None
+        return meta
+
+    def writer(self, key, date_column=None):
+        os.makedirs(self.directory, exist_ok=True)
+        return CheckpointWriter(self.data_path(key), date_column)
+
+    def iter_batches(self, key, batch_size):
+        """内存映射读取数据检查点，按 batch_size 切分后逐批还原为 DataFrame（列名、取值类型与保存时相同）"""
+        meta = self.load(key)
+        columns = meta['columns']
+        with pa.memory_map(self.data_path(key), 'r') as source:
+            table = pa.ipc.open_file(source).read_all()
+            for batch in table.to_batches(max_chunksize=batch_size):
+                data = {}
+                for i, column in enumerate(columns):
+                    values = batch.column(f'{i}')
+                    if f'{i}.type' in batch.schema.names:
+                        data[column] = pd.Series(decode_column(values, batch.column(f'{i}.type')), dtype=object)
+                    else:
+                        data[column] = pd.Series(values.to_numpy(zero_copy_only=False))
+                yield pd.DataFrame(data, columns=columns)
+
+    def entries(self):
+        """全部检查点的元数据，按键排序"""
+        if not os.path.isdir(self.directory):
+            return {}
+        keys = sorted(name[:-len('.json')] for name in os.listdir(self.directory) if name.endswith('.json'))
+        return {key: self.load(key) for key in keys}
+
+    def size(self, key):
+        path = self.data_path(key)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def stage_arguments(parser):
+    """为命令行加上 --resume / --from-stage 两个选项"""
+    parser.add_argument('--resume', action='store_true',
+                        help='跳过检查点仍然有效（输入文件和参数都没有变化）的步骤，从最后一个有效的检查点继续')
+    parser.add_argument('--from-stage', choices=STAGES, default=None,
+                        help='从指定步骤开始重新运行，之前的步骤使用检查点（无效时照常运行），之后的步骤全部重新运行')
+    return parser
+
+
+if __name__ == '__main__':
+    import pipeline_config as config
+
+    parser = argparse.ArgumentParser(description='查看或清除流水线的检查点')
+    parser.add_argument('--clear', action='store_true', help='删除全部检查点')
+    args = parser.parse_args()
+    store = CheckpointStore(config.checkpoint_dir)
+    entries = store.entries()
+    if args.clear:
+        for key in entries:
+            store.remove(key)
+        print(f"已删除 {len(entries)} 个检查点。")
+    elif not entries:
+        print(f"{config.checkpoint_dir} 中没有检查点。")
+    else:
+        for key, meta in entries.items():
+            meta = meta or {}
+            rows = meta.get('rows')
+            size = store.size(key)
+            details = f"{rows} 行，{size / 1024 / 1024:.1f} MB" if meta.get('columns') is not None else '只记录指纹'
+            print(f"{key:<32} {meta.get('created', '?')}  {details}")
@@ -0,0 +1,162 @@
+import csv
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from xlsx_stream import DEFAULT_BATCH_SIZE, NA_STRINGS
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # 未安装 pyarrow 时由调用方退回到 pd.read_csv
+    pa = None
+
+# 每次交给解析线程的原始数据块大小（字节）。各块由多个线程同时解析，块越大每次并行处理的数据越多；
+# 带引号的多行正文可能跨越块的边界，读取器会先按引号找到完整的行再切块
+DEFAULT_BLOCK_SIZE = 16 * 1024 * 1024
+
+
+def _to_frame(table, columns):
+    """Arrow 表转为 object 列的 DataFrame，缺失值为 NaN（与 pd.read_csv(dtype=str) 相同）"""
+    data = {}
+    for name, column in zip(columns, table.columns):
+        values = column.to_numpy(zero_copy_only=False).astype(object, copy=False)
+        if column.null_count:
+            values[column.is_null().to_numpy(zero_copy_only=False)] = np.nan
+        data[name] = values
+    return pd.DataFrame(data, columns=columns, dtype=object)
+
+
+def iter_csv_batches(path, names=None, header=False, encoding='utf-8', delimiter=',', quotechar='"',
+                     batch_size=DEFAULT_BATCH_SIZE, block_size=DEFAULT_BLOCK_SIZE, use_threads=True, stats=None):
+    """
+    用 pyarrow 的流式 CSV 读取器分批读取 CSV 文件，每凑满 batch_size 行产出一个 DataFrame（object 列）。
+    - 原始数据按 block_size 分块，由多个线程同时解析；读取时把 encoding（如 'latin-1'）转码为 UTF-8；
+    - 带引号的字段中可以有换行和分隔符（多行正文），两个连续的引号表示引号本身；
+    - 所有列按字符串读取，NA_STRINGS 中的取值（含空字段）为缺失值，与 pd.read_csv(dtype=str) 的结果相同；
+    - header 为 False 时没有表头，列名为 names（未给出时为 0, 1, 2...）；header 为 True 时第一行为列名。
+    字段比其他行少的行与 pd.read_csv 相同，缺少的字段为缺失值：pyarrow 无法补齐这样的行，遇到时从尚未产出的行起
+    改用 csv 模块逐行读完整个文件（见 _read_rest_with_csv）。字段比其他行多的行会被跳过并计数。
+    stats 为字典时，读取过程中在其中记录行数、耗时和吞吐量，读完后记录跳过的行数（invalid_rows）。
+    """
+    if pa is None:
+        raise ImportError("多线程读取 CSV 需要安装 pyarrow")
+    stats = {} if stats is None else stats
+    stats.update(path=path, rows=0, invalid_rows=0, seconds=0.0, rows_per_sec=None)
+    long_rows, short_rows = [], []
+
+    def skip_invalid(row):
+        # 在解析线程中调用，只能跳过或报错。字段不足的行先记下，由产出批次的循环改用 csv 模块读取
+        (short_rows if row.actual_columns < row.expected_columns else long_rows).append(row.text)
+        return 'skip'
+
+    read_options = pa_csv.ReadOptions(use_threads=use_threads, block_size=block_size, encoding=encoding,
+                                      column_names=None if header else names,
+                                      autogenerate_column_names=not header and names is None)
+    def parse_options(handler):
+        return pa_csv.ParseOptions(delimiter=delimiter, quote_char=quotechar, double_quote=True,
+                                   newlines_in_values=True, invalid_row_handler=handler)
+
+    null_options = {'null_values': sorted(NA_STRINGS), 'strings_can_be_null': True}
+    start = time.perf_counter()
+    field_names = names
+    if header or names is None:
+        # 列名来自表头或自动生成（f0, f1...），先解析第一块得到列名
+        probe = pa_csv.open_csv(path, read_options=read_options, parse_options=parse_options(lambda row: 'skip'),
+                                convert_options=pa_csv.ConvertOptions(**null_options))
+        field_names = probe.schema.names
+        probe.close()
+    columns = list(field_names) if header or names is not None else list(range(len(field_names)))
+    # 所有列都按字符串解析，不做类型推断（与 dtype=str 相同）
+    reader = pa_csv.open_csv(path, read_options=read_options, parse_options=parse_options(skip_invalid),
+                             convert_options=pa_csv.ConvertOptions(
+                                 column_types={name: pa.large_string() for name in field_names}, **null_options))
+    pending, pending_rows = [], 0
+    try:
+        for batch in reader:
+            if short_rows:
+                # 这一批和尚未产出的行中可能有字段不足的行被跳过了，全部丢弃后改用 csv 模块读取
+                break
+            if not batch.num_rows:
+                continue
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            while pending_rows >= batch_size:
+                table = pa.Table.from_batches(pending)
+                rest = table.slice(batch_size)
+                pending, pending_rows = rest.to_batches(), rest.num_rows
+                stats['rows'] += batch_size
+                yield _to_frame(table.slice(0, batch_size), columns)
+        if short_rows:
+            reader.close()
+            print(f"注意：'{path}' 中有字段数不足的行（如 {short_rows[0][:40]!r}），"
+                  f"从第 {stats['rows'] + 1} 条记录起改用 csv 模块逐行读取，缺少的字段为缺失值。")
+            invalid_examples = []
+            yield from _read_rest_with_csv(path, columns, header, encoding, delimiter, quotechar, batch_size, stats,
+                                           invalid_examples)
+        else:
+            if pending_rows:
+                stats['rows'] += pending_rows
+                yield _to_frame(pa.Table.from_batches(pending), columns)
+            stats['invalid_rows'] = len(long_rows)
+            invalid_examples = [repr(text[:40]) for text in long_rows[:5]]
+    finally:
+        reader.close()
+        stats['seconds'] = round(time.perf_counter() - start, 2)
+        stats['rows_per_sec'] = round(stats['rows'] / stats['seconds']) if stats['seconds'] else None
+    if stats['invalid_rows']:
+        print(f"注意：'{path}' 中有 {stats['invalid_rows']} 行的字段比其他行多，已跳过"
+              f"（如 {', '.join(invalid_examples)}）。")
+
+
+def _read_rest_with_csv(path, columns, header, encoding, delimiter, quotechar, batch_size, stats, invalid_examples):
+    """
+    用 csv 模块逐行读取整个文件，跳过已经产出的前 stats['rows'] 行，其余的行每 batch_size 行产出一个 DataFrame。
+    与 pd.read_csv 相同，空行忽略，字段不足的行补为缺失值，NA_STRINGS 中的取值为缺失值；
+    字段比 columns 多的行跳过，并重新统计整个文件中这样的行数（不受批次边界影响）。
+    """
+    # 默认的单个字段长度上限（128KB）对长篇正文不够
+    csv.field_size_limit(2 ** 31 - 1)
+    width = len(columns)
+    skip_rows = stats['rows']
+    buffer = []
+    with open(path, encoding=encoding, newline='') as f:
+        reader = csv.reader(f, delimiter=delimiter, quotechar=quotechar, doublequote=True)
+        if header:
+            next(reader, None)
+        for fields in reader:
+            if not fields:
+                continue
+            if len(fields) > width:
+                stats['invalid_rows'] += 1
+                if len(invalid_examples) < 5:
+                    invalid_examples.append(f"第 {reader.line_num} 行")
+                continue
+            if skip_rows:
+                skip_rows -= 1
+                continue
+            buffer.append([np.nan if value in NA_STRINGS else value for value in fields]
+                          + [np.nan] * (width - len(fields)))
+            if len(buffer) >= batch_size:
+                stats['rows'] += len(buffer)
+                yield pd.DataFrame(buffer, columns=columns, dtype=object)
+                buffer = []
+    if buffer:
+        stats['rows'] += len(buffer)
+        yield pd.DataFrame(buffer, columns=columns, dtype=object)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("用法: python csv_stream.py <csv 文件路径> [编码] [每批行数]")
+        sys.exit(1)
+    csv_path = sys.argv[1]
+    csv_encoding = sys.argv[2] if len(sys.argv) > 2 else 'utf-8'
+    size = int(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_BATCH_SIZE
+    read_stats = {}
+    for batch_number, batch in enumerate(iter_csv_batches(csv_path, encoding=csv_encoding, batch_size=size,
+                                                          stats=read_stats), start=1):
+        print(f"第 {batch_number} 批: {len(batch)} 行，累计 {read_stats['rows']} 行")
+    print(f"读取完成，共 {read_stats['rows']} 行，耗时 {read_stats['seconds']} 秒（{read_stats['rows_per_sec']} 行/秒）。")
@@ -0,0 +1,204 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from article_store import META_FILE as STORE_META_FILE
+from article_store import ArticleStore, ArticleView
+from parquet_corpus import pa, read_corpus_table
+
+if pa is not None:
+    import pyarrow.compute as pc
+
+# 可选的时间窗：日、周（周一为第一天）、月
+FREQUENCIES = {'D': '日', 'W': '周', 'M': '月'}
+# 与原脚本中 join_text 相同，同一时间窗内的新闻以空行分隔
+DEFAULT_SEPARATOR = '\n\n'
+_NAT_KEY = np.iinfo(np.int64).max
+
+
+def window_starts(keys, freq='D'):
+    """每个排序键（int64 纳秒，缺失为 _NAT_KEY）所在时间窗的第一天（datetime64[D]），缺失日期为 NaT"""
+    days = np.where(keys == _NAT_KEY, np.iinfo(np.int64).min, keys).view('datetime64[ns]').astype('datetime64[D]')
+    if freq == 'W':
+        # 1970-01-01 是周四，(天数 + 3) % 7 为距本周一的天数
+        numbers = days.view(np.int64)
+        days = np.where(np.isnat(days), days, (numbers - (numbers + 3) % 7).view('datetime64[D]'))
+    elif freq == 'M':
+        days = days.astype('datetime64[M]').astype('datetime64[D]')
+    return days
+
+
+def _window_last_day(start, freq):
+    """从 start 开始的时间窗的最后一天"""
+    if freq == 'W':
+        return start + np.timedelta64(6, 'D')
+    if freq == 'M':
+        return (start.astype('datetime64[M]') + 1).astype('datetime64[D]') - np.timedelta64(1, 'D')
+    return start
+
+
+def join_windows(keys, texts, freq='D', separator=DEFAULT_SEPARATOR):
+    """
+    把逐篇的正文按时间窗拼接成文档，结果与 df.groupby(df['DATE'].dt.date)['CONTENT'].apply(join_text) 相同
+    （缺失日期和缺失正文的行不计入，原来的 join_text 会把缺失的正文写成 'nan'）。
+    keys 为排序键，texts 为同样长度的 Arrow 字符串数组。先按日期稳定排序（合并结果已按日期排列时不需要排序），
+    再以各时间窗的起止位置为偏移构造列表数组，由 pyarrow 的 binary_join 一次拼接出所有文档，不在 Python 中逐组调用函数。
+    返回 DataFrame：DATE（时间窗的第一天）、CONTENT、COUNT（新闻条数）
+    """
+    keys = np.asarray(keys)
+    if isinstance(texts, pa.ChunkedArray):
+        texts = texts.combine_chunks()
+    valid = keys != _NAT_KEY
+    if texts.null_count:
+        valid &= texts.is_valid().to_numpy(zero_copy_only=False)
+    if not valid.all():
+        keys, texts = keys[valid], texts.filter(pa.array(valid))
+    if len(keys) > 1 and (keys[1:] < keys[:-1]).any():
+        order = np.argsort(keys, kind='stable')
+        keys, texts = keys[order], texts.take(pa.array(order))
+    windows = window_starts(keys, freq)
+    starts = np.flatnonzero(np.r_[True, windows[1:] != windows[:-1]]) if len(windows) else np.zeros(0, np.int64)
+    offsets = np.r_[starts, len(windows)].astype(np.int64)
+    lists = pa.LargeListArray.from_arrays(pa.array(offsets, pa.int64()), texts)
+    documents = pc.binary_join(lists, pa.scalar(separator, texts.type))
+    return pd.DataFrame({'DATE': pd.DatetimeIndex(windows[starts].astype('datetime64[ns]')),
+                         'CONTENT': pd.Series(documents.to_numpy(zero_copy_only=False), dtype=object),
+                         'COUNT': np.diff(offsets)})
+
+
+def _store_texts(view):
+    """文章库中一段记录的正文：直接以文本堆为数据缓冲区构造 Arrow 字符串数组（不复制、不逐条解码），去掉缺失的正文"""
+    heap, offsets, missing = view.raw_texts()
+    texts = pa.Array.from_buffers(pa.large_string(), len(offsets) - 1, [None, pa.py_buffer(offsets), pa.py_buffer(heap)])
+    return texts.filter(pa.array(~missing)) if missing.any() else texts, missing
+
+
+class WindowView:
+    """
+    在逐篇的合并结果（Parquet 数据集或文章库目录）上按日 / 周 / 月拼接文档的视图，用于需要“每天一篇文档”的模型，
+    替代原脚本中注释掉的 groupby(df['DATE'].dt.date)['CONTENT'].apply(join_text)。
+    打开时只读取日期，得到各时间窗及其新闻条数（windows）；访问某个时间窗时才读取其中的正文并拼接，不另外保存一份按日合并的数据。
+    view['2020-01-03'] 返回包含这一天的时间窗的文档，view.to_frame(start, end) 返回与 [start, end] 相交的各时间窗，
+    for date, text in view 依次产出所有时间窗（每次读取约 batch_rows 条新闻）。
+    """
+
+    def __init__(self, path, freq='D', separator=DEFAULT_SEPARATOR):
+        if freq not in FREQUENCIES:
+            raise ValueError(f"不支持的时间窗: {freq}（可选 {', '.join(FREQUENCIES)}）")
+        if pa is None:
+            raise ImportError("按时间窗拼接文档需要安装 pyarrow")
+        self.path = path
+        self.freq = freq
+        self.separator = separator
+        if os.path.exists(os.path.join(path, STORE_META_FILE)):
+            self._store = ArticleStore(path)
+            # 文章库按日期排列，缺失日期的记录在最后；时间窗的起止位置即记录编号
+            keys = np.asarray(self._store.records['date'])
+            keys = keys[:np.searchsorted(keys, _NAT_KEY)]
+        else:
+            self._store = None
+            dates = read_corpus_table(path, columns=['DATE']).column('DATE').to_numpy()
+            keys = np.sort(dates[~np.isnat(dates)].view(np.int64))
+        days = window_starts(keys, freq)
+        starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]]) if len(days) else np.zeros(0, np.int64)
+        self._bounds = np.r_[starts, len(days)]
+        self._days = days[starts]
+        # 各时间窗的第一天和新闻条数
+        self.windows = pd.DataFrame({'DATE': pd.DatetimeIndex(self._days.astype('datetime64[ns]')),
+                                     'COUNT': np.diff(self._bounds)})
+
+    def __len__(self):
+        return len(self._days)
+
+    def _window_range(self, start=None, end=None):
+        """与 [start, end] 相交的时间窗编号范围 [first, last)"""
+        first, last = 0, len(self._days)
+        if start is not None:
+            day = window_starts(np.array([pd.Timestamp(start).value]), self.freq)[0]
+            first = int(np.searchsorted(self._days, day, side='left'))
+        if end is not None:
+            day = window_starts(np.array([pd.Timestamp(end).value]), self.freq)[0]
+            last = int(np.searchsorted(self._days, day, side='right'))
+        return first, max(first, last)
+
+    def _join(self, first, last):
+        """读取第 first ~ last - 1 个时间窗中的正文并拼接"""
+        if first >= last:
+            return join_windows(np.zeros(0, np.int64), pa.array([], pa.large_string()), self.freq, self.separator)
+        if self._store is not None:
+            view = ArticleView(self._store, int(self._bounds[first]), int(self._bounds[last]))
+            texts, missing = _store_texts(view)
+            keys = np.asarray(view.records['date'])[~missing]
+        else:
+            table = read_corpus_table(self.path, start=pd.Timestamp(self._days[first]),
+                                      end=pd.Timestamp(_window_last_day(self._days[last - 1], self.freq)),
+                                      columns=['DATE', 'CONTENT'])
+            dates = table.column('DATE').to_numpy()
+            keys = np.where(np.isnat(dates), _NAT_KEY, dates.view(np.int64))
+            texts = table.column('CONTENT')
+        return join_windows(keys, texts, self.freq, self.separator)
+
+    def __getitem__(self, date):
+        first, last = self._window_range(date, date)
+        if first == last:
+            raise KeyError(f"{date} 所在的时间窗（按{FREQUENCIES[self.freq]}）没有新闻")
+        return self._join(first, last)['CONTENT'].iloc[0]
+
+    def to_frame(self, start=None, end=None):
+        """与 [start, end] 相交的各时间窗的文档（包含时间窗中的全部新闻），DataFrame：DATE、CONTENT、COUNT"""
+        return self._join(*self._window_range(start, end))
+
+    def iter_frames(self, start=None, end=None, batch_rows=200000):
+        """分批产出与 [start, end] 相交的时间窗，每批约 batch_rows 条新闻（至少一个时间窗），内存占用与语料大小无关"""
+        first, last = self._window_range(start, end)
+        while first < last:
+            stop = int(np.searchsorted(self._bounds, self._bounds[first] + batch_rows, side='right')) - 1
+            stop = min(max(stop, first + 1), last)
+            yield self._join(first, stop)
+            first = stop
+
+    def __iter__(self):
+        for frame in self.iter_frames():
+            yield from zip(frame['DATE'], frame['CONTENT'])
+
+    def close(self):
+        if self._store is not None:
+            self._store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='按日 / 周 / 月拼接合并结果中的新闻（访问时才拼接，不另外保存）')
+    parser.add_argument('path', help='合并结果的 Parquet 数据集或文章库目录')
+    parser.add_argument('--freq', default='D', choices=list(FREQUENCIES), help='时间窗：D 日，W 周，M 月')
+    parser.add_argument('--date', help='显示包含这一天的时间窗的文档')
+    parser.add_argument('--start', help='起始日期（含）')
+    parser.add_argument('--end', help='结束日期（含当天）')
+    parser.add_argument('--output', help='将 [start, end] 内各时间窗的文档保存为 CSV（utf-8-sig）；不指定时只显示各时间窗的条数')
+    args = parser.parse_args()
+
+    with WindowView(args.path, args.freq) as view:
+        print(f"共 {len(view)} 个时间窗（按{FREQUENCIES[args.freq]}），{int(view.windows['COUNT'].sum())} 条新闻。")
+        if args.date:
+            try:
+                print(view[args.date])
+            except KeyError as e:
+                print(f"错误：{e.args[0]}")
+        elif args.output:
+            rows = 0
+            for i, frame in enumerate(view.iter_frames(args.start, args.end)):
+                frame[['DATE', 'CONTENT']].to_csv(args.output, mode='w' if i == 0 else 'a', header=i == 0,
+                                                  index=False, encoding='utf-8-sig' if i == 0 else 'utf-8')
+                rows += len(frame)
+            print(f"{rows} 个时间窗的文档已保存到 {args.output}。")
+        else:
+            first, last = view._window_range(args.start, args.end)
+            pd.set_option('display.max_rows', 100)
+            print(view.windows.iloc[first:last].to_string(index=False))
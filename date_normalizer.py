@@ -0,0 +1,121 @@
+import datetime
+import re
+from collections import Counter, namedtuple
+
+import numpy as np
+import pandas as pd
+
+# 特殊格式：交给 pandas 按“日在前”的规则逐个推断（即原来的 dayfirst=True）
+DAYFIRST = 'dayfirst'
+# 已经是日期对象的取值（例如 Excel 中的日期单元格）直接使用，计入该类别
+DATETIME_VALUE = 'datetime'
+
+# strptime 指令对应的正则，用于在调用 pd.to_datetime 之前快速识别每个字符串可能属于哪种格式
+_DIRECTIVE_PATTERNS = {
+    'Y': r'\d{4}', 'y': r'\d{2}', 'm': r'\d{1,2}', 'd': r'\d{1,2}',
+    'H': r'\d{1,2}', 'M': r'\d{1,2}', 'S': r'\d{1,2}', 'b': r'[A-Za-z]+', 'B': r'[A-Za-z]+',
+}
+
+DateParseResult = namedtuple('DateParseResult', ['dates', 'format_hits', 'unparsed'])
+
+
+def format_regex(fmt):
+    """将 strptime 格式转换为正则；含有不认识的指令时返回 None（不做预筛选）"""
+    parts = []
+    for token in re.split(r'(%.)', fmt):
+        if token.startswith('%') and len(token) == 2:
+            if token[1] not in _DIRECTIVE_PATTERNS:
+                return None
+            parts.append(_DIRECTIVE_PATTERNS[token[1]])
+        else:
+            parts.append(re.escape(token))
+    return re.compile(r'\s*' + ''.join(parts) + r'\s*')
+
+
+class DateNormalizer:
+    """
+    按给定顺序尝试多种日期格式，对整列做向量化解析。
+    每个不同的原始取值只解析一次，结果缓存下来跨批次复用（日报语料中不同的日期只有几千个）。
+    """
+
+    def __init__(self, formats, max_cache_size=1000000):
+        self.formats = list(formats)
+        self.max_cache_size = max_cache_size
+        self._regexes = {fmt: format_regex(fmt) for fmt in self.formats if fmt != DAYFIRST}
+        self._cache = {}
+        self.total_hits = Counter()
+        self.total_unparsed = 0
+        self.unparsed_samples = Counter()
+
+    def _parse_uniques(self, values):
+        """解析尚未缓存的不同取值，写入缓存：取值 -> (解析结果, 命中的格式；无法解析时为 None)"""
+        if len(self._cache) + len(values) > self.max_cache_size:
+            self._cache.clear()
+        strings = []
+        for value in values:
+            if isinstance(value, str):
+                strings.append(value)
+            elif isinstance(value, (datetime.datetime, datetime.date, np.datetime64)):
+                self._cache[value] = (pd.Timestamp(value), DATETIME_VALUE)
+            else:
+                self._cache[value] = (pd.NaT, None)
+        remaining = pd.Series(strings, dtype=object)
+        for fmt in self.formats:
+            if remaining.empty:
+                break
+            if fmt == DAYFIRST:
+                candidates = remaining
+                parsed = pd.to_datetime(candidates, dayfirst=True, errors='coerce', format='mixed')
+            else:
+                regex = self._regexes[fmt]
+                candidates = remaining if regex is None else remaining[remaining.str.fullmatch(regex)]
+                parsed = pd.to_datetime(candidates, format=fmt, errors='coerce')
+            ok = parsed.notna()
+            for value, timestamp in zip(candidates[ok], parsed[ok]):
+                self._cache[value] = (timestamp, fmt)
+            remaining = remaining.drop(candidates.index[ok])
+        for value in remaining:
+            self._cache[value] = (pd.NaT, None)
+
+    def parse(self, values):
+        """
+        解析一列日期，返回 DateParseResult：
+        dates 为与输入对齐的 datetime64 列，format_hits 为各格式命中的行数，
+        unparsed 为“有取值但无法解析”的行的布尔掩码（缺失值不计入）。
+        """
+        index = values.index if isinstance(values, pd.Series) else None
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        uniques = np.asarray(uniques, dtype=object)
+        new_values = [value for value in uniques if value not in self._cache]
+        if new_values:
+            self._parse_uniques(new_values)
+
+        entries = [self._cache[value] for value in uniques]
+        unique_dates = pd.DatetimeIndex([timestamp for timestamp, _ in entries]).to_numpy()
+        unique_formats = np.array([fmt for _, fmt in entries], dtype=object)
+
+        present = codes >= 0
+        dates = np.full(len(codes), np.datetime64('NaT'), dtype=unique_dates.dtype if len(uniques) else 'datetime64[ns]')
+        dates[present] = unique_dates[codes[present]]
+
+        counts = np.bincount(codes[present], minlength=len(uniques))
+        format_hits = Counter()
+        for fmt, count in zip(unique_formats, counts):
+            if fmt is not None and count:
+                format_hits[fmt] += int(count)
+        unparsed = np.zeros(len(codes), dtype=bool)
+        unparsed[present] = pd.isna(unique_formats)[codes[present]]
+
+        self.total_hits.update(format_hits)
+        self.total_unparsed += int(unparsed.sum())
+        if unparsed.any() and len(self.unparsed_samples) < 20:
+            for value, count in zip(uniques[pd.isna(unique_formats)], counts[pd.isna(unique_formats)]):
+                if len(self.unparsed_samples) >= 20:
+                    break
+                self.unparsed_samples[str(value)] += int(count)
+        return DateParseResult(pd.Series(dates, index=index), dict(format_hits), unparsed)
+
+    def summary(self):
+        """各格式累计命中行数与无法解析的行数，用于打印和写入日志"""
+        hits = '，'.join(f"'{fmt}': {count}" for fmt, count in self.total_hits.most_common()) or '无'
+        return f"日期格式命中: {hits}；无法解析: {self.total_unparsed} 条"
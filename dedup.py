@@ -0,0 +1,269 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# 128 位摘要由两个独立密钥的 64 位哈希组成
+DIGEST_DTYPE = np.dtype([('hi', '<u8'), ('lo', '<u8')])
+_HASH_KEYS = ('news-digest-k001', 'news-digest-k002')
+# 缺失值和非字符串取值的标记，保证与 drop_duplicates 的判等规则一致
+_MISSING = '\x00NA'
+_NON_STRING_PREFIX = '\x01'
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def normalize_key_column(values):
+    """将一列取值规范化为字符串数组：缺失值统一为同一标记，非字符串取值加前缀以免与同文本的字符串混淆"""
+    values = np.asarray(values, dtype=object)
+    missing = pd.isna(values)
+    if pd.api.types.infer_dtype(values, skipna=True) in ('string', 'empty'):
+        if missing.any():
+            values = values.copy()
+            values[missing] = _MISSING
+        return values
+    result = np.empty(len(values), dtype=object)
+    result[:] = [_MISSING if is_na else (v if isinstance(v, str) else _NON_STRING_PREFIX + str(v))
+                 for v, is_na in zip(values, missing)]
+    return result
+
+
+def _combine(a, b):
+    """按 boost::hash_combine 的方式合并两列 64 位哈希"""
+    with np.errstate(over='ignore'):
+        return a ^ (b + _GOLDEN + (a << np.uint64(6)) + (a >> np.uint64(2)))
+
+
+def content_digest(dates, contents):
+    """
+    批量计算 (DATE, CONTENT) 的 128 位摘要。
+    两列分别用两个密钥做向量化哈希后再合并，不需要拼接出新的长字符串。
+    """
+    dates = normalize_key_column(dates)
+    contents = normalize_key_column(contents)
+    digests = np.empty(len(dates), dtype=DIGEST_DTYPE)
+    for field, key in zip(('hi', 'lo'), _HASH_KEYS):
+        # 日期取值种类很少，先分类再哈希更快；正文几乎各不相同，直接逐条哈希
+        date_hash = pd.util.hash_array(dates, hash_key=key, categorize=True)
+        content_hash = pd.util.hash_array(contents, hash_key=key, categorize=False)
+        digests[field] = _combine(date_hash, content_hash)
+    return digests
+
+
+def first_occurrence_mask(digests):
+    """批内去重：每个摘要只保留第一次出现的位置（稳定排序后相同摘要相邻，且按原顺序排列）"""
+    order = np.lexsort((digests['lo'], digests['hi']))
+    hi, lo = digests['hi'][order], digests['lo'][order]
+    repeated = np.zeros(len(order), dtype=bool)
+    repeated[1:] = (hi[1:] == hi[:-1]) & (lo[1:] == lo[:-1])
+    keep = np.ones(len(order), dtype=bool)
+    keep[order[repeated]] = False
+    return keep
+
+
+class DigestIndex:
+    """
+    摘要索引：由若干段按 (hi, lo) 排序的数组组成，查找用二分搜索。
+    新摘要作为一段新数组加入，相邻两段大小接近时合并，插入和查找的均摊开销都是对数级。
+    每段的 hi、lo 分开存放为连续数组，避免二分搜索时复制结构化数组的字段；
+    每个摘要还可以附带一个整数标签（如来源编号）。
+    """
+
+    def __init__(self):
+        self._runs = []
+
+    def __len__(self):
+        return sum(len(hi) for hi, _, _ in self._runs)
+
+    @staticmethod
+    def _sorted(hi, lo, tags):
+        order = np.lexsort((lo, hi))
+        return hi[order], lo[order], tags[order]
+
+    def add(self, digests, tags=None):
+        """加入一批摘要（调用方保证这批摘要互不相同且不在索引中）"""
+        if len(digests) == 0:
+            return
+        if tags is None:
+            tags = np.zeros(len(digests), dtype=np.int16)
+        run = self._sorted(np.ascontiguousarray(digests['hi']), np.ascontiguousarray(digests['lo']),
+                           np.asarray(tags, dtype=np.int16))
+        while self._runs and len(self._runs[-1][0]) <= len(run[0]):
+            last = self._runs.pop()
+            run = self._sorted(*(np.concatenate([old, new]) for old, new in zip(last, run)))
+        self._runs.append(run)
+
+    def lookup(self, digests):
+        """返回 (是否已在索引中, 对应的标签)；未找到的标签为 -1"""
+        # 查询前先排序：二分搜索的访问位置随之单调，缓存命中率高得多
+        order = np.argsort(digests['hi'], kind='stable')
+        query_hi = np.ascontiguousarray(digests['hi'][order])
+        query_lo = np.ascontiguousarray(digests['lo'][order])
+        found = np.zeros(len(digests), dtype=bool)
+        found_tags = np.full(len(digests), -1, dtype=np.int16)
+        for hi, lo, tags in self._runs:
+            left = np.searchsorted(hi, query_hi, side='left')
+            inside = left < len(hi)
+            pos = np.minimum(left, len(hi) - 1)
+            hit = ~found & inside & (hi[pos] == query_hi) & (lo[pos] == query_lo)
+            found |= hit
+            found_tags[hit] = tags[pos[hit]]
+            # 高 64 位相同的摘要极少，仅对这些位置逐条检查后续元素
+            nxt = np.minimum(left + 1, len(hi) - 1)
+            for i in np.flatnonzero(~found & inside & (left + 1 < len(hi)) & (hi[nxt] == query_hi)):
+                right = np.searchsorted(hi, query_hi[i], side='right')
+                matches = np.flatnonzero(lo[left[i]:right] == query_lo[i])
+                if len(matches):
+                    found[i] = True
+                    found_tags[i] = tags[left[i] + matches[0]]
+        result, result_tags = np.empty_like(found), np.empty_like(found_tags)
+        result[order] = found
+        result_tags[order] = found_tags
+        return result, result_tags
+
+    def contains(self, digests):
+        """返回布尔数组，表示每个摘要是否已在索引中"""
+        return self.lookup(digests)[0]
+
+    def _merged(self):
+        if not self._runs:
+            return (np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int16))
+        return self._sorted(*(np.concatenate(parts) for parts in zip(*self._runs)))
+
+    def to_array(self):
+        """返回全部摘要（已排序）"""
+        hi, lo, _ = self._merged()
+        digests = np.empty(len(hi), dtype=DIGEST_DTYPE)
+        digests['hi'] = hi
+        digests['lo'] = lo
+        return digests
+
+    def save(self, path):
+        hi, lo, tags = self._merged()
+        np.savez(path, hi=hi, lo=lo, tags=tags)
+
+    @classmethod
+    def load(cls, path):
+        index = cls()
+        with np.load(path) as data:
+            if len(data['hi']):
+                index._runs.append((data['hi'], data['lo'], data['tags']))
+        return index
+
+
+class PartitionedDigestIndex:
+    """
+    按年份分区的摘要索引，可保存到目录中跨次运行复用。
+    每个分区对应目录下的一个 year=YYYY.npz 文件，只在首次用到时才加载；
+    标签为来源编号，来源名称保存在 sources.json 中。
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.sources = []
+        self._partitions = {}
+        if directory and os.path.exists(os.path.join(directory, 'sources.json')):
+            with open(os.path.join(directory, 'sources.json'), encoding='utf-8') as f:
+                self.sources = json.load(f)
+
+    def source_id(self, name):
+        """返回来源编号，新来源自动登记"""
+        if name not in self.sources:
+            self.sources.append(name)
+        return self.sources.index(name)
+
+    def _partition_path(self, key):
+        return os.path.join(self.directory, f'year={key}.npz')
+
+    def partition(self, key):
+        key = int(key)
+        if key not in self._partitions:
+            if self.directory and os.path.exists(self._partition_path(key)):
+                self._partitions[key] = DigestIndex.load(self._partition_path(key))
+            else:
+                self._partitions[key] = DigestIndex()
+        return self._partitions[key]
+
+    def lookup(self, digests, keys):
+        """按分区键分组查找，返回 (是否已存在, 来源编号)"""
+        found = np.zeros(len(digests), dtype=bool)
+        tags = np.full(len(digests), -1, dtype=np.int16)
+        for key in np.unique(keys):
+            rows = np.flatnonzero(keys == key)
+            found[rows], tags[rows] = self.partition(key).lookup(digests[rows])
+        return found, tags
+
+    def add(self, digests, keys, tags):
+        tags = np.broadcast_to(np.asarray(tags, dtype=np.int16), (len(digests),))
+        for key in np.unique(keys):
+            rows = np.flatnonzero(keys == key)
+            self.partition(key).add(digests[rows], tags[rows])
+
+    def __len__(self):
+        return sum(len(index) for index in self._partitions.values())
+
+    def save(self, directory=None):
+        """保存所有已加载的分区和来源列表"""
+        self.directory = directory or self.directory
+        os.makedirs(self.directory, exist_ok=True)
+        for key, index in self._partitions.items():
+            index.save(self._partition_path(key))
+        with open(os.path.join(self.directory, 'sources.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.sources, f, ensure_ascii=False, indent=2)
+
+    def clear(self):
+        """清空索引（包括目录中已保存的分区），用于全量重建"""
+        self._partitions = {}
+        self.sources = []
+        if self.directory and os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.startswith('year=') or name == 'sources.json':
+                    os.remove(os.path.join(self.directory, name))
+
+
+class DigestDeduper:
+    """
+    逐批去重：对每批计算 (日期, 内容) 摘要，保留批内首次出现且之前批次未出现过的行。
+    统计结果与对整表执行 drop_duplicates(subset=[日期, 内容], keep='first') 相同。
+    """
+
+    def __init__(self, date_column='DATE', content_column='CONTENT', index=None):
+        self.date_column = date_column
+        self.content_column = content_column
+        self.index = DigestIndex() if index is None else index
+        self.rows_in = 0
+        self.rows_out = 0
+
+    @property
+    def duplicate_count(self):
+        return self.rows_in - self.rows_out
+
+    def keep_mask(self, df):
+        """返回该批中需要保留的行，并把这些行的摘要加入索引"""
+        digests = content_digest(df[self.date_column].to_numpy(dtype=object),
+                                 df[self.content_column].to_numpy(dtype=object))
+        keep = first_occurrence_mask(digests)
+        keep[keep] = ~self.index.contains(digests[keep])
+        self.index.add(digests[keep])
+        self.rows_in += len(df)
+        self.rows_out += int(keep.sum())
+        return keep
+
+    def filter(self, df):
+        """返回去重后的批次（副本）"""
+        return df[self.keep_mask(df)].copy()
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) < 2:
+        print("用法: python dedup.py <CSV 文件路径> [日期列名] [内容列名]")
+        sys.exit(1)
+    file_name = sys.argv[1]
+    date_col = sys.argv[2] if len(sys.argv) > 2 else 'DATE'
+    content_col = sys.argv[3] if len(sys.argv) > 3 else 'CONTENT'
+    deduper = DigestDeduper(date_col, content_col)
+    for chunk in pd.read_csv(file_name, usecols=[date_col, content_col], dtype=str, chunksize=50000):
+        deduper.keep_mask(chunk)
+    print(f"总条数: {deduper.rows_in}，重复条数: {deduper.duplicate_count}，去重后条数: {deduper.rows_out}")
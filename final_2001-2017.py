@@ -1,103 +1,7 @@
-import pandas as pd
-import time # 引入time模块来获取当前时间
+from pipeline import run_pipeline, script_options
 
-# --- 1. 配置与加载 ---
-# 定义输入和输出文件名
-excel_file_name = '数据/data/2001-2017.xlsx'
-output_csv_name = 'final_2001-2017_combined.csv'
-# 【注意】使用与第一个脚本相同的日志文件名，以便追加记录
-log_file_name = 'processing_log.txt'
-
-print(f"步骤 1/7: 开始处理文件 '{excel_file_name}'...")
-
-# 读取Excel文件，包含日期、标题、内容三列
-try:
-    df = pd.read_excel(excel_file_name, header=None, usecols=[0, 1, 2])
-    # 为DataFrame的列指定明确的名称
-    df.columns = ['DATE', 'TITLE', 'CONTENT']
-    print("文件加载成功，已指定列名为：DATE, TITLE, CONTENT")
-except FileNotFoundError:
-    print(f"错误：找不到文件 '{excel_file_name}'。请确认文件名和路径是否正确。")
-    exit() # 如果文件不存在，则退出程序
-
-
-# --- 2. 去重并统计 ---
-# 记录去重前的原始行数
-initial_rows = len(df)
-print(f"\n步骤 2/7: 开始去重... 初始新闻条数: {initial_rows}")
-
-# 根据“日期”和“新闻内容”两列来识别和删除重复行
-df.drop_duplicates(subset=['DATE', 'CONTENT'], keep='first', inplace=True)
-
-# 记录去重后的行数
-deduplicated_rows = len(df)
-# 计算并报告被删除的重复新闻数量
-duplicate_count = initial_rows - deduplicated_rows
-print(f"去重完成！共找到并删除了 {duplicate_count} 条重复的新闻。")
-print(f"当前剩余新闻条数: {deduplicated_rows}")
-
-
-# --- 3. 处理日期格式 ---
-print("\n步骤 3/7: 正在转换日期格式...")
-df['DATE'] = pd.to_datetime(df['DATE'], format='%Y/%m/%d', errors='coerce')
-df.dropna(subset=['DATE'], inplace=True)
-print("日期格式转换完成，并已移除无效日期行。")
-
-
-# --- 4. 合并标题和内容 ---
-print("\n步骤 4/7: 正在将新闻标题合并到内容前方...")
-df['CONTENT'] = df['TITLE'].astype(str) + '\n' + df['CONTENT'].astype(str)
-print("标题与内容合并完成。")
-
-
-# --- 5. 定义文本合并函数 ---
-def join_text(texts):
-    """将一个Series中的所有文本元素用 '\n\n' 连接成一个字符串"""
-    return '\n\n'.join(texts.astype(str))
-
-print("\n步骤 5/7: 准备按日期分组...")
-
-# --- 6. 按日期分组并合并内容 ---
-# print("\n步骤 6/7: 正在按日期合并所有新闻内容...")
-# grouped_content = df.groupby(df['DATE'].dt.date)['CONTENT'].apply(join_text)
-# result_df = grouped_content.reset_index()
-# print("所有新闻已按日期合并完毕。")
-
-# --- 7. 保存结果 ---
-print(f"\n步骤 7/7: 正在将结果保存到文件 '{output_csv_name}'...")
-# 使用 df 替代 result_df 保存结果
-df.to_csv(output_csv_name, index=False, encoding='utf-8-sig')
-print("-" * 50)
-print(f"处理完成！结果已成功保存到文件：{output_csv_name}")
-
-# --- 新增步骤 8: 将统计信息追加到日志文件 ---
-print(f"\n新增步骤: 正在将本次统计信息追加到日志文件 '{log_file_name}'...")
-
-# 获取当前时间，用于记录
-current_time = time.strftime("%Y-%m-%d %H:%M:%S")
-
-# 准备要写入文件的文本内容，前面加上换行符以作分隔
-log_content = f"""
-
-==================================================
-文件处理日志
-==================================================
-处理时间: {current_time}
-输入文件: {excel_file_name}
-输出文件: {output_csv_name}
-
------------------- 统计摘要 ------------------
-原始新闻总条数: {initial_rows}
-识别并删除的重复条数: {duplicate_count}
-处理后剩余新闻条数: {deduplicated_rows}
-----------------------------------------------
-"""
-
-# 【关键修改】使用 'a' (append) 模式将新日志追加到文件末尾
-# 如果日志文件不存在，'a' 模式也会自动创建它
-try:
-    with open(log_file_name, 'a', encoding='utf-8') as f:
-        f.write(log_content)
-    print(f"统计信息已成功追加到文件：{log_file_name}")
-except Exception as e:
-    print(f"错误：无法写入日志文件。原因: {e}")
\ No newline at end of file
+# 处理 '2001-2017' 数据源。读取方式、列名、日期格式等配置见 pipeline_config.py；
+# 一次处理全部数据源并合并结果请运行 python pipeline.py；--resume / --from-stage 见 checkpoint.py，
+# --start / --end / --sample 只处理一部分数据，见 row_filter.py
+if __name__ == '__main__':
+    run_pipeline(['2001-2017'], merge=False, **script_options())
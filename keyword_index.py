@@ -0,0 +1,615 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from article_store import ArticleStore, ArticleView
+from dedup import DIGEST_DTYPE, content_digest
+from parquet_corpus import corpus_files
+from parquet_corpus import pa, pq
+from process_pool import ordered_map
+
+FORMAT_VERSION = 1
+# 与近似去重相同的分词方式：转为小写后取连续的字母、数字和下划线
+_TOKEN_PATTERN = re.compile(r'\w+')
+# 词典中的词项以 64 位哈希保存（16 字节的哈希密钥）；不同词项哈希相同的概率可以忽略
+_TERM_HASH_KEY = 'keyword-index-k1'
+_NAT_KEY = np.iinfo(np.int64).max
+_DAY_NS = 86400 * 10 ** 9
+# 缺失日期的行所在的段，排在所有年份之后
+_MISSING_SEGMENT = '0000'
+# 每次分词的文章数，限制分词时临时列表的大小
+_CHUNK_DOCS = 5000
+
+# 词典中的一项：某个词项在某一段（一年）中的倒排记录。
+# 段文件中 offset 处先是 doc_bytes 字节的文章编号（段内编号的差分），接着是 pos_bytes 字节的位置信息
+# （每篇文章中的出现次数，然后是各次出现的位置的差分）；flags 标记两部分是否经过 zlib 压缩
+ENTRY_DTYPE = np.dtype([('offset', '<u8'), ('df', '<u4'), ('doc_bytes', '<u4'), ('pos_bytes', '<u4'),
+                        ('segment', '<u2'), ('flags', 'u1')], align=True)
+_DOCS_PACKED = 1
+_POSITIONS_PACKED = 2
+
+META_FILE = 'meta.json'
+TERMS_FILE = 'terms.npy'
+ENTRIES_FILE = 'entries.npy'
+DATES_FILE = 'dates.npy'
+SEGMENT_DIR = 'segments'
+
+_OPERATORS = ('AND', 'OR', 'NOT')
+_QUERY_TOKEN = re.compile(r'"[^"]*"|\(|\)|[^\s()"]+')
+
+
+def tokenize(text):
+    """文本中的词（小写），缺失值没有词"""
+    return _TOKEN_PATTERN.findall(text.lower()) if isinstance(text, str) else []
+
+
+def term_hashes(tokens):
+    """词的 64 位哈希（uint64 数组）；同一批词中重复很多，先分类再哈希"""
+    return pd.util.hash_array(np.asarray(tokens, dtype=object), hash_key=_TERM_HASH_KEY, categorize=True)
+
+
+def _pack(values):
+    """
+    把 uint32 数组按字节重排（所有数值的最低字节在前，其次为第二个字节……）后用 zlib 压缩。
+    差分后的文章编号和位置大多小于 256，高位字节几乎全为 0，重排后压缩率很高；压缩后没有变小时保存重排后的原始字节
+    """
+    raw = np.ascontiguousarray(values, dtype='<u4').view(np.uint8).reshape(-1, 4).T.tobytes()
+    packed = zlib.compress(raw)
+    return (packed, True) if len(packed) < len(raw) else (raw, False)
+
+
+def _unpack(data, packed):
+    raw = zlib.decompress(data) if packed else bytes(data)
+    return np.frombuffer(raw, dtype=np.uint8).reshape(4, -1).T.copy().view('<u4').ravel()
+
+
+def _intersect_sorted(a, b):
+    """两个升序且不含重复值的数组的交集；倒排记录本身有序，用二分查找代替 np.intersect1d 的合并排序"""
+    if len(a) > len(b):
+        a, b = b, a
+    if not len(a):
+        return a
+    found = np.searchsorted(b, a)
+    found[found == len(b)] = 0
+    return a[b[found] == a]
+
+
+def _segment_paths(directory, name):
+    segment_dir = os.path.join(directory, SEGMENT_DIR)
+    return os.path.join(segment_dir, f'{name}.bin'), os.path.join(segment_dir, f'{name}.npz')
+
+
+def segment_parts(input_format, input_path):
+    """
+    按年份把语料分为若干段，返回 [(段名, 读取方式)]，顺序与语料相同（缺失日期的段在最后）。
+    Parquet 数据集的读取方式为该年各文件的路径，文章库为该年记录的 (起始行, 结束行)
+    """
+    if input_format == 'parquet':
+        parts = {}
+        for path in corpus_files(input_path):
+            year_dir = os.path.basename(os.path.dirname(os.path.dirname(path)))
+            parts.setdefault(f'{int(year_dir[5:]):04d}', []).append(path)
+        return list(parts.items())
+    with ArticleStore(input_path) as store:
+        keys = np.asarray(store.records['date'])
+    if not len(keys):
+        return []
+    dated = keys[keys != _NAT_KEY]
+    parts = []
+    if len(dated):
+        years = range(pd.Timestamp(int(dated[0])).year, pd.Timestamp(int(dated[-1])).year + 1)
+        bounds = np.searchsorted(keys, [pd.Timestamp(year, 1, 1).value for year in years] + [_NAT_KEY])
+        bounds[0] = 0
+        parts = [(f'{year:04d}', (int(bounds[i]), int(bounds[i + 1])))
+                 for i, year in enumerate(years) if bounds[i + 1] > bounds[i]]
+    if len(dated) < len(keys):
+        parts.append((_MISSING_SEGMENT, (len(dated), len(keys))))
+    return parts
+
+
+def read_segment(input_format, input_path, part, with_digests=True):
+    """
+    读取一段的 (排序键, 正文, (日期, 正文) 摘要)；文章库中已存有摘要，Parquet 数据集读取后计算。
+    with_digests 为 False 时不需要摘要（返回 None），Parquet 数据集省去计算摘要的时间
+    """
+    if input_format == 'parquet':
+        table = pa.concat_tables([pq.read_table(path, columns=['DATE', 'CONTENT']) for path in part])
+        keys = table.column('DATE').to_numpy().view(np.int64).copy()
+        keys[keys == np.iinfo(np.int64).min] = _NAT_KEY
+        texts = table.column('CONTENT').to_numpy()
+        if not with_digests:
+            return keys, texts, None
+        dates = pd.DatetimeIndex(np.where(keys == _NAT_KEY, np.iinfo(np.int64).min, keys).view('datetime64[ns]'))
+        return keys, texts, content_digest(dates.strftime('%Y-%m-%d').to_numpy(dtype=object), texts)
+    start, stop = part
+    with ArticleStore(input_path) as store:
+        records = np.array(store.records[start:stop])
+        texts = list(ArticleView(store, start, stop))
+    digests = np.empty(len(records), dtype=DIGEST_DTYPE)
+    digests['hi'] = records['digest_hi']
+    digests['lo'] = records['digest_lo']
+    return records['date'], texts, digests
+
+
+def _collect_postings(texts):
+    """分词并返回按词项排序的 (词项哈希, 段内文章编号, 词在文章中的位置)，同一词项内按文章、位置排序"""
+    hashes, docs, positions = [], [], []
+    for base in range(0, len(texts), _CHUNK_DOCS):
+        token_lists = [tokenize(text) for text in texts[base:base + _CHUNK_DOCS]]
+        lengths = np.fromiter(map(len, token_lists), dtype=np.int64, count=len(token_lists))
+        flat = np.empty(int(lengths.sum()), dtype=object)
+        flat[:] = [token for tokens in token_lists for token in tokens]
+        hashes.append(term_hashes(flat))
+        docs.append(np.repeat(np.arange(base, base + len(token_lists), dtype=np.uint32), lengths))
+        starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions.append((np.arange(len(flat)) - starts).astype(np.uint32))
+    if not hashes:
+        return np.zeros(0, np.uint64), np.zeros(0, np.uint32), np.zeros(0, np.uint32)
+    hashes, docs, positions = np.concatenate(hashes), np.concatenate(docs), np.concatenate(positions)
+    order = np.argsort(hashes, kind='stable')
+    return hashes[order], docs[order], positions[order]
+
+
+def _write_segment(directory, name, keys, texts):
+    """为一段建立倒排记录，写出段文件（.bin）和段词典（.npz），返回统计信息"""
+    hashes, docs, positions = _collect_postings(texts)
+    tokens = len(hashes)
+    term_start = np.flatnonzero(np.r_[True, hashes[1:] != hashes[:-1]]) if tokens else np.zeros(0, np.int64)
+    # 每个 (词项, 文章) 的第一次出现
+    entry_start = (np.flatnonzero(np.r_[True, (hashes[1:] != hashes[:-1]) | (docs[1:] != docs[:-1])])
+                   if tokens else np.zeros(0, np.int64))
+    entry_docs = docs[entry_start].astype(np.int64)
+    term_frequency = np.diff(np.r_[entry_start, tokens])
+    term_entries = np.r_[np.searchsorted(entry_start, term_start), len(entry_start)]
+    term_tokens = np.r_[term_start, tokens]
+    # 词项内文章编号的差分（第一项为编号本身），文章内位置的差分（第一项为位置本身）
+    doc_delta = entry_docs - np.r_[0, entry_docs[:-1]]
+    doc_delta[term_entries[:-1]] = entry_docs[term_entries[:-1]]
+    position_delta = positions.astype(np.int64) - np.r_[0, positions[:-1]]
+    position_delta[entry_start] = positions[entry_start]
+
+    entries = np.zeros(len(term_start), dtype=ENTRY_DTYPE)
+    bin_path, npz_path = _segment_paths(directory, name)
+    offset = 0
+    with open(bin_path + '.tmp', 'wb') as f:
+        for i in range(len(term_start)):
+            first, last = term_entries[i], term_entries[i + 1]
+            doc_blob, doc_packed = _pack(doc_delta[first:last])
+            position_blob, position_packed = _pack(np.concatenate(
+                [term_frequency[first:last], position_delta[term_tokens[i]:term_tokens[i + 1]]]))
+            f.write(doc_blob)
+            f.write(position_blob)
+            entries[i] = (offset, last - first, len(doc_blob), len(position_blob), 0,
+                          doc_packed * _DOCS_PACKED | position_packed * _POSITIONS_PACKED)
+            offset += len(doc_blob) + len(position_blob)
+    with open(npz_path + '.tmp', 'wb') as f:
+        np.savez(f, terms=hashes[term_start], entries=entries, dates=keys)
+    os.replace(bin_path + '.tmp', bin_path)
+    os.replace(npz_path + '.tmp', npz_path)
+    return {'rows': len(keys), 'tokens': tokens, 'terms': len(term_start), 'bytes': offset}
+
+
+def _segment_worker(args):
+    """
+    在子进程中读取一段（一年）的正文并建立倒排记录。段的指纹为全部 (日期, 正文) 摘要的哈希，
+    与上次建立索引时相同且段文件存在时不再重建（stats 为 None）
+    """
+    directory, name, input_format, input_path, part, fingerprint = args
+    start = time.perf_counter()
+    keys, texts, digests = read_segment(input_format, input_path, part)
+    new_fingerprint = hashlib.blake2b(digests.tobytes(), digest_size=16).hexdigest()
+    if new_fingerprint == fingerprint and all(map(os.path.exists, _segment_paths(directory, name))):
+        return name, len(keys), new_fingerprint, None
+    stats = _write_segment(directory, name, keys, texts)
+    stats['seconds'] = round(time.perf_counter() - start, 2)
+    return name, len(keys), new_fingerprint, stats
+
+
+def _load_meta(directory):
+    try:
+        with open(os.path.join(directory, META_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_array(directory, name, array):
+    path = os.path.join(directory, name)
+    with open(path + '.tmp', 'wb') as f:
+        np.save(f, array)
+    os.replace(path + '.tmp', path)
+
+
+def _consolidate(directory, segments, input_format, input_path):
+    """把各段的词典合并为按词项哈希排序的全局词典，文章编号为语料中的行号（各段依次相接）"""
+    terms, entries, dates = [], [], []
+    start = 0
+    for i, segment in enumerate(segments):
+        with np.load(_segment_paths(directory, segment['name'])[1]) as data:
+            segment_entries = data['entries']
+            segment_entries['segment'] = i
+            terms.append(data['terms'])
+            entries.append(segment_entries)
+            dates.append(data['dates'])
+        segment['start'] = start
+        start += segment['rows']
+    terms = np.concatenate(terms) if terms else np.zeros(0, np.uint64)
+    entries = np.concatenate(entries) if entries else np.zeros(0, ENTRY_DTYPE)
+    # 稳定排序：同一词项的各段按年份顺序排列
+    order = np.argsort(terms, kind='stable')
+    _save_array(directory, TERMS_FILE, terms[order])
+    _save_array(directory, ENTRIES_FILE, entries[order])
+    _save_array(directory, DATES_FILE, np.concatenate(dates) if dates else np.zeros(0, np.int64))
+    meta = {'version': FORMAT_VERSION, 'input': {'format': input_format, 'path': input_path}, 'rows': start,
+            'terms': int(len(np.unique(terms))), 'segments': segments}
+    with open(os.path.join(directory, META_FILE + '.tmp'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+    os.replace(os.path.join(directory, META_FILE + '.tmp'), os.path.join(directory, META_FILE))
+    return meta
+
+
+def build_index(input_format, input_path, directory, workers=None, log_file_name='processing_log.txt'):
+    """
+    为合并（或清理）结果建立关键词倒排索引，input_format 为 'parquet' 或 'store'（CSV 没有按年份划分的结构，不支持）。
+    语料按年份分段，各段在进程池中并行分词、建立按日期排列的倒排记录；增量建立：内容没有变化的年份直接沿用上次的段文件，
+    通常只有最近一年需要重建。返回统计信息字典，并向日志追加一段索引日志。
+    """
+    if input_format not in ('parquet', 'store'):
+        raise ValueError(f"不支持的索引输入格式: {input_format}")
+    workers = workers or os.cpu_count() or 1
+    start = time.time()
+    os.makedirs(os.path.join(directory, SEGMENT_DIR), exist_ok=True)
+    meta = _load_meta(directory)
+    previous = {}
+    if meta and meta['version'] == FORMAT_VERSION and meta['input'] == {'format': input_format, 'path': input_path}:
+        previous = {segment['name']: segment['fingerprint'] for segment in meta['segments']}
+
+    parts = segment_parts(input_format, input_path)
+    print(f"正在用 {workers} 个进程为 {input_path} 建立关键词索引（{len(parts)} 段），结果写入 {directory}...")
+    tasks = [(directory, name, input_format, input_path, part, previous.get(name)) for name, part in parts]
+    segments, built = [], {}
+    for name, rows, fingerprint, stats in ordered_map(_segment_worker, tasks, min(workers, len(tasks))):
+        segments.append({'name': name, 'rows': rows, 'fingerprint': fingerprint})
+        if stats is not None:
+            built[name] = stats
+            print(f"    {name}: {stats['rows']} 条，{stats['terms']} 个词项，{stats['tokens']} 个词，"
+                  f"{stats['bytes'] / 1024 / 1024:.1f} MB，耗时 {stats['seconds']} 秒")
+    current = {segment['name'] for segment in segments}
+    for name in os.listdir(os.path.join(directory, SEGMENT_DIR)):
+        if os.path.splitext(name)[0] not in current:
+            os.remove(os.path.join(directory, SEGMENT_DIR, name))
+    meta = _consolidate(directory, segments, input_format, input_path)
+
+    stats = {'input': input_path, 'output': directory, 'rows': meta['rows'], 'terms': meta['terms'],
+             'segments': len(segments), 'rebuilt': sorted(built), 'workers': workers,
+             'rows_indexed': sum(segment['rows'] for segment in built.values()),
+             'tokens': sum(segment['tokens'] for segment in built.values()),
+             'bytes': sum(os.path.getsize(path) for name in current for path in _segment_paths(directory, name)),
+             'seconds': round(time.time() - start, 2)}
+    stats['rows_per_sec'] = round(stats['rows_indexed'] / stats['seconds']) if stats['seconds'] else None
+    print(f"关键词索引建立完成：共 {stats['rows']} 条、{stats['terms']} 个词项，重建 {len(built)}/{len(segments)} 段"
+          f"（{stats['rows_indexed']} 条），耗时 {stats['seconds']} 秒（{stats['rows_per_sec']} 条/秒）。")
+    _append_index_log(log_file_name, stats)
+    return stats
+
+
+def _append_index_log(log_file_name, stats):
+    """将索引建立的统计信息追加到日志文件"""
+    current_time = time.strftime("%Y-%m-%d %H:%M:%S")
+    log_content = f"""
+
+==================================================
+关键词索引日志
+==================================================
+处理时间: {current_time}
+输入: {stats['input']}
+输出: {stats['output']}
+进程数: {stats['workers']}
+
+------------------ 统计摘要 ------------------
+语料条数: {stats['rows']}
+词项数: {stats['terms']}
+段数（按年份）: {stats['segments']}
+重建的段: {', '.join(stats['rebuilt']) or '无（内容均未变化）'}
+重建段中的条数 / 词数: {stats['rows_indexed']} / {stats['tokens']}
+倒排记录大小: {stats['bytes'] / 1024 / 1024:.1f} MB
+处理耗时: {stats['seconds']} 秒（{stats['rows_per_sec']} 条/秒）
+----------------------------------------------
+"""
+    try:
+        with open(log_file_name, 'a', encoding='utf-8') as f:
+            f.write(log_content)
+        print(f"统计信息已成功追加到文件：{log_file_name}")
+    except Exception as e:
+        print(f"错误：无法写入日志文件。原因: {e}")
+
+
+def parse_query(query):
+    """
+    把查询解析为语法树：词之间默认为 AND，支持 AND / OR / NOT（大写）、括号和 "引号中的短语"。
+    叶节点为 ('terms', 词的元组)，多个词表示短语（一个未加引号的词分词后有多个词时也按短语处理）
+    """
+    tokens = _QUERY_TOKEN.findall(query)
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def advance():
+        nonlocal position
+        position += 1
+        return tokens[position - 1]
+
+    def parse_or():
+        items = [parse_and()]
+        while peek() == 'OR':
+            advance()
+            items.append(parse_and())
+        return items[0] if len(items) == 1 else ('or', items)
+
+    def parse_and():
+        items = [parse_not()]
+        while peek() not in (None, ')', 'OR'):
+            if peek() == 'AND':
+                advance()
+            items.append(parse_not())
+        return items[0] if len(items) == 1 else ('and', items)
+
+    def parse_not():
+        if peek() == 'NOT':
+            advance()
+            return 'not', parse_not()
+        return parse_atom()
+
+    def parse_atom():
+        token = peek()
+        if token is None or token == ')' or token in _OPERATORS:
+            raise ValueError(f"查询语法错误（位置 {position + 1}）: {query}")
+        advance()
+        if token == '(':
+            node = parse_or()
+            if peek() != ')':
+                raise ValueError(f"查询中的括号不匹配: {query}")
+            advance()
+            return node
+        words = tokenize(token.strip('"'))
+        if not words:
+            raise ValueError(f"查询中没有可检索的词: {token}")
+        return 'terms', tuple(words)
+
+    node = parse_or()
+    if peek() is not None:
+        raise ValueError(f"查询语法错误（位置 {position + 1}）: {query}")
+    return node
+
+
+def any_of(keywords):
+    """关键词列表（公司名、宏观词汇等）中任意一个出现即匹配的查询，多词的关键词按短语匹配"""
+    return ' OR '.join(f'"{keyword}"' for keyword in keywords)
+
+
+class KeywordIndex:
+    """
+    以内存映射方式打开 build_index 建立的关键词索引。文章编号为语料中的行号，与 ArticleStore 中的编号相同
+    （Parquet 数据集按 corpus_files 的顺序依次读取时的行号）。
+    index.search('"interest rate" AND (fed OR ecb) NOT crypto', start='2020-01-01', end='2020-12-31')
+    返回匹配的文章编号（按日期排列），index.day_counts(...) 返回每天匹配的文章数。
+    只读取与日期范围相交的年份中查询词的倒排记录，单次查询通常在几毫秒到几十毫秒内完成。
+    """
+
+    def __init__(self, directory):
+        self.path = directory
+        meta = _load_meta(directory)
+        if meta is None:
+            raise FileNotFoundError(f"找不到关键词索引: {directory}")
+        if meta['version'] != FORMAT_VERSION:
+            raise ValueError(f"不支持的关键词索引版本: {meta['version']}")
+        self.input = meta['input']
+        self.segments = meta['segments']
+        self.terms = np.load(os.path.join(directory, TERMS_FILE), mmap_mode='r')
+        self.entries = np.load(os.path.join(directory, ENTRIES_FILE), mmap_mode='r')
+        self.dates = np.load(os.path.join(directory, DATES_FILE), mmap_mode='r')
+        self._starts = np.array([segment['start'] for segment in self.segments] + [meta['rows']], dtype=np.int64)
+        self._files = {}
+
+    def __len__(self):
+        return len(self.dates)
+
+    def _segment_file(self, segment):
+        if segment not in self._files:
+            self._files[segment] = open(_segment_paths(self.path, self.segments[segment]['name'])[0], 'rb')
+        return self._files[segment]
+
+    def _lookup(self, word, segments):
+        """词在所选各段中的词典项"""
+        term = term_hashes([word])[0]
+        entries = np.array(self.entries[np.searchsorted(self.terms, term, 'left'):
+                                        np.searchsorted(self.terms, term, 'right')])
+        return entries[np.isin(entries['segment'], segments)]
+
+    def _decode(self, entry, positions=False):
+        """一项倒排记录中的段内文章编号；positions 为 True 时另外返回每篇文章中的出现次数和各次出现的位置"""
+        f = self._segment_file(int(entry['segment']))
+        f.seek(int(entry['offset']))
+        doc_bytes = int(entry['doc_bytes'])
+        data = f.read(doc_bytes + (int(entry['pos_bytes']) if positions else 0))
+        docs = np.cumsum(_unpack(data[:doc_bytes], entry['flags'] & _DOCS_PACKED), dtype=np.int64)
+        if not positions:
+            return docs
+        values = _unpack(data[doc_bytes:], entry['flags'] & _POSITIONS_PACKED).astype(np.int64)
+        frequency, deltas = values[:len(docs)], values[len(docs):]
+        # 位置的差分在每篇文章的第一次出现处重新开始
+        starts = np.cumsum(frequency) - frequency
+        cumulative = np.cumsum(deltas)
+        return docs, frequency, cumulative - np.repeat(cumulative[starts] - deltas[starts], frequency)
+
+    def _term_docs(self, word, segments):
+        ids = [self._decode(entry) + self._starts[entry['segment']] for entry in self._lookup(word, segments)]
+        return np.concatenate(ids) if ids else np.zeros(0, np.int64)
+
+    def _phrase_docs(self, words, segments):
+        """
+        短语：同一篇文章中各词依次出现在相邻位置。先求各词都出现的文章，
+        再只对这些文章中的出现位置用 (文章编号, 短语起始位置) 求交集
+        """
+        lookups = [self._lookup(word, segments) for word in words]
+        common = reduce(np.intersect1d, [entries['segment'] for entries in lookups])
+        ids = []
+        for segment in common:
+            # 短语中重复的词只解码一次
+            decoded = {word: self._decode(entries[entries['segment'] == segment][0], positions=True)
+                       for word, entries in zip(words, lookups)}
+            postings = [decoded[word] for word in words]
+            candidates = reduce(_intersect_sorted, [docs for docs, _, _ in postings])
+            keys = candidates << 32
+            for i, (docs, frequency, positions) in enumerate(postings):
+                if not len(keys):
+                    break
+                # 文章编号递增、文章内位置递增，(文章编号, 短语起始位置) 组成的键本身有序且不重复
+                keep = np.repeat(np.isin(docs, candidates, assume_unique=True), frequency) & (positions >= i)
+                term_keys = (np.repeat(docs, frequency)[keep] << 32) | (positions[keep] - i)
+                keys = term_keys if i == 0 else _intersect_sorted(keys, term_keys)
+            if len(keys):
+                docs = keys >> 32
+                ids.append(docs[np.r_[True, docs[1:] != docs[:-1]]] + self._starts[segment])
+        return np.concatenate(ids) if ids else np.zeros(0, np.int64)
+
+    def _evaluate(self, node, segments, universe):
+        kind = node[0]
+        if kind == 'terms':
+            words = node[1]
+            return self._term_docs(words[0], segments) if len(words) == 1 else self._phrase_docs(words, segments)
+        if kind == 'or':
+            return reduce(np.union1d, [self._evaluate(item, segments, universe) for item in node[1]])
+        if kind == 'not':
+            return np.setdiff1d(universe(), self._evaluate(node[1], segments, universe), assume_unique=True)
+        # AND：先求肯定项的交集，再去掉否定项；只有否定项时才需要所选年份的全部文章
+        positives = [item for item in node[1] if item[0] != 'not']
+        negatives = [item[1] for item in node[1] if item[0] == 'not']
+        result = (reduce(_intersect_sorted, [self._evaluate(item, segments, universe) for item in positives])
+                  if positives else universe())
+        for item in negatives:
+            if not len(result):
+                break
+            result = np.setdiff1d(result, self._evaluate(item, segments, universe), assume_unique=True)
+        return result
+
+    def _date_range(self, start, end):
+        """与日期范围相交的段，以及排序键的范围 [low, high)；只有日期的 end 包含当天"""
+        selected = np.arange(len(self.segments))
+        if start is None and end is None:
+            return selected, None, None
+        low = pd.Timestamp(start).value if start is not None else None
+        high = None
+        if end is not None:
+            end = pd.Timestamp(end)
+            high = (end + pd.Timedelta(days=1)).value if end == end.normalize() else end.value + 1
+        years = np.array([int(segment['name']) for segment in self.segments])
+        keep = years != int(_MISSING_SEGMENT)
+        if low is not None:
+            keep &= years >= pd.Timestamp(low).year
+        if high is not None:
+            keep &= years <= pd.Timestamp(high - 1).year
+        return selected[keep], low, high
+
+    def search(self, query, start=None, end=None):
+        """
+        匹配查询的文章编号（升序，即按日期排列）。query 为查询字符串或 parse_query 的结果；
+        指定 start / end 时只返回日期在 [start, end] 之间的文章（只有日期的 end 包含当天，缺失日期的文章不在任何范围内）
+        """
+        node = parse_query(query) if isinstance(query, str) else query
+        segments, low, high = self._date_range(start, end)
+        universe_cache = []
+
+        def universe():
+            if not universe_cache:
+                universe_cache.append(np.concatenate(
+                    [np.arange(self._starts[i], self._starts[i + 1]) for i in segments]) if len(segments)
+                    else np.zeros(0, np.int64))
+            return universe_cache[0]
+
+        ids = self._evaluate(node, segments, universe).astype(np.int64)
+        if low is not None or high is not None:
+            keys = self.dates[ids]
+            keep = keys != _NAT_KEY
+            if low is not None:
+                keep &= keys >= low
+            if high is not None:
+                keep &= keys < high
+            ids = ids[keep]
+        return ids
+
+    def day_counts(self, query, start=None, end=None):
+        """每天匹配查询的文章数（Series，索引为日期，没有匹配的日期不列出）"""
+        keys = self.dates[self.search(query, start, end)]
+        days, counts = np.unique(keys[keys != _NAT_KEY] // _DAY_NS, return_counts=True)
+        return pd.Series(counts, index=pd.DatetimeIndex(days * _DAY_NS, name='DATE'), name='count')
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    import pipeline_config as config
+
+    parser = argparse.ArgumentParser(description='建立和查询合并结果的关键词倒排索引')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='建立（或增量更新）索引，配置见 pipeline_config.py')
+    build_parser.add_argument('--workers', type=int, default=None, help='进程数，默认为 CPU 核数')
+    search_parser = subparsers.add_parser('search', help='查询索引')
+    search_parser.add_argument('query', help='查询，如 \'"interest rate" AND (fed OR ecb) NOT crypto\'')
+    search_parser.add_argument('--start', default=None, help='起始日期（包含）')
+    search_parser.add_argument('--end', default=None, help='结束日期（包含当天）')
+    search_parser.add_argument('--days', action='store_true', help='输出每天匹配的文章数')
+    search_parser.add_argument('--limit', type=int, default=20, help='最多显示的文章数')
+    search_parser.add_argument('--index-dir', default=config.keyword_index_dir, help='索引目录')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        from pipeline import build_keyword_index
+
+        build_keyword_index(workers=args.workers)
+    else:
+        with KeywordIndex(args.index_dir) as index:
+            query_start = time.perf_counter()
+            try:
+                if args.days:
+                    result = index.day_counts(args.query, args.start, args.end)
+                    total = int(result.sum())
+                else:
+                    result = index.search(args.query, args.start, args.end)
+                    total = len(result)
+            except ValueError as e:
+                print(f"错误：{e}")
+                raise SystemExit(1)
+            elapsed = (time.perf_counter() - query_start) * 1000
+            print(f"匹配 {total} 篇文章，查询耗时 {elapsed:.1f} 毫秒。")
+            if args.days:
+                if total:
+                    pd.set_option('display.max_rows', 500)
+                    print(result.to_string())
+            elif total:
+                # 文章库可以直接按编号取出正文；Parquet 数据集只显示编号和日期
+                store = ArticleStore(index.input['path']) if index.input['format'] == 'store' else None
+                for n in result[:args.limit]:
+                    key = int(index.dates[n])
+                    date = '日期缺失' if key == _NAT_KEY else pd.Timestamp(key).date()
+                    print(f"[{n}] {date}" + (f"  {store[int(n)][:100]!r}" if store is not None else ''))
+                if store is not None:
+                    store.close()
@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import time
+
+from source_cache import file_digest
+
+
+def source_fingerprint(source):
+    """数据源配置（读取方式、列名、日期格式、输出文件）的哈希，配置变化时需要重新处理"""
+    keys = ('path', 'output', 'read_options', 'columns', 'date_formats')
+    text = json.dumps({key: source.get(key) for key in keys}, ensure_ascii=False, sort_keys=True)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class SourceManifest:
+    """
+    已处理数据源的清单，保存为 JSON：
+    sources 记录每个数据源处理时的原始文件哈希、大小、修改时间、配置哈希、行数统计和日期范围；
+    corpus 记录合并结果的状态（行数、日期范围、已并入的数据源、各输出的状态），供增量合并使用。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.sources = {}
+        self.corpus = None
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            self.sources = data.get('sources', {})
+            self.corpus = data.get('corpus')
+
+    def is_current(self, source, row_filter=None):
+        """
+        数据源是否已按当前配置（以及相同的筛选条件 row_filter，见 row_filter.py）处理过且原始文件未变化。
+        与列式缓存相同：文件大小一致且修改时间未变时直接认为未变化，修改时间变化时再比较内容哈希。
+        """
+        entry = self.sources.get(source['name'])
+        if entry is None or entry['fingerprint'] != source_fingerprint(source):
+            return False
+        if entry.get('row_filter') != row_filter:
+            return False
+        if not os.path.exists(source['path']) or not os.path.exists(source['output']):
+            return False
+        stat = os.stat(source['path'])
+        if entry['size'] != stat.st_size:
+            return False
+        if entry['mtime_ns'] == stat.st_mtime_ns:
+            return True
+        if entry['content_hash'] != file_digest(source['path']):
+            return False
+        entry['mtime_ns'] = stat.st_mtime_ns
+        return True
+
+    def record_source(self, source, stats):
+        """记录一次成功的处理；只处理了部分数据时还记录筛选条件，之后不筛选的运行会重新处理该数据源"""
+        stat = os.stat(source['path'])
+        self.sources[source['name']] = {
+            'path': source['path'],
+            'output': source['output'],
+            'fingerprint': source_fingerprint(source),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'content_hash': file_digest(source['path']),
+            'rows_in': stats['rows_in'],
+            'rows_out': stats['rows_out'],
+            'duplicate_count': stats['duplicate_count'],
+            'invalid_date_rows': stats['invalid_date_rows'],
+            'date_min': stats['date_min'],
+            'date_max': stats['date_max'],
+            'processed': time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        if stats.get('row_filter'):
+            self.sources[source['name']]['row_filter'] = stats['row_filter']
+
+    def corpus_is_valid(self, index_dir):
+        """是否有可用于增量合并的合并结果记录和摘要索引（各输出文件本身由 merge.py 中的输出对象检查）"""
+        return self.corpus is not None and os.path.exists(os.path.join(index_dir, 'sources.json'))
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'sources': self.sources, 'corpus': self.corpus}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
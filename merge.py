@@ -0,0 +1,494 @@
+import os
+import pickle
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from article_store import ArticleStoreCorpus
+from csv_output import BOM, compress, compression_of, csv_header, encode_csv, open_csv_input, read_csv_chunks
+from dedup import PartitionedDigestIndex, content_digest, first_occurrence_mask
+from metrics import path_size
+from near_dedup import NearDuplicateDetector
+from parquet_corpus import ParquetCorpus
+from parquet_corpus import pa as parquet_pa
+
+# 排序键中缺失日期（NaT）的取值：排在所有日期之后，与 sort_values 的默认行为一致
+_NAT_KEY = np.iinfo(np.int64).max
+# 增量合并时，从已有结果中读回的行使用负的序号，保证同一日期内排在新数据之前
+_TAIL_SEQ_BASE = -(2 ** 62)
+
+
+def _sort_keys(dates):
+    """将 datetime64 列转换为 int64 排序键"""
+    keys = dates.to_numpy(dtype='datetime64[ns]').view(np.int64).copy()
+    keys[dates.isna().to_numpy()] = _NAT_KEY
+    return keys
+
+
+def _key_to_text(key):
+    return None if key is None or key == _NAT_KEY else str(pd.Timestamp(key))
+
+
+def _text_to_key(text):
+    return None if text is None else pd.Timestamp(text).value
+
+
+class SortedRunWriter:
+    """
+    外部排序的第一阶段：累积到 buffer_rows 行后按 (日期, 序号) 排序，作为一个有序段写入磁盘。
+    有序段由若干个块（pickle 的 DataFrame）组成，归并时每次只读取每段的一个块。
+    若新的一批整体不早于上一段的末尾（例如输入本来就按日期排列），直接接在上一段后面，不产生新段。
+    """
+
+    def __init__(self, directory, buffer_rows=200000, prefix='run'):
+        self.directory = directory
+        self.buffer_rows = buffer_rows
+        self.block_rows = max(1000, buffer_rows // 20)
+        self.prefix = prefix
+        self.run_paths = []
+        self._pending = []
+        self._pending_rows = 0
+        self._last_key = None
+
+    def add(self, block):
+        """加入一批行，需包含 KEY（int64 排序键）、SEQ（全局序号）两列"""
+        if len(block):
+            self._pending.append(block)
+            self._pending_rows += len(block)
+        if self._pending_rows >= self.buffer_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._pending_rows:
+            return
+        data = pd.concat(self._pending, ignore_index=True)
+        self._pending, self._pending_rows = [], 0
+        data = data.iloc[np.lexsort((data['SEQ'].to_numpy(), data['KEY'].to_numpy()))]
+        first_key = (data['KEY'].iat[0], data['SEQ'].iat[0])
+        if self._last_key is None or first_key < self._last_key:
+            self.run_paths.append(os.path.join(self.directory, f'{self.prefix}{len(self.run_paths):05d}.pkl'))
+        self._last_key = (data['KEY'].iat[-1], data['SEQ'].iat[-1])
+        with open(self.run_paths[-1], 'ab') as f:
+            for start in range(0, len(data), self.block_rows):
+                pickle.dump(data.iloc[start:start + self.block_rows].reset_index(drop=True), f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _iter_blocks(path):
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def merge_sorted_runs(run_paths):
+    """
+    外部排序的第二阶段：对多个按 (KEY, SEQ) 排好序的段做 k 路归并，逐批产出有序的 DataFrame。
+    每轮以“各段当前块末尾的最小值”为界，界内的行不可能再有更小的行出现，可以安全输出；
+    内存中同时只保留每段的一个块。
+    """
+    readers = [_iter_blocks(path) for path in run_paths]
+    blocks = [next(reader, None) for reader in readers]
+    while any(block is not None for block in blocks):
+        active = [i for i, block in enumerate(blocks) if block is not None]
+        bound = min((blocks[i]['KEY'].iat[-1], blocks[i]['SEQ'].iat[-1]) for i in active)
+        parts = []
+        for i in active:
+            keys, seqs = blocks[i]['KEY'].to_numpy(), blocks[i]['SEQ'].to_numpy()
+            count = int(((keys < bound[0]) | ((keys == bound[0]) & (seqs <= bound[1]))).sum())
+            parts.append(blocks[i].iloc[:count])
+            if count == len(blocks[i]):
+                blocks[i] = next(readers[i], None)
+            else:
+                blocks[i] = blocks[i].iloc[count:]
+        merged = pd.concat(parts, ignore_index=True)
+        yield merged.iloc[np.lexsort((merged['SEQ'].to_numpy(), merged['KEY'].to_numpy()))]
+
+
+class CsvCorpus:
+    """
+    合并结果的 CSV 形式：单个 utf-8-sig 文件，DATE, CONTENT 两列。
+    每块记录第一行的排序键和在文件中的字节偏移（checkpoints），增量合并时据此只重写受影响的日期范围。
+    文件名以 .gz / .zst 结尾时每块压缩为一个独立的帧（见 csv_output.py），偏移即帧的开头，增量合并同样适用。
+    """
+    # 编码方式（见 csv_output.encode_csv），ArrowCsvCorpus 用 pyarrow 编码
+    engine = 'pandas'
+
+    def __init__(self, path, state=None):
+        self.path = path
+        self.compression = compression_of(path)
+        self.source_names = []
+        self.rows = 0
+        self.tail_note = ''
+        state = state or {}
+        self.checkpoints = [list(point) for point in state.get('checkpoints', [])]
+        self.last_key = state.get('last_key')
+        self._size = state.get('size')
+        self._tail_offset = None
+
+    def open_full(self):
+        with open(self.path, 'wb') as f:
+            f.write(compress(BOM + csv_header(['DATE', 'CONTENT']), self.compression))
+        self.checkpoints = []
+        self.last_key = None
+
+    def tail_blocks(self, min_key, chunk_size=100000):
+        """增量写入：读回排在 min_key 之后、需要与新数据一起重写的那一段，逐批产出 KEY、CONTENT、SOURCE"""
+        self._tail_offset = None
+        if self.last_key is None or min_key >= self.last_key:
+            self.tail_note = '追加到文件末尾'
+            return
+        # 找到最后一个“块首日期不晚于新数据最早日期”的分块：它之前的行都排在新数据之前，保持不动
+        cut = 0
+        for i, (key, _) in enumerate(self.checkpoints):
+            if key <= min_key:
+                cut = i
+        self._tail_offset = self.checkpoints[cut][1]
+        self.tail_note = f'重写自 {_key_to_text(self.checkpoints[cut][0])} 起的部分'
+        self.checkpoints = self.checkpoints[:cut]
+        with open_csv_input(self.path, self._tail_offset) as f:
+            for chunk in pd.read_csv(f, header=None, names=['DATE', 'CONTENT'], encoding='utf-8', chunksize=chunk_size):
+                yield pd.DataFrame({'KEY': _sort_keys(pd.to_datetime(chunk['DATE'], errors='coerce')),
+                                    'CONTENT': chunk['CONTENT'].to_numpy(),
+                                    'SOURCE': np.full(len(chunk), -1, dtype=np.int16)})
+
+    def drop_tail(self):
+        if self._tail_offset is not None:
+            os.truncate(self.path, self._tail_offset)
+            self._tail_offset = None
+
+    @classmethod
+    def encode_block(cls, block, threads=1):
+        """把一块数据编码为要追加的 CSV 内容；不依赖写入状态，可以在其他进程中执行，由 write_encoded 按顺序写入"""
+        if not len(block):
+            return None
+        keys = block['KEY'].to_numpy()
+        dates = pd.to_datetime(np.where(keys == _NAT_KEY, np.iinfo(np.int64).min, keys).view('datetime64[ns]'))
+        out = pd.DataFrame({'DATE': dates, 'CONTENT': block['CONTENT'].to_numpy()})
+        return int(keys[0]), int(keys[-1]), len(block), encode_csv(out, header=False, engine=cls.engine, threads=threads)
+
+    def write_encoded(self, encoded):
+        if encoded is None:
+            return
+        first_key, last_key, rows, data = encoded
+        self.checkpoints.append([first_key, os.path.getsize(self.path)])
+        with open(self.path, 'ab') as f:
+            f.write(compress(data, self.compression))
+        self.rows += rows
+        self.last_key = last_key
+
+    def write(self, block):
+        self.write_encoded(self.encode_block(block, threads=os.cpu_count()))
+
+    def close(self):
+        self._size = os.path.getsize(self.path)
+
+    def is_valid(self):
+        """文件是否仍是上次写入后的状态"""
+        return self._size is not None and os.path.exists(self.path) and os.path.getsize(self.path) == self._size
+
+    def state(self):
+        return {'path': self.path, 'size': self._size, 'checkpoints': self.checkpoints, 'last_key': self.last_key}
+
+
+class ArrowCsvCorpus(CsvCorpus):
+    """用 pyarrow 编码的 CSV 合并结果（csv_engine='arrow'）：文本字段都加引号，读取结果与 CsvCorpus 相同"""
+    engine = 'arrow'
+
+
+def build_outputs(formats, csv_path, parquet_dir, compression='zstd', states=None, store_dir=None, csv_engine='pandas'):
+    """
+    按输出格式（'csv' / 'parquet' / 'store'）创建合并结果的写入对象；states 为清单中记录的各输出状态。
+    csv_engine 为 CSV 的编码方式（'pandas' 或 'arrow'，见 csv_output.encode_csv）。未安装 pyarrow 时 Parquet 输出改为 CSV。
+    """
+    states = states or {}
+    formats = list(formats)
+    if 'parquet' in formats and parquet_pa is None:
+        print("错误：未安装 pyarrow，无法输出 Parquet 数据集，改为输出 CSV。")
+        formats = [output_format if output_format != 'parquet' else 'csv' for output_format in formats]
+    outputs = {}
+    for output_format in formats:
+        if output_format == 'csv':
+            csv_class = ArrowCsvCorpus if csv_engine == 'arrow' and parquet_pa is not None else CsvCorpus
+            outputs['csv'] = csv_class(csv_path, states.get('csv'))
+        elif output_format == 'parquet':
+            outputs['parquet'] = ParquetCorpus(parquet_dir, states.get('parquet'), compression)
+        elif output_format == 'store':
+            outputs['store'] = ArticleStoreCorpus(store_dir, states.get('store'))
+        else:
+            raise ValueError(f"未知的输出格式: {output_format}")
+    return outputs
+
+
+def _dedup_to_runs(ordered_files, digest_index, run_writer, chunk_size, near_detector=None, row_filter=None):
+    """
+    按优先级依次分块读取每个输入 CSV 文件，与全局摘要索引比对去重，保留下来的行写入外部排序的有序段。
+    给出 row_filter（row_filter.RowFilter）时，每块先按日期筛选，只有保留的行参与去重和排序（统计中的读取条数为筛选后的）。
+    返回 (每个文件的统计, 保留的行数, 保留行中最小的排序键)。
+    """
+    source_stats = {}
+    # 保留下来的行按来源优先级依次编号，作为同一日期内的排序依据
+    next_seq = 0
+    min_key = None
+    for index, file in enumerate(ordered_files, start=1):
+        print(f"正在处理第 {index}/{len(ordered_files)} 个文件: {file}")
+        source_id = digest_index.source_id(file)
+        # 先只读取表头检查必要的列，缺少时跳过整个文件；读取数据时的其他错误不在这里处理，不会留下只合并了一部分的文件
+        try:
+            with open_csv_input(file) as source:
+                columns = pd.read_csv(source, nrows=0).columns
+        except FileNotFoundError:
+            print(f"错误：文件 {file} 未找到，请检查文件路径。")
+            continue
+        if 'DATE' not in columns or 'CONTENT' not in columns:
+            print(f"错误：文件 {file} 中缺少 'DATE' 或 'CONTENT' 列，请检查文件内容。")
+            continue
+        rows_read = 0
+        rows_kept = 0
+        also_seen = np.zeros(len(digest_index.sources), dtype=np.int64)
+        # 读取 CSV 文件（.gz / .zst 压缩的文件边读边解压），只选择需要的列
+        for chunk in read_csv_chunks(file, chunk_size, usecols=['DATE', 'CONTENT']):
+            # 以“日”为单位规范化日期后计算摘要，不同文件中同一天的相同正文视为重复
+            dates = pd.to_datetime(chunk['DATE'], errors='coerce')
+            if row_filter is not None:
+                selected = row_filter.mask(dates.to_numpy(), chunk['DATE'].to_numpy(dtype=object))
+                if not selected.all():
+                    chunk = chunk[selected].reset_index(drop=True)
+                    dates = dates[selected].reset_index(drop=True)
+            day_keys = dates.dt.strftime('%Y-%m-%d').to_numpy(dtype=object)
+            years = dates.dt.year.fillna(0).astype(int).to_numpy()
+            digests = content_digest(day_keys, chunk['CONTENT'].to_numpy(dtype=object))
+
+            found, first_source = digest_index.lookup(digests, years)
+            keep = first_occurrence_mask(digests) & ~found
+            # 记录被删除的行最早出现在哪个文件中（文件内部的重复记为本文件）
+            dropped_sources = np.where(found, first_source, source_id)[~keep]
+            also_seen += np.bincount(dropped_sources, minlength=len(also_seen))[:len(also_seen)]
+
+            digest_index.add(digests[keep], years[keep], source_id)
+            kept = int(keep.sum())
+            keys = _sort_keys(dates[keep])
+            if kept:
+                min_key = int(keys.min()) if min_key is None else min(min_key, int(keys.min()))
+            run_writer.add(pd.DataFrame({
+                'KEY': keys,
+                'SEQ': np.arange(next_seq, next_seq + kept, dtype=np.int64),
+                'CONTENT': chunk['CONTENT'].to_numpy()[keep],
+                'SOURCE': np.full(kept, source_id, dtype=np.int16),
+            }))
+            if near_detector is not None:
+                near_detector.add_batch(chunk['DATE'][keep], chunk['CONTENT'][keep])
+            next_seq += kept
+            rows_read += len(chunk)
+            rows_kept += kept
+        source_stats[file] = (rows_read, rows_kept, also_seen)
+        print(f"文件 {file} 处理完成：读取 {rows_read} 条，跨文件去重后保留 {rows_kept} 条，已合并到总数据中。")
+    run_writer.flush()
+    return source_stats, next_seq, min_key
+
+
+def _append_merge_log(log_file_name, title, ordered_files, outputs, source_stats, digest_index, details):
+    """将跨文件去重的统计信息追加到日志文件"""
+    current_time = time.strftime("%Y-%m-%d %H:%M:%S")
+    source_lines = []
+    for file, (rows_read, rows_kept, also_seen) in source_stats.items():
+        source_lines.append(f"{file}: 读取 {rows_read} 条，删除重复 {rows_read - rows_kept} 条，保留 {rows_kept} 条")
+        for other_id in np.flatnonzero(also_seen):
+            other = digest_index.sources[other_id]
+            label = '本文件内重复' if other == file else f'也出现在 {other}'
+            source_lines.append(f"    {label}: {also_seen[other_id]} 条")
+    source_summary = '\n'.join(source_lines)
+    log_content = f"""
+
+==================================================
+{title}
+==================================================
+处理时间: {current_time}
+输入文件（按来源优先级）: {' > '.join(ordered_files)}
+输出: {', '.join(output.path for output in outputs.values())}
+
+------------------ 统计摘要 ------------------
+{source_summary}
+{details}----------------------------------------------
+"""
+    try:
+        with open(log_file_name, 'a', encoding='utf-8') as f:
+            f.write(log_content)
+        print(f"统计信息已成功追加到文件：{log_file_name}")
+    except Exception as e:
+        print(f"错误：无法写入日志文件。原因: {e}")
+
+
+def _write_outputs(outputs, block, seconds):
+    """把一块数据写入各输出，seconds 中按输出累计写出（编码、压缩和写入）的耗时"""
+    for name, output in outputs.items():
+        start = time.perf_counter()
+        output.write(block)
+        seconds[name] = seconds.get(name, 0.0) + time.perf_counter() - start
+
+
+def _output_summary(outputs, seconds):
+    """各输出在磁盘上的大小和写出耗时，写入合并日志"""
+    lines = []
+    for name, output in outputs.items():
+        note = f"，{output.compression or '未压缩'}，{output.engine} 编码" if isinstance(output, CsvCorpus) else ''
+        lines.append(f"写出 {output.path}: {path_size(output.path) / 1024 / 1024:.1f} MB"
+                     f"（耗时 {seconds.get(name, 0.0):.2f} 秒{note}）\n")
+    return ''.join(lines)
+
+
+def _filter_line(row_filter):
+    return f"筛选: {row_filter.describe()}\n" if row_filter is not None else ''
+
+
+def _corpus_state(outputs, rows, date_min_key, sources):
+    """合并结果的状态，保存在清单中供增量合并使用"""
+    last_key = next(iter(outputs.values())).last_key
+    return {
+        'rows': rows,
+        'date_min': _key_to_text(date_min_key),
+        'date_max': _key_to_text(last_key),
+        'sources': list(sources),
+        'outputs': {name: output.state() for name, output in outputs.items()},
+    }
+
+
+def merge_outputs(input_csv_files, outputs, log_file_name='processing_log.txt', source_precedence=None,
+                  global_index_dir=None, chunk_size=100000, enable_near_dedup=False, near_dedup_options=None,
+                  buffer_rows=200000, spill_dir=None, row_filter=None):
+    """
+    合并各数据源的处理结果：按来源优先级跨文件去重，按日期排序后写出，并向日志追加统计。
+    outputs 为 build_outputs 创建的输出（CSV 文件、按年/月分区的 Parquet 数据集、文章库中的一种或几种）。
+    同一天的同一篇新闻出现在多个文件中时，保留优先级最高的文件中的那一条；
+    source_precedence 中未列出的文件按 input_csv_files 中的顺序排在最后。
+    排序采用外部归并：内存占用由 buffer_rows（以及 chunk_size）决定，与语料总量无关；
+    日期相同的行按来源优先级、再按在文件中的先后排列，输出顺序是确定的。
+    row_filter（row_filter.RowFilter）只合并日期范围内或抽样抽中的新闻。
+    返回合并结果的状态（行数、日期范围、各输出的状态，见 append_outputs）；没有可合并的数据时返回 None。
+    """
+    source_precedence = list(source_precedence or [])
+
+    def precedence_rank(file):
+        """返回文件在来源优先级中的位置，数值越小优先级越高"""
+        if file in source_precedence:
+            return source_precedence.index(file)
+        return len(source_precedence) + input_csv_files.index(file)
+
+    # 全量合并时从空索引开始重建，结束后保存
+    digest_index = PartitionedDigestIndex(global_index_dir)
+    digest_index.clear()
+    for file in input_csv_files:
+        digest_index.source_id(file)
+
+    ordered_files = sorted(input_csv_files, key=precedence_rank)
+    near_detector = NearDuplicateDetector(**(near_dedup_options or {})) if enable_near_dedup else None
+    if spill_dir:
+        os.makedirs(spill_dir, exist_ok=True)
+    spill = tempfile.TemporaryDirectory(prefix='merge_runs_', dir=spill_dir)
+    run_writer = SortedRunWriter(spill.name, buffer_rows)
+    source_stats, kept_rows, min_key = _dedup_to_runs(ordered_files, digest_index, run_writer, chunk_size,
+                                                      near_detector, row_filter)
+
+    # 可选：近似重复检测。行按来源优先级编号，每个簇保留优先级最高来源中的那一条
+    near_duplicate_log = ''
+    near_keep = None
+    if near_detector is not None and kept_rows:
+        print("正在进行近似重复检测 (MinHash + LSH)...")
+        near_result = near_detector.resolve()
+        near_keep = near_result.keep
+        print(near_result.summary())
+        near_duplicate_log = (f"近似重复删除条数: {near_result.stats['dropped']}"
+                              f"（吞吐量 {near_result.stats['docs_per_sec']} 条/秒）\n")
+
+    if not kept_rows:
+        spill.cleanup()
+        print("没有有效的数据可以合并，请检查输入文件。")
+        return None
+
+    output_names = ', '.join(output.path for output in outputs.values())
+    print(f"所有文件处理完成，正在按日期归并 {len(run_writer.run_paths)} 个有序段并写入 {output_names}...")
+    for output in outputs.values():
+        output.source_names = digest_index.sources
+        output.open_full()
+    total_rows = 0
+    write_seconds = {}
+    try:
+        for block in merge_sorted_runs(run_writer.run_paths):
+            if near_keep is not None:
+                block = block[near_keep[block['SEQ'].to_numpy()]]
+            _write_outputs(outputs, block, write_seconds)
+            total_rows += len(block)
+        for output in outputs.values():
+            output.close()
+    finally:
+        spill.cleanup()
+    print(f"数据已成功保存到 {output_names}。")
+
+    # 保存全局摘要索引，供之后的运行复用
+    digest_index.save()
+    print(f"全局摘要索引已保存到 {global_index_dir}（共 {len(digest_index)} 条）。")
+
+    _append_merge_log(log_file_name, '合并去重日志', ordered_files, outputs, source_stats, digest_index,
+                      f"{_filter_line(row_filter)}{near_duplicate_log}外部归并有序段数: {len(run_writer.run_paths)}（每段最多缓存 {buffer_rows} 行）\n"
+                      f"合并后新闻总条数: {total_rows}\n{_output_summary(outputs, write_seconds)}")
+    return _corpus_state(outputs, total_rows, min_key, [file for file in ordered_files if file in source_stats])
+
+
+def append_outputs(input_csv_files, corpus, outputs, log_file_name='processing_log.txt', global_index_dir=None,
+                   chunk_size=100000, buffer_rows=200000, spill_dir=None, row_filter=None):
+    """
+    增量合并：把新数据源的处理结果并入已有的合并结果，不重新读取已合并的数据源。
+    corpus 为上次合并返回（并保存在清单中）的状态，outputs 为按其中记录的状态创建的输出。
+    新数据与已保存的全局摘要索引比对去重，已有语料中的新闻优先保留；新数据按 input_csv_files 的顺序决定彼此之间的优先级。
+    新数据的日期都不早于已有结果的末尾时直接追加；否则只读回并重写从最早受影响的日期开始的那一段
+    （CSV 根据合并时记录的分块偏移定位，Parquet 以月份分区为单位，文章库按记录的日期二分定位）。返回更新后的合并结果状态。
+    """
+    digest_index = PartitionedDigestIndex(global_index_dir)
+    if spill_dir:
+        os.makedirs(spill_dir, exist_ok=True)
+    spill = tempfile.TemporaryDirectory(prefix='merge_runs_', dir=spill_dir)
+    modes = []
+    write_seconds = {}
+    try:
+        run_writer = SortedRunWriter(spill.name, buffer_rows)
+        source_stats, kept_rows, min_key = _dedup_to_runs(input_csv_files, digest_index, run_writer, chunk_size,
+                                                          row_filter=row_filter)
+        for name, output in outputs.items():
+            output.source_names = digest_index.sources
+            if not kept_rows:
+                modes.append(f"{name}: 无需改动（新数据均为重复）")
+                continue
+            # 需要重写的已有数据使用负的序号，同一日期内排在新数据之前
+            tail_writer = SortedRunWriter(spill.name, buffer_rows, prefix=f'tail_{name}_')
+            tail_rows = 0
+            for block in output.tail_blocks(min_key, chunk_size):
+                block['SEQ'] = np.arange(tail_rows, tail_rows + len(block), dtype=np.int64) + _TAIL_SEQ_BASE
+                tail_writer.add(block)
+                tail_rows += len(block)
+            tail_writer.flush()
+            mode = f"{name}: {output.tail_note}" + (f"（读回已有 {tail_rows} 条）" if tail_rows else '')
+            print(f"正在将新数据并入 {output.path}：{mode}...")
+            output.drop_tail()
+            for block in merge_sorted_runs(tail_writer.run_paths + run_writer.run_paths):
+                _write_outputs({name: output}, block, write_seconds)
+            output.close()
+            modes.append(mode)
+    finally:
+        spill.cleanup()
+    print("新数据已并入合并结果。")
+
+    digest_index.save()
+    print(f"全局摘要索引已保存到 {global_index_dir}。")
+
+    total_rows = corpus['rows'] + kept_rows
+    mode_lines = ''.join(f"合并方式 {mode}\n" for mode in modes)
+    _append_merge_log(log_file_name, '增量合并日志', input_csv_files, outputs, source_stats, digest_index,
+                      f"{_filter_line(row_filter)}{mode_lines}新增新闻条数: {kept_rows}\n合并后新闻总条数: {total_rows}\n"
+                      f"{_output_summary(outputs, write_seconds)}")
+    known_keys = [key for key in (_text_to_key(corpus['date_min']), min_key) if key is not None]
+    return _corpus_state(outputs, total_rows, min(known_keys) if known_keys else None,
+                         corpus['sources'] + [file for file in input_csv_files if file in source_stats])
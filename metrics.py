@@ -0,0 +1,263 @@
+import argparse
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows 上没有 resource 模块，不记录峰值内存
+    resource = None
+
+# 每条记录的字段：run_id 标识一次运行，source 为数据源名称（合并步骤为 'merge'），stage 为步骤名称
+# peak_rss_mb 为步骤执行期间的峰值常驻内存，process_peak_mb 为进程到该步骤结束时为止的峰值
+RECORD_FIELDS = ['run_id', 'time', 'source', 'stage', 'calls', 'wall_seconds', 'cpu_seconds', 'peak_rss_mb',
+                 'process_peak_mb', 'py_peak_mb', 'rows_in', 'rows_out', 'bytes_read', 'bytes_written', 'profile']
+
+# Linux 上向 clear_refs 写入 5 会把进程的常驻内存峰值（VmHWM，也是 ru_maxrss 的来源）重置为当前值，
+# 从而单独测量每个步骤的峰值；重置前的峰值保存在 _process_peak_kb 中
+_CLEAR_REFS = '/proc/self/clear_refs'
+_process_peak_kb = 0
+# 正在执行的步骤（可以嵌套）中，各自在内层步骤开始之前已达到的峰值（KB）
+_open_stage_peaks = []
+
+
+def new_run_id():
+    return time.strftime('%Y%m%d-%H%M%S') + f'-{os.getpid()}'
+
+
+def peak_rss_mb():
+    """当前进程到目前为止的峰值常驻内存（MB），包括步骤统计重置峰值记录之前的峰值"""
+    if resource is None:
+        return None
+    # Linux 上 ru_maxrss 以 KB 为单位，macOS 上以字节为单位
+    if sys.platform == 'darwin':
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 / 1024, 1)
+    return round(max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, _high_water_kb() or 0, _process_peak_kb)
+                 / 1024, 1)
+
+
+def _high_water_kb():
+    """/proc/self/status 中的 VmHWM（KB）：上次重置以来的峰值常驻内存；不是 Linux 时返回 None"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_high_water():
+    """把峰值常驻内存重置为当前值，返回重置前的峰值（KB）；不支持重置时返回 None"""
+    global _process_peak_kb
+    peak = _high_water_kb()
+    if peak is None:
+        return None
+    try:
+        with open(_CLEAR_REFS, 'w') as f:
+            f.write('5')
+    except OSError:
+        return None
+    _process_peak_kb = max(_process_peak_kb, peak)
+    return peak
+
+
+def _begin_stage_peak():
+    """步骤开始：重置峰值记录，外层步骤到此为止的峰值先记下来；返回能否测量本步骤的峰值"""
+    peak = _reset_high_water()
+    if peak is None:
+        return False
+    if _open_stage_peaks:
+        _open_stage_peaks[-1] = max(_open_stage_peaks[-1], peak)
+    _open_stage_peaks.append(0)
+    return True
+
+
+def _end_stage_peak():
+    """步骤结束：返回本步骤（含内层步骤）的峰值常驻内存（KB），并计入外层步骤"""
+    peak = max(_high_water_kb() or 0, _open_stage_peaks.pop())
+    if _open_stage_peaks:
+        _open_stage_peaks[-1] = max(_open_stage_peaks[-1], peak)
+    return peak
+
+
+def path_size(path):
+    """文件大小，或目录中所有文件的总大小（字节）；不存在时为 0"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+class StageRecorder:
+    """
+    记录一个数据源（或合并步骤）中各步骤的耗时与吞吐：墙钟时间、CPU 时间、峰值内存、行数、读写字节数。
+    同一步骤在各批次中的多次调用累加为一条记录。peak_rss_mb 为各次调用期间峰值常驻内存的最大值，
+    只在 Linux 上可以测量（每次调用开始时重置进程的峰值记录），其他平台为 None；process_peak_mb 为进程的峰值。
+    profile_stages 中列出的步骤用 cProfile 采样，结果保存到 profile_dir；
+    trace_memory 为 True 时用 tracemalloc 记录各步骤中 Python 对象的峰值内存。
+    """
+
+    def __init__(self, source, run_id=None, profile_stages=(), profile_dir=None, trace_memory=False):
+        self.source = source
+        self.run_id = run_id or new_run_id()
+        self.profile_stages = set(profile_stages or ())
+        self.profile_dir = profile_dir
+        self.trace_memory = trace_memory
+        self._stages = {}
+        self._profiles = {}
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _entry(self, stage):
+        if stage not in self._stages:
+            self._stages[stage] = {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_rss_mb': None,
+                                   'process_peak_mb': None, 'py_peak_mb': None, 'rows_in': 0, 'rows_out': 0, 'bytes_read': 0,
+                                   'bytes_written': 0}
+        return self._stages[stage]
+
+    def add(self, stage, **counts):
+        """累加行数、字节数等计数"""
+        entry = self._entry(stage)
+        for key, value in counts.items():
+            entry[key] += value
+
+    @contextmanager
+    def stage(self, name, rows_in=0):
+        """
+        记录一次步骤调用：with recorder.stage('dedup', rows_in=len(df)) as counts: ...; counts['rows_out'] = len(df)
+        counts 中还可以填写 bytes_read / bytes_written。
+        """
+        entry = self._entry(name)
+        counts = {'rows_out': 0, 'bytes_read': 0, 'bytes_written': 0}
+        profiler = None
+        if name in self.profile_stages:
+            profiler = self._profiles.setdefault(name, cProfile.Profile())
+            profiler.enable()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        measure_peak = _begin_stage_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield counts
+        finally:
+            entry['wall_seconds'] += time.perf_counter() - wall
+            entry['cpu_seconds'] += time.process_time() - cpu
+            if profiler is not None:
+                profiler.disable()
+            if self.trace_memory:
+                peak = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+                entry['py_peak_mb'] = max(entry['py_peak_mb'] or 0, peak)
+            if measure_peak:
+                peak = round(_end_stage_peak() / 1024, 1)
+                entry['peak_rss_mb'] = max(entry['peak_rss_mb'] or 0, peak)
+            entry['process_peak_mb'] = peak_rss_mb()
+            entry['calls'] += 1
+            entry['rows_in'] += rows_in
+            for key, value in counts.items():
+                entry[key] += value
+
+    def timed_batches(self, name, batches):
+        """逐批产出 batches 中的数据，读取每一批的时间记入 name 步骤"""
+        iterator = iter(batches)
+        while True:
+            with self.stage(name) as counts:
+                batch = next(iterator, None)
+                counts['rows_out'] = 0 if batch is None else len(batch)
+            if batch is None:
+                return
+            yield batch
+
+    def _dump_profile(self, stage):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f'{self.run_id}_{self.source}_{stage}.prof')
+        self._profiles[stage].dump_stats(path)
+        return path
+
+    def records(self):
+        """各步骤的记录（字典列表），cProfile 结果在此时写入文件"""
+        current_time = time.strftime("%Y-%m-%d %H:%M:%S")
+        records = []
+        for stage, entry in self._stages.items():
+            record = {'run_id': self.run_id, 'time': current_time, 'source': self.source, 'stage': stage,
+                      **{key: round(value, 3) if isinstance(value, float) else value for key, value in entry.items()},
+                      'profile': self._dump_profile(stage) if stage in self._profiles else None}
+            records.append(record)
+        return records
+
+
+def append_metrics(records, metrics_file):
+    """将记录以 JSON Lines 格式追加到 metrics_file"""
+    try:
+        os.makedirs(os.path.dirname(metrics_file) or '.', exist_ok=True)
+        with open(metrics_file, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        print(f"步骤统计已追加到文件：{metrics_file}")
+    except Exception as e:
+        print(f"错误：无法写入步骤统计文件。原因: {e}")
+
+
+def load_metrics(metrics_file):
+    """读取 JSON Lines 记录为 DataFrame"""
+    with open(metrics_file, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return pd.DataFrame(records, columns=RECORD_FIELDS)
+
+
+def summarize_run(df, run_id):
+    """一次运行中各步骤的汇总（所有数据源相加，峰值内存取最大值）"""
+    run = df[df['run_id'] == run_id]
+    return run.groupby('stage', sort=False).agg(
+        wall_seconds=('wall_seconds', 'sum'), cpu_seconds=('cpu_seconds', 'sum'), peak_rss_mb=('peak_rss_mb', 'max'),
+        process_peak_mb=('process_peak_mb', 'max'), rows_in=('rows_in', 'sum'), rows_out=('rows_out', 'sum'),
+        bytes_read=('bytes_read', 'sum'), bytes_written=('bytes_written', 'sum'))
+
+
+def compare_runs(df, base_run, new_run):
+    """比较两次运行中各步骤的墙钟时间、CPU 时间和峰值内存，change 为相对变化（%）"""
+    base, new = summarize_run(df, base_run), summarize_run(df, new_run)
+    columns = ['wall_seconds', 'cpu_seconds', 'peak_rss_mb']
+    table = base[columns].join(new[columns], how='outer', lsuffix='_base', rsuffix='_new')
+    table = table.reindex(list(dict.fromkeys([*new.index, *base.index])))
+    for column in columns:
+        table[f'{column}_change'] = ((table[f'{column}_new'] / table[f'{column}_base'] - 1) * 100).round(1)
+    return table
+
+
+if __name__ == '__main__':
+    import pipeline_config as config
+
+    parser = argparse.ArgumentParser(description='查看和比较流水线各步骤的统计（JSON Lines）')
+    parser.add_argument('runs', nargs='*', help='要查看的运行编号；给出两个时比较这两次运行，默认比较最近两次运行')
+    parser.add_argument('--file', default=config.metrics_file, help='步骤统计文件')
+    parser.add_argument('--list', action='store_true', help='列出所有运行编号')
+    args = parser.parse_args()
+
+    metrics = load_metrics(args.file)
+    run_ids = list(dict.fromkeys(metrics['run_id']))
+    pd.set_option('display.width', 200)
+    pd.set_option('display.max_columns', 20)
+    if args.list or not run_ids:
+        for run_id in run_ids:
+            run = metrics[metrics['run_id'] == run_id]
+            print(f"{run_id}  {run['time'].max()}  数据源: {', '.join(dict.fromkeys(run['source']))}")
+    elif len(args.runs) == 1 or len(run_ids) == 1:
+        run_id = args.runs[0] if args.runs else run_ids[-1]
+        print(f"运行 {run_id} 的各步骤统计：")
+        print(summarize_run(metrics, run_id))
+    else:
+        base_run, new_run = args.runs[:2] if len(args.runs) >= 2 else run_ids[-2:]
+        print(f"运行 {base_run}（基准）与 {new_run} 的比较：")
+        print(summarize_run(metrics, new_run))
+        print()
+        print(compare_runs(metrics, base_run, new_run))
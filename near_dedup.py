@@ -0,0 +1,275 @@
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from csv_output import CsvWriter, compression_of, read_csv_chunks
+from process_pool import ordered_map
+
+# 分词规则：连续的字母数字视为一个词，统一小写
+_TOKEN_PATTERN = re.compile(r'\w+')
+_SHINGLE_PRIME = np.uint64(1099511628211)
+_MAX_HASH = np.uint32(0xFFFFFFFF)
+
+# 默认参数：64 个哈希函数分成 16 个 band（每个 band 4 行），对应的相似度阈值约为 0.5，
+# 之后再用签名估计的 Jaccard 相似度精确筛选
+DEFAULT_OPTIONS = {
+    'num_perm': 64,
+    'bands': 16,
+    'shingle_size': 5,
+    'threshold': 0.8,
+    'date_window_days': 3,
+    'max_bucket_scan': 50,
+    'keep': 'first',
+    'workers': None,
+    'chunk_size': 5000,
+}
+
+
+def _permutations(num_perm, seed=20250727):
+    """生成 MinHash 使用的随机乘数（奇数）和偏移量，固定随机种子保证结果可复现"""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def shingle_hashes(texts, shingle_size=5):
+    """
+    向量化地计算一批文本的词级 shingle 哈希。
+    返回 (所有 shingle 的哈希, 每篇文本的 shingle 数量)，shingle 按文本顺序连续排列。
+    """
+    token_lists = [_TOKEN_PATTERN.findall(text.lower()) if isinstance(text, str) else [] for text in texts]
+    token_counts = np.fromiter((len(tokens) for tokens in token_lists), dtype=np.int64, count=len(token_lists))
+    flat_tokens = np.empty(int(token_counts.sum()), dtype=object)
+    flat_tokens[:] = [token for tokens in token_lists for token in tokens]
+    token_hashes = pd.util.hash_array(flat_tokens, categorize=True)
+    doc_of_token = np.repeat(np.arange(len(texts)), token_counts)
+
+    # 不足 shingle_size 个词的文本，整篇作为一个 shingle
+    k = shingle_size
+    n_positions = max(len(token_hashes) - k + 1, 0)
+    shingles = token_hashes[:n_positions].copy()
+    with np.errstate(over='ignore'):
+        for j in range(1, k):
+            shingles = shingles * _SHINGLE_PRIME + token_hashes[j:j + n_positions]
+    valid = doc_of_token[:n_positions] == doc_of_token[k - 1:k - 1 + n_positions]
+    shingles = shingles[valid]
+    shingle_docs = doc_of_token[:n_positions][valid]
+
+    short_docs = np.flatnonzero((token_counts > 0) & (token_counts < k))
+    if len(short_docs):
+        starts = np.concatenate([[0], np.cumsum(token_counts)[:-1]])
+        extra = np.empty(len(short_docs), dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            for i, doc in enumerate(short_docs):
+                value = np.uint64(0)
+                for h in token_hashes[starts[doc]:starts[doc] + token_counts[doc]]:
+                    value = value * _SHINGLE_PRIME + h
+                extra[i] = value
+        shingles = np.concatenate([shingles, extra])
+        shingle_docs = np.concatenate([shingle_docs, short_docs])
+        order = np.argsort(shingle_docs, kind='stable')
+        shingles, shingle_docs = shingles[order], shingle_docs[order]
+
+    counts = np.bincount(shingle_docs, minlength=len(texts))
+    return shingles, counts
+
+
+def minhash_signatures(texts, num_perm=64, shingle_size=5):
+    """计算一批文本的 MinHash 签名，返回 (签名矩阵 [文本数, num_perm], 每篇文本的字符数, 是否有可用的 shingle)"""
+    shingles, counts = shingle_hashes(texts, shingle_size)
+    signatures = np.full((len(texts), num_perm), _MAX_HASH, dtype=np.uint32)
+    has_shingles = counts > 0
+    if has_shingles.any():
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[has_shingles]
+        a, b = _permutations(num_perm)
+        with np.errstate(over='ignore'):
+            for p in range(num_perm):
+                # multiply-shift 哈希：取乘积的高 32 位
+                hashed = ((a[p] * shingles + b[p]) >> np.uint64(32)).astype(np.uint32)
+                signatures[has_shingles, p] = np.minimum.reduceat(hashed, starts)
+    lengths = np.fromiter((len(text) if isinstance(text, str) else 0 for text in texts),
+                          dtype=np.int64, count=len(texts))
+    return signatures, lengths, has_shingles
+
+
+def _signature_worker(args):
+    texts, num_perm, shingle_size = args
+    return minhash_signatures(texts, num_perm, shingle_size)
+
+
+def _connected_labels(n, left, right):
+    """对候选对做连通分量合并，每个分量的标签为其中最小的行号"""
+    labels = np.arange(n)
+    if len(left) == 0:
+        return labels
+    while True:
+        merged = np.minimum(labels[left], labels[right])
+        updated = labels.copy()
+        np.minimum.at(updated, left, merged)
+        np.minimum.at(updated, right, merged)
+        # 指针跳跃，压缩标签链
+        while True:
+            jumped = updated[updated]
+            if np.array_equal(jumped, updated):
+                break
+            updated = jumped
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+class NearDuplicateDetector:
+    """
+    基于 MinHash + LSH 的近似重复检测。
+    add_batch 分批计算签名（使用进程池），resolve 在全部签名上做 LSH 分桶，
+    只比较同一桶中日期相差不超过 date_window_days 天的文本，返回簇编号和保留/删除决定。
+    """
+
+    def __init__(self, **options):
+        unknown = set(options) - set(DEFAULT_OPTIONS)
+        if unknown:
+            raise ValueError(f"未知的近似去重参数: {sorted(unknown)}")
+        self.options = {**DEFAULT_OPTIONS, **options}
+        if self.options['num_perm'] % self.options['bands'] != 0:
+            raise ValueError("num_perm 必须能被 bands 整除。")
+        self._signatures = []
+        self._lengths = []
+        self._has_shingles = []
+        self._days = []
+        self._executor = None
+        self._seconds = 0.0
+
+    def _map(self, chunks):
+        workers = self.options['workers'] or os.cpu_count()
+        args = [(chunk, self.options['num_perm'], self.options['shingle_size']) for chunk in chunks]
+        if workers <= 1 or len(chunks) <= 1:
+            return map(_signature_worker, args)
+        # 进程池在各批之间复用，resolve 时关闭
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        return ordered_map(_signature_worker, args, workers, self._executor)
+
+    def add_batch(self, dates, texts):
+        """加入一批文本及其日期（顺序即最终结果中的行号顺序）"""
+        start = time.time()
+        texts = list(texts)
+        days = pd.to_datetime(pd.Series(dates)).to_numpy().astype('datetime64[D]').astype(np.int64)
+        size = self.options['chunk_size']
+        chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+        for signatures, lengths, has_shingles in self._map(chunks):
+            self._signatures.append(signatures)
+            self._lengths.append(lengths)
+            self._has_shingles.append(has_shingles)
+        self._days.append(days)
+        self._seconds += time.time() - start
+
+    def __len__(self):
+        return sum(len(days) for days in self._days)
+
+    def _candidate_pairs(self, signatures, days, active):
+        """LSH 分桶：同一 band 哈希相同且日期在窗口内的文本构成候选对"""
+        bands = self.options['bands']
+        rows = self.options['num_perm'] // bands
+        window = self.options['date_window_days']
+        max_scan = self.options['max_bucket_scan']
+        index = np.flatnonzero(active)
+        band_values = signatures[index].reshape(len(index), bands, rows).astype(np.uint64)
+        pairs = []
+        with np.errstate(over='ignore'):
+            for band in range(bands):
+                keys = np.zeros(len(index), dtype=np.uint64)
+                for r in range(rows):
+                    keys = keys * _SHINGLE_PRIME + band_values[:, band, r]
+                order = np.lexsort((days[index], keys))
+                sorted_keys, sorted_days, sorted_rows = keys[order], days[index][order], index[order]
+                # 同桶内按日期排序，向后逐个偏移比较，超出日期窗口后更远的元素也一定超出
+                for offset in range(1, max_scan + 1):
+                    if offset >= len(order):
+                        break
+                    match = ((sorted_keys[offset:] == sorted_keys[:-offset])
+                             & (sorted_days[offset:] - sorted_days[:-offset] <= window))
+                    if not match.any():
+                        break
+                    pairs.append(np.stack([sorted_rows[:-offset][match], sorted_rows[offset:][match]], axis=1))
+        if not pairs:
+            return np.empty((0, 2), dtype=np.int64)
+        return np.unique(np.concatenate(pairs), axis=0)
+
+    def resolve(self):
+        """在所有已加入的文本上完成近似去重，返回 NearDuplicateResult"""
+        start = time.time()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        n = len(self)
+        if n == 0:
+            return NearDuplicateResult(np.empty(0, dtype=np.int64), np.empty(0, dtype=bool), {'docs': 0})
+        signatures = np.concatenate(self._signatures)
+        lengths = np.concatenate(self._lengths)
+        days = np.concatenate(self._days)
+        # 没有任何词或日期缺失的文本不参与近似去重
+        active = np.concatenate(self._has_shingles) & (days != np.datetime64('NaT').astype(np.int64))
+
+        pairs = self._candidate_pairs(signatures, days, active)
+        # 用签名估计 Jaccard 相似度，分块计算避免一次性占用过多内存
+        similar = np.zeros(len(pairs), dtype=bool)
+        for i in range(0, len(pairs), 200000):
+            chunk = pairs[i:i + 200000]
+            estimate = (signatures[chunk[:, 0]] == signatures[chunk[:, 1]]).mean(axis=1)
+            similar[i:i + 200000] = estimate >= self.options['threshold']
+        edges = pairs[similar]
+        labels = _connected_labels(n, edges[:, 0], edges[:, 1])
+
+        keep = np.zeros(n, dtype=bool)
+        if self.options['keep'] == 'longest':
+            # 每个簇保留正文最长的一条，长度相同时保留靠前的
+            order = np.lexsort((np.arange(n), -lengths, labels))
+            first_in_cluster = np.ones(n, dtype=bool)
+            first_in_cluster[1:] = labels[order][1:] != labels[order][:-1]
+            keep[order[first_in_cluster]] = True
+        else:
+            keep = labels == np.arange(n)
+
+        self._seconds += time.time() - start
+        stats = {
+            'docs': n,
+            'candidate_pairs': int(len(pairs)),
+            'similar_pairs': int(len(edges)),
+            'clusters_with_duplicates': int(len(np.unique(labels[~keep]))),
+            'dropped': int((~keep).sum()),
+            'seconds': round(self._seconds, 3),
+            'docs_per_sec': round(n / self._seconds, 1) if self._seconds > 0 else None,
+        }
+        return NearDuplicateResult(labels, keep, stats)
+
+
+class NearDuplicateResult:
+    """近似去重结果：cluster_ids 为每行所属簇（簇内最小行号），keep 为是否保留"""
+
+    def __init__(self, cluster_ids, keep, stats):
+        self.cluster_ids = cluster_ids
+        self.keep = keep
+        self.stats = stats
+
+    def summary(self):
+        return (f"近似去重：共 {self.stats['docs']} 条，删除 {self.stats.get('dropped', 0)} 条，"
+                f"候选对 {self.stats.get('candidate_pairs', 0)} 个，"
+                f"吞吐量 {self.stats.get('docs_per_sec')} 条/秒")
+
+
+def drop_rows_from_csv(csv_path, keep, chunk_size=100000):
+    """按 keep 掩码（与 CSV 数据行一一对应）流式重写 CSV，删除近似重复的行，保持 utf-8-sig 编码和原来的压缩方式"""
+    tmp_path = csv_path + '.tmp'
+    position = 0
+    writer = CsvWriter(tmp_path, compression=compression_of(csv_path))
+    for chunk in read_csv_chunks(csv_path, chunk_size, dtype=str, keep_default_na=False, encoding='utf-8-sig'):
+        mask = keep[position:position + len(chunk)]
+        position += len(chunk)
+        writer.write(chunk[mask])
+    if writer.started:
+        os.replace(tmp_path, csv_path)
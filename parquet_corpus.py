@@ -0,0 +1,289 @@
+import argparse
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # 未安装 pyarrow 时只能输出 CSV
+    pa = None
+
+# 每个行组的行数：行组是按 DATE 统计信息跳过数据的最小单位，数据按日期写入，每个行组覆盖一段连续的日期
+ROW_GROUP_ROWS = 50000
+# 缺失日期（NaT）的行放在这个分区中
+_MISSING_PARTITION = (0, 0)
+_NAT_KEY = np.iinfo(np.int64).max
+DEFAULT_COLUMNS = ['DATE', 'CONTENT', 'SOURCE']
+
+
+def _partitioning():
+    return ds.partitioning(pa.schema([('year', pa.int16()), ('month', pa.int8())]), flavor='hive')
+
+
+def _keys_to_dates(keys):
+    return np.where(keys == _NAT_KEY, np.iinfo(np.int64).min, keys).view('datetime64[ns]')
+
+
+class ParquetCorpus:
+    """
+    合并结果的 Parquet 形式：按 year=YYYY/month=MM 分区的数据集，每个分区内的文件按日期顺序写入。
+    列为 DATE（时间戳）、CONTENT、SOURCE（来源文件名，字典编码），压缩方式可配置，DATE 带行组统计信息。
+    与 merge.CsvCorpus 接口相同，由 merge.py 逐块写入已按日期排好序的数据。
+    """
+
+    def __init__(self, directory, state=None, compression='zstd'):
+        self.path = directory
+        self.compression = compression
+        self.source_names = []
+        self.rows = 0
+        self.tail_note = ''
+        state = state or {}
+        self.last_key = state.get('last_key')
+        self._bytes = state.get('bytes')
+        self._next_part = state.get('next_part', 0)
+        self._partition = None
+        self._writer = None
+        self._pending = []
+        self._pending_rows = 0
+        self._tail_partitions = []
+
+    def _partition_dir(self, partition):
+        year, month = partition
+        return os.path.join(self.path, f'year={year}', f'month={month:02d}')
+
+    def _partitions(self):
+        """已有的分区，按时间顺序排列（缺失日期的分区排在最后）"""
+        partitions = []
+        if os.path.isdir(self.path):
+            for year_dir in os.listdir(self.path):
+                if not year_dir.startswith('year='):
+                    continue
+                for month_dir in os.listdir(os.path.join(self.path, year_dir)):
+                    if month_dir.startswith('month='):
+                        partitions.append((int(year_dir[5:]), int(month_dir[6:])))
+        return sorted(partitions, key=lambda partition: (partition == _MISSING_PARTITION, partition))
+
+    def _files(self):
+        for partition in self._partitions():
+            directory = self._partition_dir(partition)
+            for name in sorted(os.listdir(directory)):
+                if name.endswith('.parquet'):
+                    yield os.path.join(directory, name)
+
+    def _total_bytes(self):
+        return sum(os.path.getsize(path) for path in self._files())
+
+    def open_full(self):
+        """全量写入：删除已有的分区"""
+        for year_dir in os.listdir(self.path) if os.path.isdir(self.path) else []:
+            if year_dir.startswith('year='):
+                shutil.rmtree(os.path.join(self.path, year_dir))
+        os.makedirs(self.path, exist_ok=True)
+        self.last_key = None
+        self._next_part = 0
+
+    def tail_blocks(self, min_key, chunk_size=100000):
+        """增量写入：读回从 min_key 所在月份开始的所有分区（这些分区将被重写），逐批产出 KEY、CONTENT、SOURCE"""
+        self._tail_partitions = []
+        if self.last_key is None or min_key >= self.last_key:
+            self.tail_note = '追加新文件'
+            return
+        first = tuple(pd.Timestamp(min_key).timetuple()[:2]) if min_key != _NAT_KEY else _MISSING_PARTITION
+        self._tail_partitions = [partition for partition in self._partitions()
+                                 if partition >= first or partition == _MISSING_PARTITION]
+        self.tail_note = f'重写 {len(self._tail_partitions)} 个月份分区（自 {first[0]}-{first[1]:02d} 起）'
+        for partition in self._tail_partitions:
+            directory = self._partition_dir(partition)
+            for name in sorted(os.listdir(directory)):
+                for batch in pq.ParquetFile(os.path.join(directory, name)).iter_batches(batch_size=chunk_size):
+                    dates = batch.column('DATE').to_pandas()
+                    keys = dates.to_numpy(dtype='datetime64[ns]').view(np.int64).copy()
+                    keys[dates.isna().to_numpy()] = _NAT_KEY
+                    sources = batch.column('SOURCE').to_pandas().astype(object)
+                    yield pd.DataFrame({'KEY': keys, 'CONTENT': batch.column('CONTENT').to_numpy(zero_copy_only=False),
+                                        'SOURCE': self._source_ids(sources)})
+
+    def _source_ids(self, names):
+        ids = np.full(len(names), -1, dtype=np.int16)
+        for name in pd.unique(names.dropna()):
+            if name not in self.source_names:
+                self.source_names.append(name)
+            ids[(names == name).to_numpy()] = self.source_names.index(name)
+        return ids
+
+    def drop_tail(self):
+        """删除 tail_blocks 读回的分区，之后写入的数据会重新生成它们"""
+        for partition in self._tail_partitions:
+            shutil.rmtree(self._partition_dir(partition))
+            year_dir = os.path.dirname(self._partition_dir(partition))
+            if not os.listdir(year_dir):
+                os.rmdir(year_dir)
+        self._tail_partitions = []
+
+    @staticmethod
+    def encode_block(block):
+        """
+        把一块数据转换为按分区切开的 Arrow 表（SOURCE 暂为来源编号，写入时再加上来源名称字典）；
+        不依赖写入状态，可以在其他进程中执行，由 write_encoded 按顺序写入
+        """
+        if not len(block):
+            return None
+        keys = block['KEY'].to_numpy()
+        dates = pd.DatetimeIndex(_keys_to_dates(keys))
+        codes = np.where(dates.isna(), 0, dates.year * 100 + dates.month)
+        contents = block['CONTENT'].to_numpy()
+        source_ids = block['SOURCE'].to_numpy().astype(np.int16)
+        # 数据按日期排序，相同分区的行是连续的
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        pieces = []
+        for start, end in zip(starts, np.r_[starts[1:], len(codes)]):
+            pieces.append((divmod(int(codes[start]), 100), pa.table({
+                'DATE': pa.array(_keys_to_dates(keys[start:end]), type=pa.timestamp('ns')),
+                'CONTENT': pa.array(contents[start:end], type=pa.string(), from_pandas=True),
+                'SOURCE': pa.array(source_ids[start:end], mask=source_ids[start:end] < 0),
+            })))
+        return pieces, len(block), int(keys[-1])
+
+    def write_encoded(self, encoded):
+        if encoded is None:
+            return
+        pieces, rows, last_key = encoded
+        for partition, table in pieces:
+            if partition != self._partition:
+                self._close_file()
+                self._partition = partition
+            self._pending.append(table)
+            self._pending_rows += table.num_rows
+            if self._pending_rows >= ROW_GROUP_ROWS:
+                self._flush()
+        self.rows += rows
+        self.last_key = last_key
+
+    def write(self, block):
+        self.write_encoded(self.encode_block(block))
+
+    def _table(self, tables):
+        table = pa.concat_tables(tables)
+        source_ids = table.column('SOURCE').combine_chunks()
+        return table.set_column(2, 'SOURCE', pa.DictionaryArray.from_arrays(
+            source_ids, pa.array(self.source_names, type=pa.string())))
+
+    def _flush(self):
+        if not self._pending_rows:
+            return
+        table = self._table(self._pending)
+        self._pending, self._pending_rows = [], 0
+        if self._writer is None:
+            directory = self._partition_dir(self._partition)
+            os.makedirs(directory, exist_ok=True)
+            self._writer = pq.ParquetWriter(os.path.join(directory, f'part-{self._next_part:05d}.parquet'),
+                                            table.schema, compression=self.compression, write_statistics=['DATE'])
+            self._next_part += 1
+        self._writer.write_table(table, row_group_size=ROW_GROUP_ROWS)
+
+    def _close_file(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def close(self):
+        self._close_file()
+        self._bytes = self._total_bytes()
+
+    def is_valid(self):
+        """数据集是否仍是上次写入后的状态"""
+        return self._bytes is not None and os.path.isdir(self.path) and self._total_bytes() == self._bytes
+
+    def state(self):
+        return {'path': self.path, 'bytes': self._bytes, 'next_part': self._next_part, 'last_key': self.last_key}
+
+
+def _date_filter(start=None, end=None):
+    """
+    日期范围 [start, end]（包含 end 当天）对应的过滤表达式：
+    分区字段用于跳过整个月份目录，DATE 用于按行组统计信息跳过数据。
+    """
+    expression = None
+    if start is not None:
+        start = pd.Timestamp(start)
+        expression = ((ds.field('year') > start.year)
+                      | ((ds.field('year') == start.year) & (ds.field('month') >= start.month)))
+        expression &= ds.field('DATE') >= pa.scalar(start.to_pydatetime(), type=pa.timestamp('ns'))
+    if end is not None:
+        end = pd.Timestamp(end)
+        upper = ((ds.field('year') < end.year)
+                 | ((ds.field('year') == end.year) & (ds.field('month') <= end.month)))
+        if end == end.normalize():
+            # 只给出日期时包含当天的全部时间
+            upper &= ds.field('DATE') < pa.scalar((end + pd.Timedelta(days=1)).to_pydatetime(), type=pa.timestamp('ns'))
+        else:
+            upper &= ds.field('DATE') <= pa.scalar(end.to_pydatetime(), type=pa.timestamp('ns'))
+        # 缺失日期的分区（year=0）不在任何日期范围内
+        upper &= ds.field('year') > 0
+        expression = upper if expression is None else expression & upper
+    return expression
+
+
+def open_corpus(directory):
+    """打开按年/月分区的 Parquet 数据集"""
+    if pa is None:
+        raise ImportError("读取 Parquet 数据集需要安装 pyarrow")
+    return ds.dataset(directory, format='parquet', partitioning=_partitioning())
+
+
+def corpus_files(directory):
+    """数据集中的所有文件，按日期顺序排列（缺失日期的分区在最后），依次读取即得到按日期排序的语料"""
+    return list(ParquetCorpus(directory)._files())
+
+
+def iter_corpus_batches(directory, start=None, end=None, columns=None, batch_size=100000):
+    """按日期范围和列分批读取语料，只读取与日期范围相交的分区和行组；行按日期顺序产出"""
+    dataset = open_corpus(directory)
+    scanner = dataset.scanner(columns=columns or DEFAULT_COLUMNS, filter=_date_filter(start, end),
+                              batch_size=batch_size)
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def read_corpus_table(directory, start=None, end=None, columns=None):
+    """与 load_corpus 相同，但返回 Arrow 表，不转换为 DataFrame"""
+    dataset = open_corpus(directory)
+    return dataset.to_table(columns=columns or DEFAULT_COLUMNS, filter=_date_filter(start, end))
+
+
+def load_corpus(directory, start=None, end=None, columns=None):
+    """
+    读取语料中日期在 [start, end] 之间（包含 end 当天）的新闻，返回 DataFrame。
+    columns 为需要的列（默认 DATE, CONTENT, SOURCE）；只读取与日期范围相交的分区和行组。
+    """
+    return read_corpus_table(directory, start, end, columns).to_pandas()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='按日期范围读取按年/月分区的 Parquet 语料')
+    parser.add_argument('directory', help='Parquet 数据集目录')
+    parser.add_argument('--start', help='起始日期（含），如 2020-01-01')
+    parser.add_argument('--end', help='结束日期（含当天），如 2020-12-31')
+    parser.add_argument('--columns', help='需要的列，逗号分隔，默认为 DATE,CONTENT,SOURCE')
+    parser.add_argument('--output', help='将结果保存为 CSV（utf-8-sig）或 Parquet 文件；不指定时只显示统计')
+    args = parser.parse_args()
+
+    columns = args.columns.split(',') if args.columns else None
+    fragments = list(open_corpus(args.directory).get_fragments(filter=_date_filter(args.start, args.end)))
+    print(f"日期范围 {args.start or '开始'} ~ {args.end or '结束'} 涉及 {len(fragments)} 个文件。")
+    df = load_corpus(args.directory, args.start, args.end, columns)
+    print(f"共读取 {len(df)} 条新闻。")
+    if 'DATE' in df.columns and len(df):
+        print(f"日期范围: {df['DATE'].min()} ~ {df['DATE'].max()}")
+    if args.output:
+        if args.output.endswith('.parquet'):
+            df.to_parquet(args.output, index=False)
+        else:
+            df.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"结果已保存到 {args.output}。")
@@ -0,0 +1,796 @@
+import argparse
+import os
+import time
+from functools import partial
+
+import pandas as pd
+
+import pipeline_config as config
+from boilerplate import BoilerplateStripper
+from date_normalizer import DateNormalizer
+from csv_output import CsvWriter
+from checkpoint import (SOURCE_STAGES, STAGES, CheckpointStore, file_state, file_unchanged, fingerprint,
+                        source_fingerprints, stage_arguments)
+from dedup import DigestDeduper
+from keyword_index import build_index
+from manifest import SourceManifest
+from merge import append_outputs, build_outputs, merge_outputs
+from metrics import StageRecorder, append_metrics, new_run_id, path_size
+from near_dedup import NearDuplicateDetector, drop_rows_from_csv
+from process_pool import ordered_map
+from quality_report import CoverageProfile, report_summary, summarize, write_report
+from row_filter import filter_arguments, from_args
+from source_cache import iter_source_batches, pa
+from text_cleaning import clean_corpus
+from token_export import export_tokens
+
+
+def merge_title_content(titles, contents):
+    """
+    标题和正文以换行连接，结果与 titles.astype(str) + '\n' + contents.astype(str) 相同（缺失的标题写为 'nan'）。
+    逐行一次拼接出结果，不产生 astype(str) 和 “标题 + 换行” 两份与整列同样大小的中间字符串。
+    """
+    return pd.Series([f'{title}\n{content}' for title, content in zip(titles.to_numpy(dtype=object),
+                                                                       contents.to_numpy(dtype=object))],
+                     index=titles.index, dtype=object)
+
+
+def _recorder(source_name, run_id=None, profile_stages=None, trace_memory=None):
+    """创建步骤统计记录器，未指定的选项使用 pipeline_config.py 中的配置"""
+    return StageRecorder(source_name, run_id, config.profile_stages if profile_stages is None else profile_stages,
+                         config.profile_dir, config.trace_memory if trace_memory is None else trace_memory)
+
+
+def process_source(source, batch_size=None, enable_near_dedup=None, near_dedup_options=None, run_id=None,
+                   profile_stages=None, trace_memory=None, resume=False, from_stage=None, row_filter=None):
+    """
+    按配置处理单个数据源：逐批去重、解析日期、删除无效日期行、合并标题和正文，并追加写入结果 CSV。
+    返回统计信息字典，供写日志使用；出错时字典中带有 'error'。
+    各步骤（load / boilerplate_count / boilerplate / dedup / date_parse / coverage / title_merge / write / near_dedup / checkpoint）的耗时、内存和行数记录在 stats['stages'] 中；
+    profile_stages、trace_memory 见 metrics.StageRecorder，未指定时使用 pipeline_config.py 中的配置。
+    检查点（见 checkpoint.py）：pipeline_config.checkpoint_stages 中的步骤的输出逐批保存为检查点，写出完成后记录 write 的指纹。
+    resume 为 True 时从最后一个仍然有效的检查点继续，write 有效时直接跳过该数据源；from_stage 为要重新运行的第一个步骤，
+    之前的步骤使用检查点。从检查点继续时 stats['resumed'] 为所用检查点的步骤。
+    row_filter（row_filter.RowFilter）只处理日期范围内或抽样抽中的行：读取时按日期列筛选，跳过的行不还原正文；
+    筛选条件计入检查点和清单的指纹，与不筛选的运行互不混用。
+    pipeline_config.enable_boilerplate_removal 为 True 时，去重之前先删除正文中的模板行（见 boilerplate.py）。
+    解析日期时顺便累计覆盖情况和质量统计（每天的文章数、被删除的日期、长度分布等，见 quality_report.py），
+    保存在 stats['coverage'] 中，由 write_quality_report 汇总为报告。
+    """
+    batch_size = batch_size or config.batch_size
+    enable_near_dedup = config.enable_near_dedup if enable_near_dedup is None else enable_near_dedup
+    near_dedup_options = config.near_dedup_options if near_dedup_options is None else near_dedup_options
+    name, path, output = source['name'], source['path'], source['output']
+    date_col, title_col, content_col = (source['columns'][key] for key in ('date', 'title', 'content'))
+    # 结果文件统一使用 DATE / CONTENT 作为日期和正文列名，供合并步骤读取
+    rename = {date_col: 'DATE', content_col: 'CONTENT'}
+
+    start = time.time()
+    stats = {'name': name, 'input': path, 'output': output, 'rows_in': 0, 'rows_out': 0, 'invalid_rows': 0,
+             'duplicate_count': 0, 'invalid_date_rows': 0, 'date_summary': '', 'near_duplicate_log': '',
+             'date_min': None, 'date_max': None, 'filter_log': '', 'boilerplate_log': ''}
+    filter_spec = row_filter.spec() if row_filter is not None else None
+    boilerplate_options = config.boilerplate_options if config.enable_boilerplate_removal else None
+    checkpoints = CheckpointStore(config.checkpoint_dir)
+    fingerprints = source_fingerprints(source, near_dedup_options if enable_near_dedup else None, filter_spec,
+                                       boilerplate_options)
+    resumed, meta = _resume_point(checkpoints, source, fingerprints, resume, from_stage)
+    if resumed == 'write':
+        print(f"[{name}] 检查点有效，跳过处理，结果 '{output}' 保持不变。")
+        return dict(meta['stats'], resumed='write', logged=meta.get('logged', False), stages=[])
+    if (resume or from_stage) and resumed is None:
+        print(f"[{name}] 没有可用的检查点，从头处理。")
+    # 从检查点继续时，之前步骤的统计取自检查点
+    carried = dict(meta['stats']) if meta else {}
+    run_dedup, run_date_parse = resumed is None, resumed in (None, 'dedup')
+    writers = {}
+    if pa is not None:
+        if run_dedup and 'dedup' in config.checkpoint_stages:
+            writers['dedup'] = checkpoints.writer(f'{name}.dedup')
+        if run_date_parse and 'date_parse' in config.checkpoint_stages:
+            writers['date_parse'] = checkpoints.writer(f'{name}.date_parse', date_column=date_col)
+
+    deduper = DigestDeduper(date_col, content_col)
+    date_normalizer = DateNormalizer(source['date_formats'])
+    coverage = CoverageProfile(config.quality_report_options['short_chars'],
+                               config.quality_report_options['long_chars'])
+    near_detector = NearDuplicateDetector(**near_dedup_options) if enable_near_dedup else None
+    recorder = _recorder(name, run_id, profile_stages, trace_memory)
+    filter_counts = {'rows': 0, 'kept': 0}
+    predicate = None
+    if filter_spec is not None:
+        # 筛选用单独的日期解析器，日期格式的命中统计只计入保留下来的行
+        filter_normalizer = DateNormalizer(source['date_formats'])
+
+        def keep_rows(values):
+            keep = row_filter.mask(filter_normalizer.parse(values).dates.to_numpy(), values)
+            filter_counts['rows'] += len(keep)
+            filter_counts['kept'] += int(keep.sum())
+            return keep
+
+        predicate = (date_col, keep_rows)
+        print(f"[{name}] 只处理部分数据：{row_filter.describe()}。")
+    writer = CsvWriter(output, engine=config.csv_engine, threads=config.csv_threads)
+    rows_loaded, batches_written, write_error, completed = 0, 0, None, False
+    read_stats = {'invalid_rows': 0}
+    stripper = None
+    try:
+        if run_dedup and boilerplate_options is not None:
+            stripper = _boilerplate_stripper(source, batch_size, boilerplate_options, recorder)
+            boilerplate_dates = DateNormalizer(source['date_formats'])
+        if resumed is None:
+            print(f"[{name}] 开始处理文件 '{path}'（每批 {batch_size} 行）...")
+            input_state = file_state(path, with_hash=True)
+            batches = iter_source_batches(path, batch_size=batch_size, predicate=predicate, read_stats=read_stats,
+                                          **source['read_options'])
+        else:
+            print(f"[{name}] 从 {meta['created']} 保存的检查点 '{resumed}' 继续处理（每批 {batch_size} 行）...")
+            input_state = meta['input']
+            batches = checkpoints.iter_batches(f'{name}.{resumed}', batch_size)
+        for batch_number, df in enumerate(recorder.timed_batches('load', batches), start=1):
+            missing = [col for col in (date_col, title_col, content_col) if col not in df.columns]
+            if missing:
+                raise KeyError(f"文件中缺少必要的列 {missing}，只找到了 {list(df.columns)}")
+            rows_loaded += len(df)
+
+            if stripper is not None:
+                # 去重之前删除模板行：只是页脚等不同的同一篇新闻，删除后可以被识别为重复
+                with recorder.stage('boilerplate', rows_in=len(df)) as counts:
+                    df[content_col] = stripper.strip(df[content_col], _years(boilerplate_dates, df[date_col]))
+                    counts['rows_out'] = len(df)
+
+            if run_dedup:
+                # 根据“日期”和“正文”两列计算摘要，跨批次识别和删除重复行
+                with recorder.stage('dedup', rows_in=len(df)) as counts:
+                    df = deduper.filter(df)
+                    counts['rows_out'] = len(df)
+                if 'dedup' in writers:
+                    with recorder.stage('checkpoint', rows_in=len(df)):
+                        writers['dedup'].write(df)
+
+            if run_date_parse:
+                # 解析日期并删除无法解析（NaT）的行
+                with recorder.stage('date_parse', rows_in=len(df)) as counts:
+                    parsed = date_normalizer.parse(df[date_col])
+                    df[date_col] = parsed.dates
+                    rows_before_dropna = len(df)
+                    df = df.dropna(subset=[date_col])
+                    stats['invalid_date_rows'] += rows_before_dropna - len(df)
+                    if len(df):
+                        batch_min, batch_max = str(df[date_col].min()), str(df[date_col].max())
+                        stats['date_min'] = min(stats['date_min'] or batch_min, batch_min)
+                        stats['date_max'] = max(stats['date_max'] or batch_max, batch_max)
+                    counts['rows_out'] = len(df)
+                with recorder.stage('coverage', rows_in=len(df)):
+                    coverage.add(df[date_col].to_numpy(), df[title_col], df[content_col], parsed)
+                if 'date_parse' in writers:
+                    with recorder.stage('checkpoint', rows_in=len(df)):
+                        writers['date_parse'].write(df)
+
+            if write_error is None:
+                try:
+                    _write_batch(df, writer, title_col, content_col, rename, near_detector, recorder)
+                    batches_written += 1
+                except Exception as e:
+                    if 'date_parse' not in writers:
+                        raise
+                    # 写出失败时仍把剩余批次的去重和日期解析做完并保存检查点，排除问题后用 --resume 只需重新写出
+                    write_error = e
+                    print(f"[{name}] 注意：第 {batch_number} 批写出失败，继续完成去重和日期解析并保存检查点。")
+            if run_dedup:
+                print(f"[{name}] 第 {batch_number} 批处理完成，累计读取 {deduper.rows_in} 条，去重后保留 {deduper.rows_out} 条。")
+            else:
+                print(f"[{name}] 第 {batch_number} 批处理完成，累计从检查点读取 {rows_loaded} 条。")
+        for checkpoint_writer in writers.values():
+            checkpoint_writer.finish()
+        completed = True
+    except FileNotFoundError:
+        stats['error'] = f"找不到文件 '{path}'。请确认文件名和路径是否正确。"
+    except Exception as e:
+        stats['error'] = f"读取文件时发生错误: {e}"
+    finally:
+        if not completed:
+            for checkpoint_writer in writers.values():
+                checkpoint_writer.discard()
+    recorder.add('load', bytes_read=_file_size(path) if resumed is None
+                 else checkpoints.size(f'{name}.{resumed}'))
+
+    if completed:
+        if run_dedup:
+            carried.update(rows_in=deduper.rows_in, rows_out=deduper.rows_out, duplicate_count=deduper.duplicate_count,
+                           invalid_rows=read_stats['invalid_rows'])
+            if stripper is not None:
+                carried.update(boilerplate_log=stripper.summary() + '\n')
+                print(f"[{name}] {stripper.summary()}")
+            if filter_spec is not None:
+                carried.update(row_filter=filter_spec,
+                               filter_log=f"筛选: {row_filter.describe()}，原始文件 {filter_counts['rows']} 条中保留 "
+                                          f"{filter_counts['kept']} 条\n")
+        if run_date_parse:
+            carried.update(invalid_date_rows=stats['invalid_date_rows'], date_summary=date_normalizer.summary(),
+                           date_min=stats['date_min'], date_max=stats['date_max'],
+                           coverage=coverage.finish(date_normalizer))
+        for stage, checkpoint_writer in writers.items():
+            checkpoints.save(f'{name}.{stage}', {'fingerprint': fingerprints[stage], 'input': input_state,
+                                                 'columns': checkpoint_writer.columns, 'rows': checkpoint_writer.rows,
+                                                 'stats': {key: carried[key] for key in _CHECKPOINT_STATS[stage]
+                                                           if key in carried}})
+        stats.update(carried)
+        if write_error is not None:
+            stats['error'] = f"写出结果时发生错误: {write_error}（去重和日期解析的结果已保存为检查点，可用 --resume 继续）"
+    if 'error' in stats:
+        stats['stages'] = recorder.records()
+        print(f"[{name}] 错误：{stats['error']}")
+        return stats
+
+    if batches_written == 0:
+        columns = [rename.get(col, col) for col in (date_col, title_col, content_col)]
+        writer.write(pd.DataFrame(columns=columns))
+
+    # 可选：近似重复检测，删除结果文件中被判定为近似重复的行
+    if near_detector is not None:
+        print(f"[{name}] 正在进行近似重复检测 (MinHash + LSH)...")
+        with recorder.stage('near_dedup') as counts:
+            near_result = near_detector.resolve()
+            drop_rows_from_csv(output, near_result.keep)
+            counts['rows_out'] = int(near_result.keep.sum())
+        print(f"[{name}] {near_result.summary()}")
+        stats['near_duplicate_log'] = (f"近似重复删除条数: {near_result.stats['dropped']}"
+                                       f"（吞吐量 {near_result.stats['docs_per_sec']} 条/秒）\n")
+
+    if stats.get('coverage'):
+        coverage_summary, _ = summarize(stats['coverage'], config.quality_report_options, filter_spec)
+        stats['coverage_log'] = f"{report_summary(coverage_summary)}\n"
+    stats['write_log'] = (f"结果文件: {_file_size(output) / 1024 / 1024:.1f} MB（{writer.compression or '未压缩'}，"
+                          f"{writer.engine} 编码），写出耗时 {writer.seconds:.2f} 秒\n")
+    stats['seconds'] = round(time.time() - start, 1)
+    if resumed is not None:
+        stats['resumed'] = resumed
+    checkpoints.save(f'{name}.write', {'fingerprint': fingerprints['write'], 'input': input_state,
+                                       'output': file_state(output), 'stats': stats, 'logged': False})
+    stats['stages'] = recorder.records()
+    print(f"[{name}] 处理完成！共 {stats['rows_in']} 条，删除重复 {stats['duplicate_count']} 条，"
+          f"删除无效日期 {stats['invalid_date_rows']} 条，耗时 {stats['seconds']} 秒。结果已保存到 '{output}'。")
+    return stats
+
+
+# 各数据检查点中保存的统计（到该步骤为止）
+_CHECKPOINT_STATS = {
+    'dedup': ['rows_in', 'rows_out', 'duplicate_count', 'invalid_rows', 'row_filter', 'filter_log',
+              'boilerplate_log'],
+    'date_parse': ['rows_in', 'rows_out', 'duplicate_count', 'invalid_rows', 'row_filter', 'filter_log',
+                   'boilerplate_log', 'invalid_date_rows', 'date_summary', 'date_min', 'date_max', 'coverage'],
+}
+
+
+def _years(normalizer, dates):
+    """一列原始日期对应的年份（整数数组），无法解析时为 0"""
+    return normalizer.parse(dates).dates.dt.year.fillna(0).astype(int).to_numpy()
+
+
+def _boilerplate_stripper(source, batch_size, options, recorder):
+    """
+    模板行删除的第一遍：统计整个数据源中各行的出现次数。统计结果保存在 pipeline_config.boilerplate_dir 中，
+    原始文件、读取方式和参数都没有变化时直接加载。总是统计整个数据源（不受 --start / --sample 影响），
+    所以只处理部分数据时删除的行与全量运行相同。
+    """
+    name, path = source['name'], source['path']
+    date_col, content_col = source['columns']['date'], source['columns']['content']
+    sketch_path = os.path.join(config.boilerplate_dir, f'{name}.npz')
+    sketch_fingerprint = fingerprint(path, source['read_options'], source['columns'], source['date_formats'], options)
+    stripper, meta = BoilerplateStripper.load(sketch_path)
+    if (stripper is not None and meta.get('fingerprint') == sketch_fingerprint
+            and file_unchanged(path, meta.get('input'))):
+        print(f"[{name}] 使用已保存的模板行统计（{meta['created']}）。")
+        return stripper
+    print(f"[{name}] 正在统计各行的出现次数（用于删除模板行）...")
+    stripper = BoilerplateStripper(**options)
+    normalizer = DateNormalizer(source['date_formats'])
+    input_state = file_state(path, with_hash=True)
+    with recorder.stage('boilerplate_count') as counts:
+        for df in iter_source_batches(path, batch_size=batch_size, **source['read_options']):
+            stripper.count(df[content_col], _years(normalizer, df[date_col]))
+        counts.update(rows_in=stripper.stats['docs_counted'], rows_out=stripper.stats['docs_counted'])
+    stripper.save(sketch_path, {'fingerprint': sketch_fingerprint, 'input': input_state,
+                                'created': time.strftime("%Y-%m-%d %H:%M:%S")})
+    return stripper
+
+
+def _resume_point(checkpoints, source, fingerprints, resume, from_stage):
+    """可以使用检查点的步骤中，最后一个检查点仍然有效的步骤及其元数据；没有时返回 (None, None)"""
+    if from_stage is not None:
+        usable = SOURCE_STAGES[:STAGES.index(from_stage)]
+    elif resume:
+        usable = SOURCE_STAGES
+    else:
+        return None, None
+    for stage in reversed(usable):
+        meta = checkpoints.valid(f"{source['name']}.{stage}", fingerprints[stage], source['path'],
+                                 source['output'] if stage == 'write' else None)
+        if meta is not None:
+            return stage, meta
+    return None, None
+
+
+def _write_batch(df, writer, title_col, content_col, rename, near_detector, recorder):
+    """合并标题和正文，由 writer（csv_output.CsvWriter）追加写入结果 CSV；启用近似重复检测时把该批加入检测器"""
+    with recorder.stage('title_merge', rows_in=len(df)) as counts:
+        df[content_col] = merge_title_content(df[title_col], df[content_col])
+        counts['rows_out'] = len(df)
+
+    # 第一批写入 BOM 和表头，之后的批次追加写入
+    with recorder.stage('write', rows_in=len(df)) as counts:
+        df = df.rename(columns=rename)
+        counts['bytes_written'] = writer.write(df)
+        counts['rows_out'] = len(df)
+    if near_detector is not None:
+        with recorder.stage('near_dedup', rows_in=len(df)):
+            near_detector.add_batch(df['DATE'], df['CONTENT'])
+
+
+def format_log(stats):
+    """生成单个数据源的日志段落"""
+    current_time = time.strftime("%Y-%m-%d %H:%M:%S")
+    if 'error' in stats:
+        summary = f"处理失败: {stats['error']}\n"
+    else:
+        summary = (f"{stats.get('filter_log', '')}"
+                   f"原始记录总条数: {stats['rows_in']}\n"
+                   f"字段过多而无法读取、已跳过的行数: {stats.get('invalid_rows', 0)}\n"
+                   f"{stats.get('boilerplate_log', '')}"
+                   f"识别并删除的重复条数: {stats['duplicate_count']}\n"
+                   f"处理后剩余记录条数: {stats['rows_out']}\n"
+                   f"删除的无效日期条数: {stats['invalid_date_rows']}\n"
+                   f"{stats['date_summary']}\n"
+                   f"{stats.get('coverage_log', '')}"
+                   f"{stats['near_duplicate_log']}"
+                   f"{stats.get('write_log', '')}"
+                   f"处理耗时: {stats['seconds']} 秒\n")
+    return f"""
+
+==================================================
+文件处理日志
+==================================================
+处理时间: {current_time}
+输入文件: {stats['input']}
+输出文件: {stats['output']}
+
+------------------ 统计摘要 ------------------
+{summary}----------------------------------------------
+"""
+
+
+def select_sources(names=None):
+    """按名称选择数据源，未指定时返回全部数据源"""
+    if not names:
+        return list(config.SOURCES)
+    by_name = {source['name']: source for source in config.SOURCES}
+    unknown = [name for name in names if name not in by_name]
+    if unknown:
+        raise KeyError(f"未知的数据源: {unknown}，可选: {list(by_name)}")
+    return [by_name[name] for name in names]
+
+
+def run_sources(sources, workers=None, batch_size=None, run_id=None, profile_stages=None, trace_memory=None,
+                resume=False, from_stage=None, row_filter=None):
+    """
+    并行处理多个数据源，每个数据源在单独的进程中运行，总耗时取决于最大的那个数据源。
+    返回与 sources 顺序一致的统计信息列表。resume、from_stage、row_filter 见 process_source。
+    """
+    options = {'run_id': run_id, 'profile_stages': profile_stages, 'trace_memory': trace_memory,
+               'resume': resume, 'from_stage': from_stage, 'row_filter': row_filter}
+    workers = workers or config.workers or min(len(sources), os.cpu_count() or 1)
+    if workers <= 1 or len(sources) <= 1:
+        return [process_source(source, batch_size, **options) for source in sources]
+
+    # 先提交最大的文件，避免它排在最后才开始
+    order = sorted(range(len(sources)), key=lambda i: -_file_size(sources[i]['path']))
+    results = [None] * len(sources)
+    print(f"使用 {workers} 个进程并行处理 {len(sources)} 个数据源...")
+    process = partial(process_source, batch_size=batch_size, **options)
+    for i, stats in zip(order, ordered_map(process, [sources[i] for i in order], workers)):
+        results[i] = stats
+    return results
+
+
+def _file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def append_logs(all_stats, log_file_name=None):
+    """按配置顺序将各数据源的统计信息追加到日志文件，成功时返回 True"""
+    log_file_name = log_file_name or config.log_file_name
+    try:
+        with open(log_file_name, 'a', encoding='utf-8') as f:
+            for stats in all_stats:
+                f.write(format_log(stats))
+        print(f"统计信息已成功追加到文件：{log_file_name}")
+        return True
+    except Exception as e:
+        print(f"错误：无法写入日志文件。原因: {e}")
+        return False
+
+
+def run_pipeline(names=None, workers=None, batch_size=None, merge=True, incremental=False, profile_stages=None,
+                 trace_memory=None, clean=None, index=None, resume=False, from_stage=None, row_filter=None,
+                 export=None):
+    """
+    处理选定的数据源并写日志；merge 为 True 时接着执行跨文件合并（final_all_files.py 的逻辑）。
+    incremental 为 True 时只处理清单中没有记录、原始文件或配置已变化的数据源，并尽量只把新数据并入合并结果。
+    clean 为 True 时（未指定时见 pipeline_config.enable_cleaning）合并后接着清理正文，见 clean_all；
+    index 为 True 时（未指定时见 pipeline_config.enable_keyword_index）更新关键词索引，见 build_keyword_index；
+    export 为 True 时（未指定时见 pipeline_config.enable_token_export）最后导出词元数组，见 export_token_shards。
+    resume 为 True 时跳过检查点仍然有效的步骤；from_stage（checkpoint.STAGES 之一）为要重新运行的第一个步骤，
+    之前的步骤在检查点有效时跳过，之后的步骤全部重新运行。
+    row_filter（row_filter.RowFilter）只处理日期范围内或抽样抽中的新闻，各数据源的结果和合并结果都只包含这部分数据，
+    之后不筛选的运行会重新处理（检查点、清单中都记录了筛选条件）。
+    各步骤的统计以同一个运行编号追加到 pipeline_config.metrics_file。
+    """
+    if from_stage is not None and from_stage not in STAGES:
+        raise ValueError(f"未知的步骤: {from_stage}，可选: {STAGES}")
+    start = time.time()
+    run_id = new_run_id()
+    profiling = {'run_id': run_id, 'profile_stages': profile_stages, 'trace_memory': trace_memory}
+    manifest = SourceManifest(config.manifest_path)
+    sources = select_sources(names)
+    filter_spec = row_filter.spec() if row_filter is not None else None
+    if incremental:
+        sources = [source for source in sources if not manifest.is_current(source, filter_spec)]
+        print(f"增量模式：需要处理的数据源 {[source['name'] for source in sources]}")
+    all_stats = (run_sources(sources, workers, batch_size, **profiling, resume=resume, from_stage=from_stage,
+                             row_filter=row_filter) if sources else [])
+    # 跳过的数据源上次已经写过日志的不再重复写；上次写日志失败的这次补写
+    new_logs = [stats for stats in all_stats if not stats.get('logged')]
+    if new_logs and append_logs(new_logs):
+        checkpoints = CheckpointStore(config.checkpoint_dir)
+        for stats in new_logs:
+            if 'error' not in stats:
+                checkpoints.update(f"{stats['name']}.write", logged=True)
+    records = [record for stats in all_stats for record in stats.get('stages', [])]
+    if records:
+        append_metrics(records, config.metrics_file)
+    if all_stats and config.enable_quality_report:
+        write_quality_report()
+    for source, stats in zip(sources, all_stats):
+        if 'error' not in stats and not (stats.get('resumed') == 'write' and manifest.is_current(source, filter_spec)):
+            manifest.record_source(source, stats)
+    manifest.save()
+    failed = [stats['name'] for stats in all_stats if 'error' in stats]
+    print(f"{len(sources)} 个数据源处理完成，总耗时 {time.time() - start:.1f} 秒。")
+    if merge:
+        if failed:
+            print(f"数据源 {failed} 处理失败，跳过合并步骤。")
+        elif incremental:
+            merge_incremental(manifest, [source['output'] for source in sources], **profiling, row_filter=row_filter)
+        else:
+            merge_all(manifest, resume=_use_checkpoint('merge', resume, from_stage), **profiling, row_filter=row_filter)
+        if not failed and (config.enable_cleaning if clean is None else clean):
+            clean_all(resume=_use_checkpoint('clean', resume, from_stage), **profiling)
+        if not failed and (config.enable_keyword_index if index is None else index):
+            build_keyword_index(**profiling)
+        if not failed and (config.enable_token_export if export is None else export):
+            export_token_shards(resume=_use_checkpoint('export', resume, from_stage), **profiling)
+    return all_stats
+
+
+def write_quality_report():
+    """
+    汇总各数据源最近一次处理时累计的统计（保存在 write 检查点中），写出覆盖情况和质量报告（见 quality_report.py）：
+    JSON 为各数据源和全部数据源之和的摘要，Parquet 为每个工作日一行的文章数和缺口、异常标记。返回 JSON 报告字典。
+    """
+    checkpoints = CheckpointStore(config.checkpoint_dir)
+    profiles, filters = {}, []
+    for source in config.SOURCES:
+        stats = _source_write_stats(checkpoints, source)
+        if stats.get('coverage'):
+            profiles[source['name']] = stats['coverage']
+            filters.append(stats.get('row_filter'))
+    if not profiles:
+        print("错误：没有找到各数据源的统计，请先运行 python pipeline.py。")
+        return None
+    missing = [source['name'] for source in config.SOURCES if source['name'] not in profiles]
+    if missing:
+        print(f"注意：数据源 {missing} 还没有按当前配置处理的统计，报告中不包含这些数据源。")
+    # 各数据源的筛选条件不同时（如只重新处理了其中一个），按不筛选处理
+    row_filter = filters[0] if all(spec == filters[0] for spec in filters) else None
+    report = write_report(profiles, config.quality_report_json, config.quality_report_parquet,
+                          config.quality_report_options, row_filter)
+    print(f"覆盖情况和质量报告已写入 {config.quality_report_json} 和 {config.quality_report_parquet}"
+          f"（全部数据源：{report_summary(report['total'])}）。")
+    return report
+
+
+def _source_write_stats(checkpoints, source):
+    """
+    数据源 write 检查点中的统计。检查点必须是按当前配置处理该数据源的原始文件、写出该结果文件时保存的
+    （输入、输出路径和指纹一致；筛选条件取自检查点本身），否则（如同名的合成数据写出的检查点）返回空字典。
+    """
+    meta = checkpoints.load(f"{source['name']}.write") or {}
+    stats = meta.get('stats', {})
+    if stats.get('input') != source['path'] or stats.get('output') != source['output']:
+        return {}
+    boilerplate_options = config.boilerplate_options if config.enable_boilerplate_removal else None
+    fingerprints = source_fingerprints(source, config.near_dedup_options if config.enable_near_dedup else None,
+                                       stats.get('row_filter'), boilerplate_options)
+    return stats if meta.get('fingerprint') == fingerprints['write'] else {}
+
+
+def _use_checkpoint(stage, resume, from_stage):
+    """该步骤是否可以在检查点有效时跳过：resume 为 True，或 from_stage 在该步骤之后"""
+    return resume or (from_stage is not None and STAGES.index(from_stage) > STAGES.index(stage))
+
+
+def _outputs_valid(outputs, states):
+    """outputs（按 states 创建）是否与保存的输出一一对应，且各输出仍是当时写出后的状态"""
+    return set(outputs) == set(states) and all(output.is_valid() for output in outputs.values())
+
+
+def _merge_fingerprint(filter_spec=None):
+    """合并步骤的指纹：各数据源结果 CSV 的大小和修改时间，以及合并配置（和筛选条件）"""
+    inputs = [[file, file_state(file) if os.path.exists(file) else None]
+              for file in (source['output'] for source in config.SOURCES)]
+    return fingerprint(inputs, config.merged_output_formats, config.merged_output_file, config.merged_parquet_dir,
+                       config.merged_store_dir, config.parquet_compression, config.source_precedence,
+                       config.enable_near_dedup and config.near_dedup_options, *([filter_spec] if filter_spec else []))
+
+
+def _save_merge_checkpoint(corpus, filter_spec=None):
+    if corpus:
+        CheckpointStore(config.checkpoint_dir).save('merge', {'fingerprint': _merge_fingerprint(filter_spec),
+                                                              'outputs': corpus['outputs']})
+
+
+def _build_outputs(states=None):
+    return build_outputs(config.merged_output_formats, config.merged_output_file, config.merged_parquet_dir,
+                         config.parquet_compression, states, store_dir=config.merged_store_dir,
+                         csv_engine=config.csv_engine)
+
+
+def _cleaned_outputs(states=None):
+    return build_outputs(config.merged_output_formats, config.cleaned_output_file, config.cleaned_parquet_dir,
+                         config.parquet_compression, states, store_dir=config.cleaned_store_dir,
+                         csv_engine=config.csv_engine)
+
+
+def _input_rows(manifest, input_csv_files):
+    """清单中记录的各输入文件的行数之和"""
+    return sum(entry['rows_out'] for entry in manifest.sources.values() if entry['output'] in input_csv_files)
+
+
+def merge_all(manifest=None, run_id=None, profile_stages=None, trace_memory=None, resume=False, row_filter=None):
+    """
+    按 pipeline_config.py 中的合并配置全量合并全部数据源的结果，并在清单中记录合并结果的状态。
+    resume 为 True 时，如果各数据源的结果和合并配置都没有变化、合并结果也未被改动（见 checkpoint.py），跳过合并。
+    row_filter（row_filter.RowFilter）只合并日期范围内或抽样抽中的新闻，读取各数据源的结果时逐块筛选。
+    """
+    manifest = manifest or SourceManifest(config.manifest_path)
+    filter_spec = row_filter.spec() if row_filter is not None else None
+    if resume:
+        meta = CheckpointStore(config.checkpoint_dir).valid('merge', _merge_fingerprint(filter_spec))
+        if meta is not None and manifest.corpus and _outputs_valid(_build_outputs(meta['outputs']), meta['outputs']):
+            print("合并步骤的检查点有效，跳过合并。")
+            return manifest.corpus
+    input_csv_files = [source['output'] for source in config.SOURCES]
+    outputs = _build_outputs()
+    recorder = _recorder('merge', run_id, profile_stages, trace_memory)
+    with recorder.stage('combine', rows_in=_input_rows(manifest, input_csv_files)) as counts:
+        corpus = merge_outputs(input_csv_files, outputs,
+                               log_file_name=config.log_file_name,
+                               source_precedence=config.source_precedence,
+                               global_index_dir=config.global_index_dir,
+                               chunk_size=config.merge_chunk_size,
+                               enable_near_dedup=config.enable_near_dedup,
+                               near_dedup_options=config.near_dedup_options,
+                               buffer_rows=config.merge_buffer_rows,
+                               spill_dir=config.merge_spill_dir,
+                               row_filter=row_filter)
+        counts.update(rows_out=corpus['rows'] if corpus else 0,
+                      bytes_read=sum(_file_size(file) for file in input_csv_files),
+                      bytes_written=sum(path_size(output.path) for output in outputs.values()))
+    append_metrics(recorder.records(), config.metrics_file)
+    if corpus and filter_spec:
+        corpus['row_filter'] = filter_spec
+    manifest.corpus = corpus
+    manifest.save()
+    _save_merge_checkpoint(corpus, filter_spec)
+    return corpus
+
+
+def merge_incremental(manifest, changed_outputs=(), run_id=None, profile_stages=None, trace_memory=None,
+                      row_filter=None):
+    """
+    只把尚未并入的数据源结果合并进已有的合并结果。
+    已并入的数据源发生变化、数据源被移除、合并结果或摘要索引被改动、输出格式变化、启用了近似重复检测
+    或筛选条件（row_filter）与已有的合并结果不同时，退回到全量合并。
+    """
+    outputs = [source['output'] for source in config.SOURCES]
+    corpus = manifest.corpus
+    filter_spec = row_filter.spec() if row_filter is not None else None
+    reason = None
+    if config.enable_near_dedup:
+        reason = '启用了近似重复检测（需要在全部数据上计算）'
+    elif not manifest.corpus_is_valid(config.global_index_dir):
+        reason = '没有可用的合并结果或摘要索引'
+    elif corpus.get('row_filter') != filter_spec:
+        reason = '已有的合并结果与本次的筛选条件（日期范围、抽样）不同'
+    else:
+        corpus_outputs = _build_outputs(corpus.get('outputs'))
+        if (set(corpus_outputs) != set(corpus.get('outputs', {}))
+                or any(output.path != corpus['outputs'][name]['path'] or not output.is_valid()
+                       for name, output in corpus_outputs.items())):
+            reason = '合并结果已被改动或输出配置发生了变化'
+        elif any(output in corpus['sources'] for output in changed_outputs):
+            reason = '已并入的数据源发生了变化'
+        elif any(output not in outputs for output in corpus['sources']):
+            reason = '有数据源已从配置中移除'
+    if reason:
+        print(f"{reason}，执行全量合并。")
+        return merge_all(manifest, run_id, profile_stages, trace_memory, row_filter=row_filter)
+
+    pending = [output for output in outputs if output not in corpus['sources']]
+    # 新数据源之间按来源优先级排列；已有语料中的新闻总是优先保留
+    precedence = config.source_precedence
+    pending.sort(key=lambda output: precedence.index(output) if output in precedence else len(precedence))
+    if not pending:
+        print("合并结果已是最新，无需合并。")
+        return corpus
+    recorder = _recorder('merge', run_id, profile_stages, trace_memory)
+    sizes_before = sum(path_size(output.path) for output in corpus_outputs.values())
+    with recorder.stage('combine', rows_in=_input_rows(manifest, pending)) as counts:
+        manifest.corpus = append_outputs(pending, corpus, corpus_outputs,
+                                         log_file_name=config.log_file_name,
+                                         global_index_dir=config.global_index_dir,
+                                         chunk_size=config.merge_chunk_size,
+                                         buffer_rows=config.merge_buffer_rows,
+                                         spill_dir=config.merge_spill_dir,
+                                         row_filter=row_filter)
+        counts.update(rows_out=manifest.corpus['rows'] - corpus['rows'],
+                      bytes_read=sum(_file_size(file) for file in pending),
+                      bytes_written=sum(path_size(output.path) for output in corpus_outputs.values()) - sizes_before)
+    append_metrics(recorder.records(), config.metrics_file)
+    if filter_spec:
+        manifest.corpus['row_filter'] = filter_spec
+    manifest.save()
+    _save_merge_checkpoint(manifest.corpus, filter_spec)
+    return manifest.corpus
+
+
+def clean_all(workers=None, chunk_rows=None, run_id=None, profile_stages=None, trace_memory=None, resume=False):
+    """
+    按 pipeline_config.py 中的文本清理配置清理合并结果的正文，结果按 merged_output_formats 写出到 cleaned_* 路径。
+    读取合并结果中的 Parquet 数据集（其次为文章库、CSV）：前两者带有来源，乱码只在 repair_mojibake 列出的数据源中修复。
+    resume 为 True 时，如果合并结果和清理配置都没有变化、清理结果也未被改动，跳过清理。
+    """
+    inputs = {'parquet': config.merged_parquet_dir, 'store': config.merged_store_dir, 'csv': config.merged_output_file}
+    available = [name for name in inputs if name in config.merged_output_formats and os.path.exists(inputs[name])]
+    if not available:
+        print("错误：找不到合并结果，请先运行 python pipeline.py 或 python final_all_files.py。")
+        return None
+    input_format = available[0]
+    outputs = _cleaned_outputs()
+    repair_sources = [source['output'] for source in select_sources(config.repair_mojibake)]
+    checkpoints = CheckpointStore(config.checkpoint_dir)
+    merge_meta = checkpoints.load('merge') or {}
+    clean_fingerprint = fingerprint(merge_meta.get('fingerprint'), input_format, inputs[input_format],
+                                    path_size(inputs[input_format]), config.cleaned_output_file,
+                                    config.cleaned_parquet_dir, config.cleaned_store_dir, repair_sources,
+                                    config.cleaning_options)
+    if resume:
+        meta = checkpoints.valid('clean', clean_fingerprint)
+        if meta is not None and _outputs_valid(_cleaned_outputs(meta['outputs']), meta['outputs']):
+            print("清理步骤的检查点有效，跳过清理。")
+            return meta['stats']
+    recorder = _recorder('clean', run_id, profile_stages, trace_memory)
+    with recorder.stage('clean') as counts:
+        stats = clean_corpus(input_format, inputs[input_format], outputs, log_file_name=config.log_file_name,
+                             repair_mojibake_sources=repair_sources,
+                             workers=workers or config.cleaning_workers,
+                             chunk_rows=chunk_rows or config.cleaning_chunk_rows,
+                             **config.cleaning_options)
+        counts.update(rows_out=stats['rows_out'], bytes_read=path_size(inputs[input_format]),
+                      bytes_written=sum(path_size(output.path) for output in outputs.values()))
+    recorder.add('clean', rows_in=stats['rows_in'])
+    append_metrics(recorder.records(), config.metrics_file)
+    checkpoints.save('clean', {'fingerprint': clean_fingerprint, 'stats': stats,
+                               'outputs': {name: output.state() for name, output in outputs.items()}})
+    return stats
+
+
+def build_keyword_index(workers=None, run_id=None, profile_stages=None, trace_memory=None):
+    """
+    按 pipeline_config.py 中的关键词索引配置，为合并结果（index_cleaned_corpus 为 True 时为清理后的结果）建立或增量更新索引。
+    读取其中的 Parquet 数据集，其次为文章库；只输出了 CSV 时无法建立索引。
+    """
+    if config.index_cleaned_corpus:
+        inputs = {'parquet': config.cleaned_parquet_dir, 'store': config.cleaned_store_dir}
+    else:
+        inputs = {'parquet': config.merged_parquet_dir, 'store': config.merged_store_dir}
+    available = [name for name in inputs if name in config.merged_output_formats and os.path.exists(inputs[name])]
+    if not available:
+        print("错误：找不到 Parquet 或文章库格式的合并结果，无法建立关键词索引"
+              "（merged_output_formats 中需要有 'parquet' 或 'store'）。")
+        return None
+    input_format = available[0]
+    recorder = _recorder('index', run_id, profile_stages, trace_memory)
+    with recorder.stage('index') as counts:
+        stats = build_index(input_format, inputs[input_format], config.keyword_index_dir,
+                            workers=workers or config.index_workers, log_file_name=config.log_file_name)
+        counts.update(rows_out=stats['rows'], bytes_read=path_size(inputs[input_format]),
+                      bytes_written=path_size(config.keyword_index_dir))
+    recorder.add('index', rows_in=stats['rows_indexed'])
+    append_metrics(recorder.records(), config.metrics_file)
+    return stats
+
+
+def export_token_shards(workers=None, tokenizer=None, run_id=None, profile_stages=None, trace_memory=None,
+                        resume=False):
+    """
+    按 pipeline_config.py 中的词元导出配置，把合并结果（token_export_cleaned_corpus 为 True 时为清理后的结果）
+    分词导出为按年份分片的词元数组，见 token_export.py。读取其中的 Parquet 数据集，其次为文章库；只输出了 CSV 时无法导出。
+    resume 为 True 时，如果输入、分词方式和词表参数都没有变化、导出结果也未被改动，跳过导出。
+    """
+    if config.token_export_cleaned_corpus:
+        inputs = {'parquet': config.cleaned_parquet_dir, 'store': config.cleaned_store_dir}
+    else:
+        inputs = {'parquet': config.merged_parquet_dir, 'store': config.merged_store_dir}
+    available = [name for name in inputs if name in config.merged_output_formats and os.path.exists(inputs[name])]
+    if not available:
+        print("错误：找不到 Parquet 或文章库格式的合并结果，无法导出词元数组"
+              "（merged_output_formats 中需要有 'parquet' 或 'store'）。")
+        return None
+    input_format = available[0]
+    tokenizer = tokenizer or config.tokenizer
+    checkpoints = CheckpointStore(config.checkpoint_dir)
+    upstream = checkpoints.load('clean' if config.token_export_cleaned_corpus else 'merge') or {}
+    export_fingerprint = fingerprint(upstream.get('fingerprint'), input_format, inputs[input_format],
+                                     path_size(inputs[input_format]), config.token_export_dir, tokenizer,
+                                     config.token_vocab_options)
+    meta_path = os.path.join(config.token_export_dir, 'meta.json')
+    if resume:
+        meta = checkpoints.valid('export', export_fingerprint, output_path=meta_path)
+        if meta is not None:
+            print("词元导出步骤的检查点有效，跳过导出。")
+            return meta['stats']
+    recorder = _recorder('export', run_id, profile_stages, trace_memory)
+    with recorder.stage('export') as counts:
+        stats = export_tokens(input_format, inputs[input_format], config.token_export_dir, tokenizer=tokenizer,
+                              workers=workers or config.export_workers, log_file_name=config.log_file_name,
+                              **config.token_vocab_options)
+        counts.update(rows_out=stats['rows'], bytes_read=path_size(inputs[input_format]),
+                      bytes_written=stats['bytes'])
+    recorder.add('export', rows_in=stats['rows'])
+    append_metrics(recorder.records(), config.metrics_file)
+    checkpoints.save('export', {'fingerprint': export_fingerprint, 'stats': stats, 'output': file_state(meta_path)})
+    return stats
+
+
+def script_options(argv=None):
+    """各 final_*.py 脚本的命令行选项：返回传给 run_pipeline 的 resume、from_stage、row_filter"""
+    parser = argparse.ArgumentParser(description='按 pipeline_config.py 中的配置处理数据源或合并结果')
+    args = filter_arguments(stage_arguments(parser)).parse_args(argv)
+    return {'resume': args.resume, 'from_stage': args.from_stage, 'row_filter': from_args(args)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='按 pipeline_config.py 中的配置并行处理各数据源，并合并结果')
+    parser.add_argument('names', nargs='*', help='要处理的数据源名称，默认为全部数据源')
+    parser.add_argument('--workers', type=int, default=None, help='同时处理的数据源个数（进程数）')
+    parser.add_argument('--batch-size', type=int, default=None, help='每批处理的行数')
+    parser.add_argument('--no-merge', action='store_true', help='只处理数据源，不执行合并步骤（指定了数据源名称时也不合并）')
+    parser.add_argument('--incremental', action='store_true',
+                        help='增量模式：只处理新增或变化的数据源，并把新数据并入已有的合并结果')
+    parser.add_argument('--profile', default=None,
+                        help='用 cProfile 分析的步骤，逗号分隔（如 dedup,date_parse），结果保存到 pipeline_config.profile_dir')
+    parser.add_argument('--trace-memory', action='store_true', help='用 tracemalloc 记录各步骤中 Python 对象的峰值内存')
+    parser.add_argument('--clean', action='store_true', help='合并后接着清理正文（见 text_cleaning.py）')
+    parser.add_argument('--index', action='store_true', help='更新关键词索引（见 keyword_index.py）')
+    parser.add_argument('--export-tokens', action='store_true', help='最后导出分词后的词元数组（见 token_export.py）')
+    stage_arguments(parser)
+    filter_arguments(parser)
+    args = parser.parse_args()
+    run_pipeline(args.names, workers=args.workers, batch_size=args.batch_size,
+                 merge=not args.no_merge and (args.incremental or not args.names), incremental=args.incremental,
+                 profile_stages=args.profile.split(',') if args.profile else None,
+                 trace_memory=args.trace_memory or None, clean=args.clean or None, index=args.index or None,
+                 resume=args.resume, from_stage=args.from_stage, row_filter=from_args(args),
+                 export=args.export_tokens or None)
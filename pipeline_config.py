@@ -0,0 +1,173 @@
+# --- 数据处理流水线配置 ---
+# 每个数据源一项，pipeline.py 按这里的配置统一完成：读取、去重、日期解析、标题合并、写出 CSV、记录日志。
+# 新增数据源时只需在 SOURCES 中增加一项，不需要再复制一份处理脚本。
+#
+# 各字段含义：
+#   name          数据源名称，命令行中用它选择要处理的数据源
+#   path          原始文件路径
+#   output        处理结果 CSV 文件名（也是 final_all_files.py 的输入）
+#   read_options  读取方式，传给 source_cache.iter_source_batches：
+#                   reader   'xlsx' 或 'csv'
+#                   usecols  / names  只读取指定的列并指定列名（文件没有表头时使用）
+#                   header   True 表示文件第一行是列名
+#                   encoding CSV 文件的编码
+#   columns       原始文件中 日期 / 标题 / 正文 对应的列名
+#   date_formats  日期列可能的格式，按顺序尝试；'dayfirst' 表示按“日在前”的规则推断（见 date_normalizer.py）
+
+SOURCES = [
+    {
+        'name': '1984-2000',
+        'path': '数据/data/1984-2000.xlsx',
+        'output': 'final_1984-2000_combined.csv',
+        'read_options': {'reader': 'xlsx', 'usecols': [0, 1, 2], 'names': ['DATE', 'TITLE', 'CONTENT']},
+        'columns': {'date': 'DATE', 'title': 'TITLE', 'content': 'CONTENT'},
+        'date_formats': ['%Y/%m/%d'],
+    },
+    {
+        'name': '2001-2017',
+        'path': '数据/data/2001-2017.xlsx',
+        'output': 'final_2001-2017_combined.csv',
+        'read_options': {'reader': 'xlsx', 'usecols': [0, 1, 2], 'names': ['DATE', 'TITLE', 'CONTENT']},
+        'columns': {'date': 'DATE', 'title': 'TITLE', 'content': 'CONTENT'},
+        'date_formats': ['%Y/%m/%d'],
+    },
+    {
+        'name': '2018-2024.6',
+        'path': '数据/data/2018-2024.6.csv',
+        'output': 'final_2018-2024.6_combined.csv',
+        # 文件没有表头；必须使用 'latin-1' 编码才能正确读取
+        'read_options': {'reader': 'csv', 'encoding': 'latin-1', 'names': ['DATE', 'TITLE', 'CONTENT']},
+        'columns': {'date': 'DATE', 'title': 'TITLE', 'content': 'CONTENT'},
+        # 日期为混合格式：先尝试 '日/月/年' (e.g., '25/12/2023')，再尝试 '年/月/日' (e.g., '2023/12/25')
+        'date_formats': ['%d/%m/%Y', '%Y/%m/%d'],
+    },
+    {
+        'name': '2022',
+        'path': '数据/data/2022.xlsx',
+        'output': 'final_2022_combined.csv',
+        'read_options': {'reader': 'xlsx', 'header': True},
+        'columns': {'date': 'DATE', 'title': 'TITLE', 'content': 'CONTENT'},
+        # 日在前：'10/12/2023' 解析为 12月10日, 而不是 10月12日
+        'date_formats': ['%d/%m/%Y', 'dayfirst'],
+    },
+    {
+        'name': '2024.7-2025.3',
+        'path': '数据/data/结果2024_7_3to2025_3_15.xlsx',
+        'output': 'final_2024.7-2025.3_combined.csv',
+        'read_options': {'reader': 'xlsx', 'header': True},
+        'columns': {'date': 'date', 'title': 'title', 'content': 'text'},
+        'date_formats': ['%Y 年 %m 月 %d 日'],
+    },
+]
+
+# 所有数据源共用的日志文件，每个数据源处理完成后追加一段统计
+log_file_name = 'processing_log.txt'
+# 各步骤（load / boilerplate / dedup / date_parse / title_merge / write / near_dedup / combine）的耗时、CPU 时间、峰值内存、
+# 行数和读写字节数，每次运行以 JSON Lines 格式追加到该文件；查看和比较各次运行见 python metrics.py
+metrics_file = 'pipeline_metrics.jsonl'
+# 可选：用 cProfile 分析的步骤（如 ['dedup', 'date_parse']），结果（.prof）保存到 profile_dir，可用 pstats 查看
+profile_stages = []
+profile_dir = '数据/cache/profiles'
+# 可选：用 tracemalloc 记录各步骤中 Python 对象的峰值内存（会明显变慢）
+trace_memory = False
+# 流式读取时每批处理的行数，内存占用只与该值有关，与文件大小无关
+batch_size = 50000
+# 结果 CSV 的编码方式：'pandas' 为 DataFrame.to_csv；'arrow' 用多个线程同时以 pyarrow 编码（约快三倍，
+# 所有文本字段都加引号，读取结果相同），未安装 pyarrow 时退回 'pandas'。合并结果的 CSV 也使用该设置
+csv_engine = 'pandas'
+# 'arrow' 编码使用的线程数，None 表示 CPU 核数
+csv_threads = None
+# 结果文件名（output、merged_output_file、cleaned_output_file）以 .csv.gz / .csv.zst 结尾时按 gzip / zstd 压缩写出，
+# 合并和清理时透明地解压读取；zstd 需要 pyarrow
+# 同时处理的数据源个数（进程数），None 表示取数据源个数与 CPU 核数中的较小值
+workers = None
+# 检查点（checkpoint.py）：各数据源的步骤输出保存为检查点（Arrow IPC），连同输入文件和参数的指纹；
+# 写出结果、合并、清理完成后记录其输入和参数的指纹。python pipeline.py --resume 跳过检查点仍然有效的步骤，
+# --from-stage date_parse 等从指定步骤重新运行（如只修改了日期规则时），之前的步骤使用检查点
+checkpoint_dir = '数据/cache/checkpoints'
+# 保存数据检查点的步骤（'dedup' 去重后、'date_parse' 日期解析后），每个约占用与结果 CSV 相当的磁盘空间；
+# 为空时只记录指纹，--resume 只能跳过已完整写出结果的数据源
+checkpoint_stages = ['dedup', 'date_parse']
+# 可选：去重之前删除正文中反复出现的模板行（版权声明、"Write to ..."、订阅和导航文字等，见 boilerplate.py）。
+# 先流式统计整个数据源中各行按年份的出现次数（Count-Min Sketch，内存占用固定），再逐批删除出现次数达到阈值的行；
+# 统计结果保存在 boilerplate_dir 中，原始文件和参数不变时直接复用。参数见 boilerplate.DEFAULT_OPTIONS
+enable_boilerplate_removal = False
+boilerplate_options = {'min_count': 50, 'min_share': 0.002, 'max_line_chars': 300}
+boilerplate_dir = '数据/cache/boilerplate'
+# 可选：精确去重之后再做近似重复检测（MinHash + LSH），参数见 near_dedup.DEFAULT_OPTIONS
+enable_near_dedup = False
+near_dedup_options = {'threshold': 0.8, 'date_window_days': 3}
+
+# --- 合并配置（final_all_files.py） ---
+# 合并结果的输出格式：'parquet' 为按年/月分区的 Parquet 数据集（默认，读取方式见 parquet_corpus.py），
+# 'csv' 为单个 utf-8-sig CSV 文件，'store' 为可按日期、按编号随机读取的文章库（见 article_store.py）；可以同时输出多种
+merged_output_formats = ['parquet']
+merged_output_file = 'final_all_news_combined.csv'
+merged_parquet_dir = 'final_all_news_parquet'
+merged_store_dir = 'final_all_news_store'
+# Parquet 文件的压缩方式（'zstd'、'snappy'、'gzip' 等）
+parquet_compression = 'zstd'
+# 跨文件去重的来源优先级：同一天的同一篇新闻出现在多个文件中时，保留排在前面的文件中的那一条
+source_precedence = [source['output'] for source in SOURCES]
+# 按年份分区的全局摘要索引保存位置，供之后的运行复用
+global_index_dir = '数据/cache/global_digest_index'
+# 合并时每次从 CSV 中读取的行数
+merge_chunk_size = 100000
+# 合并排序时内存中最多缓存的行数，超过后排序并写入磁盘上的临时有序段，最后做 k 路归并
+merge_buffer_rows = 200000
+# 临时有序段的存放目录，None 表示使用系统临时目录
+merge_spill_dir = None
+# 已处理数据源与合并结果的清单，增量模式（python pipeline.py --incremental）据此只处理新增或变化的数据源
+manifest_path = '数据/cache/manifest.json'
+
+# --- 文本清理配置（text_cleaning.py） ---
+# 合并之后清理正文：去掉缺失标题留下的 'nan'、修复乱码、Unicode 规范化、合并空白，结果按 merged_output_formats 写出。
+# python pipeline.py --clean 在合并后接着清理；也可以单独运行 python text_cleaning.py
+enable_cleaning = False
+cleaned_output_file = 'final_all_news_cleaned.csv'
+cleaned_parquet_dir = 'final_all_news_cleaned_parquet'
+cleaned_store_dir = 'final_all_news_cleaned_store'
+# 各选项的含义见 text_cleaning.DEFAULT_OPTIONS；repair_mojibake 为需要修复乱码的数据源名称
+# （2018-2024.6 的 CSV 文件只能按 latin-1 读取，其中的非 ASCII 字符是乱码）
+cleaning_options = {'normalization': 'NFKC', 'collapse_whitespace': True, 'strip_missing_title': True,
+                    'drop_empty': True}
+repair_mojibake = ['2018-2024.6']
+# 清理使用的进程数（None 表示 CPU 核数）和每个任务的行数
+cleaning_workers = None
+cleaning_chunk_rows = 20000
+
+# --- 关键词索引配置（keyword_index.py） ---
+# 为合并结果（Parquet 数据集或文章库，CSV 不支持）建立关键词倒排索引，按关键词、短语和日期范围检索文章。
+# python pipeline.py --index 在合并（及清理）后接着更新索引；也可以单独运行 python keyword_index.py build
+enable_keyword_index = False
+keyword_index_dir = 'final_all_news_index'
+# 为清理后的结果（cleaned_*）而不是合并结果建立索引
+index_cleaned_corpus = False
+# 建立索引使用的进程数（None 表示 CPU 核数）；每个进程一次处理一年的数据，内容没有变化的年份不重建
+index_workers = None
+
+# --- 覆盖情况和质量报告（quality_report.py） ---
+# 处理各数据源时顺便统计每天的文章数、被删除的日期、日期格式命中数和长度分布，处理完成后汇总为报告：
+# JSON 为各数据源的摘要（含缺口和异常日期），Parquet 为每个工作日一行的文章数和标记；也可以单独运行 python quality_report.py
+enable_quality_report = True
+quality_report_json = 'final_all_news_report.json'
+quality_report_parquet = 'final_all_news_daily.parquet'
+# 各参数的含义见 quality_report.DEFAULT_OPTIONS
+quality_report_options = {'short_chars': 50, 'long_chars': 50000, 'window': 20, 'min_baseline': 5, 'low_ratio': 0.25,
+                          'high_ratio': 4.0, 'max_listed': 50}
+
+# --- 词元导出配置（token_export.py） ---
+# 把合并结果（Parquet 数据集或文章库，CSV 不支持）的正文分词，导出为按年份分片的 NumPy 词元数组和共享词表，
+# 下游模型按日期范围内存映射读取，不必每次重新读取、分词 CSV。
+# python pipeline.py --export-tokens 在合并（及清理、索引）后接着导出；也可以单独运行 python token_export.py build
+enable_token_export = False
+token_export_dir = 'final_all_news_tokens'
+# 导出清理后的结果（cleaned_*）而不是合并结果
+token_export_cleaned_corpus = False
+# 分词方式：'words'（小写的连续字母、数字和下划线，与关键词索引相同）、'whitespace'（按空白切分），
+# 或 '模块:函数名' 指定的函数（接受一篇正文，返回词的列表）
+tokenizer = 'words'
+# 词表参数：出现次数少于 min_count 的词、按次数排在 max_size 之后的词（None 表示不限）编号为 0（<unk>）
+token_vocab_options = {'min_count': 1, 'max_size': None}
+# 导出使用的进程数（None 表示 CPU 核数）；每个进程一次处理一年的数据
+export_workers = None
@@ -0,0 +1,31 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# 进程池使用平台默认的启动方式（Linux 为 fork，Windows / macOS 为 spawn）。spawn 方式的子进程会重新导入启动它的脚本，
+# 因此各脚本的入口都放在 if __name__ == '__main__': 之下；交给子进程的函数须定义在模块顶层，参数须可以 pickle
+
+
+def ordered_map(function, tasks, workers, executor=None):
+    """
+    用进程池对 tasks 中的每一项调用 function，按提交顺序逐个产出结果；
+    同时在途的任务最多为进程数的两倍，tasks 可以是生成器，内存占用与任务总数无关。
+    workers 不超过 1 时在当前进程中逐个处理。给出 executor 时使用这个已有的进程池（由调用方关闭），
+    否则临时创建一个，处理完后关闭。
+    """
+    if workers <= 1:
+        yield from map(function, tasks)
+        return
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(function, task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
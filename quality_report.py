@@ -0,0 +1,269 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from source_cache import pa
+
+# 默认参数：
+#   short_chars / long_chars  正文少于 / 多于这么多字符的文章计为过短 / 过长
+#   window                    判断异常时与之前这么多个工作日的中位数比较
+#   min_baseline              中位数少于这个数时不判断异常（文章很少的时期波动太大）
+#   low_ratio / high_ratio    当天的文章数不超过中位数的 low_ratio 倍或不少于 high_ratio 倍时标记为异常
+#   max_listed                报告中每个数据源最多列出的缺口段和异常日期个数（完整的标记见 Parquet 报告）
+DEFAULT_OPTIONS = {'short_chars': 50, 'long_chars': 50000, 'window': 20, 'min_baseline': 5, 'low_ratio': 0.25,
+                   'high_ratio': 4.0, 'max_listed': 50}
+# 长度直方图的分箱：第 0 箱为空文本，第 k 箱为长度在 [2^(k-1), 2^k) 之间的文本，最后一箱包含更长的文本
+LENGTH_BINS = 24
+# 全部数据源之和在报告中的名称
+TOTAL = '全部'
+
+
+def length_histogram(lengths):
+    """长度（整数数组）按 2 的幂分箱的计数"""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    bins = np.zeros(len(lengths), dtype=np.int64)
+    positive = lengths > 0
+    bins[positive] = np.minimum(np.floor(np.log2(lengths[positive])).astype(np.int64) + 1, LENGTH_BINS - 1)
+    return np.bincount(bins, minlength=LENGTH_BINS)
+
+
+def bin_labels():
+    """长度直方图各箱的说明，如 '0'、'1'、'2-3'、'4-7'……"""
+    labels = ['0', '1']
+    for k in range(2, LENGTH_BINS - 1):
+        labels.append(f'{2 ** (k - 1)}-{2 ** k - 1}')
+    labels.append(f'{2 ** (LENGTH_BINS - 2)}+')
+    return labels
+
+
+def _text_lengths(values):
+    """一列文本的字符数，缺失值为 0"""
+    return pd.Series(np.asarray(values, dtype=object)).str.len().fillna(0).to_numpy(dtype=np.int64)
+
+
+class CoverageProfile:
+    """
+    在处理数据源时逐批累计的覆盖情况和质量统计，不需要额外读取数据：
+    每天的文章数（以第一天为起点的稠密计数数组）、日期缺失 / 无法解析的行数、标题缺失（写出后为 'nan'）和正文为空的行数、
+    正文和标题的长度直方图、过短 / 过长的正文数。日期格式的命中数和无法解析的取值样例取自 DateNormalizer（见 finish）。
+    结果为可以序列化为 JSON 的字典，随检查点和统计信息保存。
+    """
+
+    def __init__(self, short_chars=DEFAULT_OPTIONS['short_chars'], long_chars=DEFAULT_OPTIONS['long_chars']):
+        self.short_chars = short_chars
+        self.long_chars = long_chars
+        self.first_day = None
+        self.day_counts = np.zeros(0, dtype=np.int64)
+        self.counts = {'rows': 0, 'missing_dates': 0, 'unparsed_dates': 0, 'missing_titles': 0,
+                       'empty_contents': 0, 'short_contents': 0, 'long_contents': 0}
+        self.content_lengths = np.zeros(LENGTH_BINS, dtype=np.int64)
+        self.title_lengths = np.zeros(LENGTH_BINS, dtype=np.int64)
+
+    def _add_days(self, days):
+        """days 为日期对应的天数（自 1970-01-01 起），累计到每天的计数中"""
+        if not len(days):
+            return
+        low, high = int(days.min()), int(days.max())
+        if self.first_day is None:
+            self.first_day = low
+        if low < self.first_day:
+            self.day_counts = np.concatenate([np.zeros(self.first_day - low, dtype=np.int64), self.day_counts])
+            self.first_day = low
+        size = high - self.first_day + 1
+        if size > len(self.day_counts):
+            self.day_counts = np.concatenate([self.day_counts, np.zeros(size - len(self.day_counts), dtype=np.int64)])
+        self.day_counts += np.bincount(days - self.first_day, minlength=len(self.day_counts))
+
+    def add(self, dates, titles, contents, parsed=None):
+        """
+        统计一批删除无效日期之后的行：dates 为日期（datetime64），titles / contents 为标题和正文，日期为 NaT 的行不计入。
+        parsed 为这一批的日期解析结果（DateParseResult，含被删除的行），用于统计日期缺失和无法解析的行数
+        """
+        dates = np.asarray(dates, dtype='datetime64[ns]')
+        valid = ~np.isnat(dates)
+        self.counts['rows'] += int(valid.sum())
+        if parsed is not None:
+            unparsed = int(np.sum(parsed.unparsed))
+            self.counts['unparsed_dates'] += unparsed
+            self.counts['missing_dates'] += int(parsed.dates.isna().sum()) - unparsed
+        self._add_days(dates[valid].astype('datetime64[D]').view(np.int64))
+        content_lengths = _text_lengths(np.asarray(contents, dtype=object)[valid])
+        title_values = np.asarray(titles, dtype=object)[valid]
+        title_lengths = _text_lengths(title_values)
+        self.counts['missing_titles'] += int(pd.isna(title_values).sum())
+        self.counts['empty_contents'] += int((content_lengths == 0).sum())
+        self.counts['short_contents'] += int(((content_lengths > 0) & (content_lengths < self.short_chars)).sum())
+        self.counts['long_contents'] += int((content_lengths > self.long_chars).sum())
+        self.content_lengths += length_histogram(content_lengths)
+        self.title_lengths += length_histogram(title_lengths)
+
+    def finish(self, normalizer=None):
+        """返回统计结果字典；normalizer（DateNormalizer）给出时加入各日期格式的命中数和无法解析的取值样例"""
+        first = None if self.first_day is None else str(np.datetime64(self.first_day, 'D'))
+        result = dict(self.counts, first_day=first, day_counts=self.day_counts.tolist(),
+                      content_lengths=self.content_lengths.tolist(), title_lengths=self.title_lengths.tolist(),
+                      short_chars=self.short_chars, long_chars=self.long_chars)
+        if normalizer is not None:
+            result['format_hits'] = dict(normalizer.total_hits.most_common())
+            result['unparsed_samples'] = dict(normalizer.unparsed_samples.most_common())
+        return result
+
+
+def daily_series(profile):
+    """统计结果中每天的文章数（Series，索引为连续的日期）"""
+    if profile['first_day'] is None:
+        return pd.Series(dtype=np.int64, index=pd.DatetimeIndex([], name='DATE'), name='COUNT')
+    index = pd.date_range(profile['first_day'], periods=len(profile['day_counts']), freq='D', name='DATE')
+    return pd.Series(np.asarray(profile['day_counts'], dtype=np.int64), index=index, name='COUNT')
+
+
+def flag_days(counts, options):
+    """
+    在每天的文章数（连续日期的 Series）上标记缺口和异常，只看工作日（周一至周五，不考虑节假日）：
+    - 缺口：首尾日期之间没有任何文章的工作日；
+    - 异常：当天的文章数与之前 window 个工作日的中位数相比过低或过高（见 DEFAULT_OPTIONS），缺口不重复标记为异常。
+    返回工作日的 DataFrame：COUNT、BASELINE（之前的中位数）、CHANGE（与前一个工作日相比的变化比例）、GAP、ANOMALY
+    """
+    days = counts[np.is_busday(counts.index.to_numpy().astype('datetime64[D]'))]
+    baseline = days.shift(1).rolling(options['window'], min_periods=max(options['window'] // 4, 1)).median()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = (days / baseline).to_numpy()
+        change = (days / days.shift(1) - 1).to_numpy()
+    gap = (days == 0).to_numpy()
+    judged = (baseline >= options['min_baseline']).to_numpy() & ~gap
+    anomaly = judged & ((ratio <= options['low_ratio']) | (ratio >= options['high_ratio']))
+    return pd.DataFrame({'COUNT': days.to_numpy(), 'BASELINE': baseline.to_numpy(),
+                         'CHANGE': np.where(np.isfinite(change), change, np.nan), 'GAP': gap, 'ANOMALY': anomaly},
+                        index=days.index)
+
+
+def _gap_ranges(flags):
+    """连续的缺口工作日合并为 [起始日期, 结束日期, 工作日数]"""
+    gap = flags['GAP'].to_numpy()
+    if not gap.any():
+        return []
+    edges = np.diff(np.concatenate([[0], gap.astype(np.int8), [0]]))
+    starts, stops = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    dates = flags.index
+    return [[str(dates[a].date()), str(dates[b - 1].date()), int(b - a)] for a, b in zip(starts, stops)]
+
+
+def summarize(profile, options=None, row_filter=None):
+    """
+    一个数据源（或全部数据源之和）的统计结果在 JSON 报告中的摘要，返回 (摘要, flag_days 的结果)。
+    按日抽样（row_filter 中有 sample）时大部分日期本来就没有数据，不标记缺口和异常
+    """
+    options = dict(DEFAULT_OPTIONS, **(options or {}))
+    flags = flag_days(daily_series(profile), options)
+    counts = np.asarray(profile['day_counts'], dtype=np.int64)
+    summary = {key: profile[key] for key in ('rows', 'missing_dates', 'unparsed_dates', 'missing_titles',
+                                             'empty_contents', 'short_contents', 'long_contents') if key in profile}
+    summary.update(first_day=profile['first_day'],
+                   last_day=str(np.datetime64(profile['first_day'], 'D') + len(counts) - 1)
+                   if profile['first_day'] else None,
+                   days_with_articles=int((counts > 0).sum()),
+                   content_lengths=dict(zip(bin_labels(), profile['content_lengths'])),
+                   title_lengths=dict(zip(bin_labels(), profile['title_lengths'])))
+    for key in ('format_hits', 'unparsed_samples'):
+        if key in profile:
+            summary[key] = profile[key]
+    if row_filter and row_filter.get('sample'):
+        flags[['GAP', 'ANOMALY']] = False
+    else:
+        ranges = _gap_ranges(flags)
+        anomalies = flags[flags['ANOMALY']]
+        summary['gaps'] = {'business_days': int(flags['GAP'].sum()), 'ranges': len(ranges),
+                           'listed': ranges[:options['max_listed']]}
+        summary['anomalies'] = {'days': len(anomalies), 'listed': [
+            {'date': str(date.date()), 'count': int(row.COUNT), 'baseline': float(row.BASELINE),
+             'change': None if pd.isna(row.CHANGE) else round(float(row.CHANGE), 3)}
+            for date, row in anomalies.head(options['max_listed']).iterrows()]}
+    return summary, flags
+
+
+def _total_profile(profiles):
+    """各数据源统计结果之和（每天的文章数按日期对齐相加）"""
+    series = [daily_series(profile) for profile in profiles.values()]
+    total = pd.concat(series, axis=1, sort=True).fillna(0).sum(axis=1).astype(np.int64) if series else daily_series(
+        {'first_day': None})
+    if len(total):
+        total = total.reindex(pd.date_range(total.index[0], total.index[-1], freq='D'), fill_value=0)
+    result = {'first_day': str(total.index[0].date()) if len(total) else None, 'day_counts': total.tolist()}
+    for key in ('rows', 'missing_dates', 'unparsed_dates', 'missing_titles', 'empty_contents', 'short_contents',
+                'long_contents'):
+        result[key] = sum(profile.get(key, 0) for profile in profiles.values())
+    for key in ('content_lengths', 'title_lengths'):
+        result[key] = np.sum([profile[key] for profile in profiles.values()], axis=0, dtype=np.int64).tolist() \
+            if profiles else [0] * LENGTH_BINS
+    return result
+
+
+def build_report(profiles, options=None, row_filter=None):
+    """
+    由各数据源的统计结果（{名称: CoverageProfile.finish() 的结果}）生成报告，返回 (JSON 报告字典, 每天的 DataFrame)。
+    DataFrame 为长表：DATE、SOURCE（全部数据源之和为 TOTAL）、COUNT、BASELINE、CHANGE、GAP、ANOMALY，只包含工作日
+    """
+    options = dict(DEFAULT_OPTIONS, **(options or {}))
+    report = {'created': time.strftime("%Y-%m-%d %H:%M:%S"), 'row_filter': row_filter, 'options': options,
+              'sources': {}}
+    frames = []
+    for name, profile in list(profiles.items()) + [(TOTAL, _total_profile(profiles))]:
+        summary, flags = summarize(profile, options, row_filter)
+        if name == TOTAL:
+            report['total'] = summary
+        else:
+            report['sources'][name] = summary
+        frames.append(flags.reset_index().assign(SOURCE=name))
+    daily = pd.concat(frames, ignore_index=True)[['DATE', 'SOURCE', 'COUNT', 'BASELINE', 'CHANGE', 'GAP', 'ANOMALY']]
+    return report, daily
+
+
+def write_report(profiles, json_path, parquet_path=None, options=None, row_filter=None):
+    """生成报告并写出 JSON（摘要）和 Parquet（每个工作日一行的标记），返回 JSON 报告字典"""
+    report, daily = build_report(profiles, options, row_filter)
+    for path in (json_path, parquet_path):
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(json_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    os.replace(json_path + '.tmp', json_path)
+    if parquet_path:
+        if pa is None:
+            print(f"注意：未安装 pyarrow，不写出 {parquet_path}。")
+        else:
+            daily.to_parquet(parquet_path + '.tmp', index=False, engine='pyarrow')
+            os.replace(parquet_path + '.tmp', parquet_path)
+    return report
+
+
+def report_summary(summary):
+    """一个数据源的摘要（用于打印和写入日志）"""
+    parts = [f"标题缺失: {summary['missing_titles']} 条，正文为空: {summary['empty_contents']} 条，"
+             f"正文过短 / 过长: {summary['short_contents']} / {summary['long_contents']} 条"]
+    if summary.get('first_day'):
+        parts.append(f"覆盖 {summary['first_day']} ~ {summary['last_day']}，有文章的天数 {summary['days_with_articles']}")
+    if 'gaps' in summary:
+        parts.append(f"缺口 {summary['gaps']['business_days']} 个工作日（{summary['gaps']['ranges']} 段），"
+                     f"异常 {summary['anomalies']['days']} 天")
+    return '；'.join(parts)
+
+
+if __name__ == '__main__':
+    from pipeline import write_quality_report
+
+    parser = argparse.ArgumentParser(description='由各数据源最近一次处理时的统计重新生成覆盖情况和质量报告')
+    parser.add_argument('--show', type=int, default=10, help='每个数据源显示的缺口段和异常日期个数')
+    args = parser.parse_args()
+    result = write_quality_report()
+    if result is None:
+        raise SystemExit(1)
+    for source_name, source_summary in list(result['sources'].items()) + [(TOTAL, result['total'])]:
+        print(f"[{source_name}] {report_summary(source_summary)}")
+        for start_day, end_day, business_days in source_summary.get('gaps', {}).get('listed', [])[:args.show]:
+            print(f"    缺口 {start_day} ~ {end_day}（{business_days} 个工作日）")
+        for item in source_summary.get('anomalies', {}).get('listed', [])[:args.show]:
+            print(f"    异常 {item['date']}：{item['count']} 篇（之前的中位数 {item['baseline']:g}）")
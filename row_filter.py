@@ -0,0 +1,112 @@
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+# 抽样哈希的密钥（pd.util.hash_array 要求 16 个字符），种子不同时抽到的日期不同
+_HASH_KEY = 'news-smpl-{:06d}'
+_MAX_SEED = 999999
+
+
+class RowFilter:
+    """
+    快速试运行时只处理一部分数据：按日期范围筛选，和 / 或按日期哈希抽样。
+    - start / end：只保留日期在 [start, end] 内的行（end 当天全天都包含）；日期无法解析的行不在任何范围内，一律跳过；
+    - sample：抽样比例（如 0.01）。按“日”抽样：哈希值落在比例内的日期，当天的全部新闻都保留，其余日期整天跳过。
+      同一天的新闻在各数据源、各步骤中总是一起保留或跳过，所以抽样结果上的精确去重、跨文件去重与全量运行时
+      这些日期上的结果相同；抽到哪些日期只由 seed 决定，每次运行都一样。日期无法解析的行按原始取值哈希抽样。
+    判断只需要日期一列，读取数据源时在还原正文之前就跳过不需要的行（见 source_cache.iter_source_batches 的 predicate）。
+    """
+
+    def __init__(self, start=None, end=None, sample=None, seed=0):
+        if sample is not None and not 0 < sample <= 1:
+            raise ValueError(f"抽样比例必须在 (0, 1] 之间: {sample}")
+        if not 0 <= seed <= _MAX_SEED:
+            raise ValueError(f"抽样种子必须在 0 ~ {_MAX_SEED} 之间: {seed}")
+        self.start = pd.Timestamp(start).normalize() if start is not None else None
+        self.end = pd.Timestamp(end).normalize() if end is not None else None
+        self.sample = None if sample is None or sample >= 1 else float(sample)
+        self.seed = seed
+
+    @property
+    def active(self):
+        return self.start is not None or self.end is not None or self.sample is not None
+
+    def spec(self):
+        """筛选条件，计入检查点、清单和合并的指纹（未筛选时为 None，指纹与不筛选时相同）"""
+        if not self.active:
+            return None
+        return {'start': self.start and str(self.start.date()), 'end': self.end and str(self.end.date()),
+                'sample': self.sample, 'seed': self.seed if self.sample is not None else None}
+
+    def describe(self):
+        """用于打印和写入日志的说明"""
+        parts = []
+        if self.start is not None or self.end is not None:
+            start = self.start.date() if self.start is not None else '最早'
+            end = self.end.date() if self.end is not None else '最晚'
+            parts.append(f"日期 {start} ~ {end}")
+        if self.sample is not None:
+            parts.append(f"按日抽样 {self.sample:.2%}（种子 {self.seed}）")
+        return '，'.join(parts) or '不筛选'
+
+    def mask(self, dates, raw=None):
+        """
+        dates 为解析后的日期（datetime64 数组，无法解析为 NaT），返回要保留的行的布尔数组。
+        raw 为对应的原始取值，用于日期无法解析的行的抽样；未给出时这些行一律跳过。
+        """
+        dates = np.asarray(dates, dtype='datetime64[ns]')
+        missing = np.isnat(dates)
+        keep = np.ones(len(dates), dtype=bool)
+        if self.start is not None:
+            keep &= ~missing & (dates >= self.start.to_datetime64())
+        if self.end is not None:
+            keep &= ~missing & (dates < (self.end + pd.Timedelta(days=1)).to_datetime64())
+        if self.sample is not None:
+            keys = np.datetime_as_string(dates, unit='D').astype(object)
+            if raw is not None and missing.any():
+                keys[missing] = [f'\x00{value}' for value in np.asarray(raw, dtype=object)[missing]]
+            elif missing.any():
+                keep &= ~missing
+            hashes = pd.util.hash_array(keys, hash_key=_HASH_KEY.format(self.seed), categorize=True)
+            # 取高 53 位换算为 [0, 1) 内的均匀取值
+            keep &= (hashes >> np.uint64(11)).astype(np.float64) / 2.0 ** 53 < self.sample
+        return keep
+
+
+def filter_arguments(parser):
+    """为命令行加上 --start / --end / --sample / --sample-seed 选项"""
+    parser.add_argument('--start', default=None, help='只处理该日期（含）之后的新闻，如 2020-01-01')
+    parser.add_argument('--end', default=None, help='只处理该日期（含当天）之前的新闻')
+    parser.add_argument('--sample', type=float, default=None,
+                        help='按日期哈希抽样的比例（如 0.01），抽中日期的新闻全部保留，每次运行抽到的日期相同')
+    parser.add_argument('--sample-seed', type=int, default=0, help='抽样种子（0 ~ 999999），换一个种子抽到另一批日期')
+    return parser
+
+
+def from_args(args):
+    """由命令行选项创建 RowFilter；没有给出任何筛选条件时返回 None"""
+    row_filter = RowFilter(args.start, args.end, args.sample, args.sample_seed)
+    return row_filter if row_filter.active else None
+
+
+if __name__ == '__main__':
+    from csv_output import read_csv_chunks
+
+    parser = argparse.ArgumentParser(description='查看筛选条件在某个 CSV 文件上保留的行数')
+    parser.add_argument('path', help='CSV 文件（如 final_*_combined.csv）')
+    parser.add_argument('--date-column', default='DATE', help='日期列名')
+    filter_arguments(parser)
+    args = parser.parse_args()
+    row_filter = from_args(args)
+    if row_filter is None:
+        print("错误：请至少给出 --start、--end、--sample 中的一个。")
+        sys.exit(1)
+    rows, kept = 0, 0
+    for chunk in read_csv_chunks(args.path, 100000, usecols=[args.date_column], dtype=str, encoding='utf-8-sig'):
+        values = chunk[args.date_column]
+        dates = pd.to_datetime(values, errors='coerce').to_numpy()
+        rows += len(values)
+        kept += int(row_filter.mask(dates, values.to_numpy(dtype=object)).sum())
+    print(f"{row_filter.describe()}：共 {rows} 行，保留 {kept} 行（{kept / max(rows, 1):.2%}）。")
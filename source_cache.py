@@ -0,0 +1,303 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from pipeline_config import SOURCES
+from csv_stream import iter_csv_batches
+from xlsx_stream import DEFAULT_BATCH_SIZE, iter_xlsx_batches
+
+try:
+    import pyarrow as pa
+except ImportError:  # 未安装 pyarrow 时退回到直接读取原始文件
+    pa = None
+
+# --- 配置 ---
+# 缓存文件所在目录
+cache_dir = '数据/cache'
+
+# 所有原始数据源及其读取方式，键为文件路径（由 pipeline_config.SOURCES 生成）
+RAW_SOURCES = {source['path']: source['read_options'] for source in SOURCES}
+
+# 缓存格式版本，修改编码方式时递增，使旧缓存自动失效
+CACHE_VERSION = 3
+
+# 单元格取值类型编码：原始数据中同一列可能混有字符串、数字和日期，
+# 缓存中统一存为字符串，并额外记录类型，读取时据此还原
+TYPE_STR, TYPE_INT, TYPE_FLOAT, TYPE_BOOL, TYPE_DATETIME = 0, 1, 2, 3, 4
+_TYPE_CODES = {str: TYPE_STR, int: TYPE_INT, float: TYPE_FLOAT, bool: TYPE_BOOL,
+               np.int64: TYPE_INT, np.float64: TYPE_FLOAT, np.bool_: TYPE_BOOL}
+
+
+def iter_raw_batches(path, batch_size=DEFAULT_BATCH_SIZE, reader='xlsx', read_stats=None, **options):
+    """
+    直接从原始 xlsx / csv 文件分批读取数据。CSV 默认用 pyarrow 多线程读取（见 csv_stream.py），
+    read_options 中 'engine' 为 'pandas' 或未安装 pyarrow 时使用 pd.read_csv。
+    read_stats 为字典时，读完后在其中记录因字段过多而跳过的行数（invalid_rows）
+    """
+    read_stats = {} if read_stats is None else read_stats
+    read_stats['invalid_rows'] = 0
+    if reader == 'xlsx':
+        yield from iter_xlsx_batches(path, batch_size=batch_size, **options)
+    elif reader == 'csv' and pa is not None and options.get('engine', 'arrow') == 'arrow':
+        stats = {}
+        yield from iter_csv_batches(path, names=options.get('names'), encoding=options.get('encoding', 'utf-8'),
+                                    batch_size=batch_size, stats=stats)
+        read_stats['invalid_rows'] = stats['invalid_rows']
+        print(f"已读取 '{path}'：{stats['rows']} 行，耗时 {stats['seconds']} 秒（{stats['rows_per_sec']} 行/秒）。")
+    elif reader == 'csv':
+        names = options.get('names')
+        for chunk in pd.read_csv(path, header=None, names=names, encoding=options.get('encoding', 'utf-8'),
+                                 dtype=str, chunksize=batch_size):
+            yield chunk.reset_index(drop=True).astype(object)
+    else:
+        raise ValueError(f"未知的读取方式: {reader}")
+
+
+def file_digest(path, block_size=8 * 1024 * 1024):
+    """分块计算文件内容的哈希值"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_paths(path):
+    """返回某个原始文件对应的缓存数据文件和元数据文件路径"""
+    key = hashlib.blake2b(os.path.abspath(path).encode('utf-8'), digest_size=4).hexdigest()
+    base = os.path.join(cache_dir, f'{os.path.basename(path)}.{key}')
+    return base + '.arrow', base + '.json'
+
+
+def _load_meta(path):
+    _, meta_path = cache_paths(path)
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def is_cache_valid(path, options):
+    """
+    判断缓存是否仍然有效：路径、读取参数和文件大小必须一致；
+    修改时间不同时再比较内容哈希，只是被 touch 过的文件不会触发重新转换。
+    """
+    meta = _load_meta(path)
+    data_path, meta_path = cache_paths(path)
+    if meta is None or not os.path.exists(data_path):
+        return False
+    stat = os.stat(path)
+    if (meta.get('version') != CACHE_VERSION or meta.get('path') != os.path.abspath(path)
+            or meta.get('options') != options or meta.get('size') != stat.st_size):
+        return False
+    if meta.get('mtime_ns') == stat.st_mtime_ns:
+        return True
+    if meta.get('content_hash') != file_digest(path):
+        return False
+    # 内容未变，仅更新元数据中的修改时间
+    meta['mtime_ns'] = stat.st_mtime_ns
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return True
+
+
+def _type_code(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return TYPE_DATETIME
+    # 其他不认识的类型按字符串保存
+    return _TYPE_CODES.get(type(value), TYPE_STR)
+
+
+def encode_column(values):
+    """将一列 object 取值编码为 (字符串数组, 类型数组)，缺失值在两者中均为 null"""
+    missing = pd.isna(values)
+    if pd.api.types.infer_dtype(values, skipna=True) in ('string', 'empty'):
+        codes = np.where(missing, -1, TYPE_STR).astype(np.int8)
+        strings = values
+    else:
+        codes = np.fromiter((-1 if is_na else _type_code(v) for v, is_na in zip(values, missing)),
+                            dtype=np.int8, count=len(values))
+        strings = [None if is_na else str(v) for v, is_na in zip(values, missing)]
+    strings = pa.array(strings, type=pa.large_string(), from_pandas=True)
+    codes = pa.array(codes, mask=missing)
+    return strings, codes
+
+
+def decode_column(strings, codes):
+    """encode_column 的逆过程，返回 object 数组"""
+    values = strings.to_numpy(zero_copy_only=False).astype(object)
+    codes = codes.fill_null(-1).to_numpy()
+    values[codes == -1] = np.nan
+    if (codes > TYPE_STR).any():
+        for code, convert in ((TYPE_INT, lambda s: [int(v) for v in s]),
+                              (TYPE_FLOAT, lambda s: [float(v) for v in s]),
+                              (TYPE_BOOL, lambda s: [v == 'True' for v in s]),
+                              (TYPE_DATETIME, lambda s: list(pd.to_datetime(s)))):
+            mask = codes == code
+            if mask.any():
+                converted = np.empty(mask.sum(), dtype=object)
+                converted[:] = convert(values[mask])
+                values[mask] = converted
+    return values
+
+
+def _encode_batch(df):
+    arrays, fields = [], []
+    for i, column in enumerate(df.columns):
+        strings, codes = encode_column(df[column].to_numpy(dtype=object))
+        arrays.extend([strings, codes])
+        fields.extend([f'{i}', f'{i}.type'])
+    return pa.RecordBatch.from_arrays(arrays, names=fields)
+
+
+def _decode_batch(batch, columns):
+    data = {column: decode_column(batch.column(2 * i), batch.column(2 * i + 1))
+            for i, column in enumerate(columns)}
+    return pd.DataFrame(data, columns=columns, dtype=object)
+
+
+def _convert_and_yield(path, options, batch_size, read_stats=None):
+    """读取原始文件的同时写入缓存；完整读完后才替换旧缓存，中途中断不会留下损坏的缓存"""
+    read_stats = {} if read_stats is None else read_stats
+    data_path, meta_path = cache_paths(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = data_path + '.tmp'
+    stat = os.stat(path)
+    content_hash = file_digest(path)
+    writer = None
+    columns = None
+    rows = 0
+    completed = False
+    try:
+        for df in iter_raw_batches(path, batch_size=batch_size, read_stats=read_stats, **options):
+            record_batch = _encode_batch(df)
+            if writer is None:
+                columns = list(df.columns)
+                writer = pa.ipc.new_file(tmp_path, record_batch.schema)
+            writer.write_batch(record_batch)
+            rows += len(df)
+            yield df
+        completed = True
+    finally:
+        if writer is not None:
+            writer.close()
+        if completed and writer is not None:
+            if os.path.exists(meta_path):
+                os.remove(meta_path)
+            os.replace(tmp_path, data_path)
+            meta = {
+                'version': CACHE_VERSION,
+                'path': os.path.abspath(path),
+                'options': options,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'content_hash': content_hash,
+                'columns': columns,
+                'rows': rows,
+                'invalid_rows': read_stats['invalid_rows'],
+                'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False, indent=2)
+        elif os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _iter_cached(path, batch_size, predicate=None):
+    """
+    通过内存映射读取缓存，按 batch_size 重新切分后逐批还原为 DataFrame。
+    给出 predicate 时先只还原其中的那一列，在 Arrow 表上筛掉不需要的行，其余列（正文等）只还原保留的行。
+    """
+    data_path, _ = cache_paths(path)
+    columns = _load_meta(path)['columns']
+    with pa.memory_map(data_path, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+        if predicate is not None and predicate[0] in columns:
+            i = columns.index(predicate[0])
+            keep = predicate[1](decode_column(table.column(2 * i), table.column(2 * i + 1)))
+            if not keep.all():
+                # 筛选后各块只剩很少的行，合并为连续的块再按 batch_size 切分
+                table = table.filter(pa.array(keep)).combine_chunks()
+        for batch in table.to_batches(max_chunksize=batch_size):
+            yield _decode_batch(batch, columns)
+
+
+def _filtered(batches, predicate):
+    """逐批按 predicate 筛选读取到的行（读取原始文件时使用），跳过筛选后为空的批次"""
+    column, keep_rows = predicate
+    for df in batches:
+        if column in df.columns:
+            keep = keep_rows(df[column].to_numpy(dtype=object))
+            if not keep.all():
+                df = df[keep].reset_index(drop=True)
+        if len(df):
+            yield df
+
+
+def iter_source_batches(path, batch_size=DEFAULT_BATCH_SIZE, use_cache=True, predicate=None, read_stats=None,
+                        **options):
+    """
+    分批读取原始数据源。缓存有效时直接内存映射列式缓存文件；
+    否则读取原始文件，并在读取过程中顺便生成缓存供下次使用。
+    未显式传入读取参数时，使用 RAW_SOURCES 中登记的配置。
+    predicate 为 (列名, 函数)：函数接收该列的取值（object 数组），返回要保留的行的布尔数组，用于只读取一部分数据
+    （见 row_filter.py）。读取缓存时在还原其他列之前筛选；读取原始文件时仍完整读取（缓存需要全部数据），逐批筛选后产出。
+    read_stats 为字典时，读完后在其中记录原始文件中因字段过多而跳过的行数（invalid_rows）；读取缓存时取自缓存的元数据。
+    """
+    if not options:
+        options = dict(RAW_SOURCES.get(path, {'reader': 'xlsx'}))
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    if not use_cache or pa is None:
+        batches = iter_raw_batches(path, batch_size=batch_size, read_stats=read_stats, **options)
+    elif is_cache_valid(path, options):
+        print(f"使用列式缓存读取 '{path}'。")
+        yield from _iter_cached(path, batch_size, predicate)
+        if read_stats is not None:
+            read_stats['invalid_rows'] = _load_meta(path).get('invalid_rows', 0)
+        return
+    else:
+        print(f"缓存不存在或已失效，读取原始文件 '{path}' 并生成缓存...")
+        batches = _convert_and_yield(path, options, batch_size, read_stats)
+    yield from (batches if predicate is None else _filtered(batches, predicate))
+
+
+def convert_source(path, force=False):
+    """将单个数据源转换为列式缓存，返回 (路径, 行数, 耗时秒数, 状态)"""
+    options = dict(RAW_SOURCES.get(path, {'reader': 'xlsx'}))
+    start = time.time()
+    if not force and is_cache_valid(path, options):
+        return path, _load_meta(path)['rows'], time.time() - start, '已是最新'
+    rows = sum(len(df) for df in _convert_and_yield(path, options, DEFAULT_BATCH_SIZE))
+    return path, rows, time.time() - start, '已转换'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='将原始数据源转换为列式缓存（Arrow IPC）')
+    parser.add_argument('paths', nargs='*', help='要转换的文件，默认为 RAW_SOURCES 中的全部数据源')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='并行转换的进程数')
+    parser.add_argument('--force', action='store_true', help='忽略已有缓存，强制重新转换')
+    args = parser.parse_args()
+
+    if pa is None:
+        print("错误：未安装 pyarrow，无法生成列式缓存。")
+        exit()
+
+    paths = args.paths or [path for path in RAW_SOURCES if os.path.exists(path)]
+    missing = [path for path in (args.paths or RAW_SOURCES) if not os.path.exists(path)]
+    for path in missing:
+        print(f"跳过：找不到文件 '{path}'。")
+
+    print(f"开始转换 {len(paths)} 个数据源，使用 {args.workers} 个进程...")
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for path, rows, seconds, status in executor.map(convert_source, paths, [args.force] * len(paths)):
+            print(f"{status}: {path}，共 {rows} 行，耗时 {seconds:.1f} 秒")
+    print("全部数据源转换完成。")
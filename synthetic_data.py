@@ -0,0 +1,245 @@
+import argparse
+import os
+import shutil
+import tempfile
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+from pipeline_config import SOURCES
+
+# 每个数据源的形状：日期范围、日期写法（格式及其比例）、重复率、无效日期比例、有表头时的列顺序。
+# 重复率取自 processing_log.txt 中各数据源的统计（删除的重复条数 / 原始总条数）。
+SOURCE_PROFILES = {
+    '1984-2000': {'date_range': ('1984-01-01', '2000-12-31'), 'date_styles': [('%Y/%m/%d', 1.0)],
+                  'duplicate_rate': 80459 / 867618, 'invalid_date_rate': 0.001},
+    '2001-2017': {'date_range': ('2001-01-01', '2017-12-31'), 'date_styles': [('%Y/%m/%d', 1.0)],
+                  'duplicate_rate': 117343 / 661696, 'invalid_date_rate': 0.001},
+    # 没有表头的 latin-1 CSV，日期混有 日/月/年 和 年/月/日 两种写法
+    '2018-2024.6': {'date_range': ('2018-01-01', '2024-06-30'), 'date_styles': [('%d/%m/%Y', 0.6), ('%Y/%m/%d', 0.4)],
+                    'duplicate_rate': 1413 / 133956, 'invalid_date_rate': 0.001},
+    '2022': {'date_range': ('2022-01-01', '2022-12-31'), 'date_styles': [('%d/%m/%Y', 1.0)],
+             'duplicate_rate': 6435 / 28646, 'invalid_date_rate': 0.001, 'header': ['DATE', 'TITLE', 'CONTENT']},
+    '2024.7-2025.3': {'date_range': ('2024-07-03', '2025-03-15'), 'date_styles': [('%Y 年 %m 月 %d 日', 1.0)],
+                      'duplicate_rate': 1 / 12515, 'invalid_date_rate': 0.0, 'header': ['title', 'date', 'text']},
+}
+# 正文平均词数（对数正态分布）及词表大小，词频服从 Zipf 分布
+DEFAULT_WORDS = 120
+VOCABULARY_SIZE = 20000
+# 每次生成并写出的行数
+CHUNK_ROWS = 50000
+# 无效日期的写法
+_INVALID_DATES = ['N/A', '', 'unknown', '31/02/2020x']
+
+
+def _rng(name, seed):
+    """每个数据源使用独立且固定的随机数序列，同样的参数总是生成同样的文件"""
+    return np.random.default_rng([seed, zlib.crc32(name.encode('utf-8'))])
+
+
+def _vocabulary(seed):
+    rng = np.random.default_rng(seed)
+    letters = rng.integers(ord('a'), ord('z') + 1, size=(VOCABULARY_SIZE, 10), dtype=np.uint8)
+    lengths = rng.integers(2, 11, size=VOCABULARY_SIZE)
+    words = [row[:length].tobytes().decode('ascii') for row, length in zip(letters, lengths)]
+    # 少量 latin-1 范围内的非 ASCII 字符，覆盖 latin-1 CSV 的解码
+    for i in range(0, VOCABULARY_SIZE, 997):
+        words[i] = words[i] + 'é'
+    ranks = np.arange(1, VOCABULARY_SIZE + 1)
+    weights = 1.0 / ranks
+    return np.array(words, dtype=object), weights / weights.sum()
+
+
+def _texts(rng, vocabulary, probabilities, count, mean_words):
+    """生成 count 篇文本，词数服从均值约为 mean_words 的对数正态分布"""
+    lengths = np.maximum(1, rng.lognormal(np.log(mean_words) - 0.125, 0.5, size=count).astype(np.int64))
+    words = vocabulary[rng.choice(len(vocabulary), size=int(lengths.sum()), p=probabilities)]
+    ends = np.cumsum(lengths)
+    return [' '.join(words[end - length:end]) for end, length in zip(ends.tolist(), lengths.tolist())]
+
+
+def generate_rows(name, rows, seed=0, mean_words=DEFAULT_WORDS):
+    """
+    逐块生成某个数据源形状的合成数据，产出 DataFrame（DATE、TITLE、CONTENT 三列，日期为该数据源原始写法的字符串）。
+    日期在整个文件中递增；按重复率把前面的某一行原样复制一份，模拟原始数据中的重复新闻。
+    """
+    profile = SOURCE_PROFILES[name]
+    rng = _rng(name, seed)
+    vocabulary, probabilities = _vocabulary(seed)
+    first, last = (pd.Timestamp(day) for day in profile['date_range'])
+    total_days = (last - first).days + 1
+    formats = [fmt for fmt, _ in profile['date_styles']]
+    format_weights = np.array([weight for _, weight in profile['date_styles']])
+    for start in range(0, rows, CHUNK_ROWS):
+        count = min(CHUNK_ROWS, rows - start)
+        # 本块覆盖整个日期范围中与行号成比例的一段
+        low = start * total_days // rows
+        high = max(low + 1, (start + count) * total_days // rows)
+        days = np.sort(rng.integers(low, high, size=count))
+        dates = first + pd.to_timedelta(days, unit='D')
+        styles = rng.choice(len(formats), size=count, p=format_weights / format_weights.sum())
+        date_text = np.empty(count, dtype=object)
+        for i, fmt in enumerate(formats):
+            mask = styles == i
+            date_text[mask] = dates[mask].strftime(fmt).to_numpy(dtype=object)
+        invalid = rng.random(count) < profile['invalid_date_rate']
+        date_text[invalid] = rng.choice(_INVALID_DATES, size=int(invalid.sum()))
+
+        titles = np.array(_texts(rng, vocabulary, probabilities, count, 8), dtype=object)
+        titles[rng.random(count) < 0.01] = None
+        contents = np.array(_texts(rng, vocabulary, probabilities, count, mean_words), dtype=object)
+
+        # 重复行：复制本块中前面不远处的一行（日期、标题、正文完全相同）
+        duplicate = np.flatnonzero(rng.random(count) < profile['duplicate_rate'])
+        duplicate = duplicate[duplicate > 0]
+        origin = np.maximum(0, duplicate - rng.integers(1, 200, size=len(duplicate)))
+        for column in (date_text, titles, contents):
+            column[duplicate] = column[origin]
+        yield pd.DataFrame({'DATE': date_text, 'TITLE': titles, 'CONTENT': contents})
+
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+class XlsxWriter:
+    """
+    流式写出只含字符串的单工作表 xlsx 文件（共享字符串表），内存占用与行数无关。
+    工作表逐行写入压缩包；共享字符串先写入临时文件，关闭时再写入压缩包。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._archive = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+        self._sheet = self._archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True)
+        self._sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                          b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                          b'<sheetData>')
+        self._strings = tempfile.TemporaryFile()
+        self._string_count = 0
+        self._row = 0
+
+    def write_rows(self, rows):
+        """rows 为若干行，每行是字符串或 None 组成的列表"""
+        parts = []
+        for values in rows:
+            self._row += 1
+            cells = []
+            for col, value in enumerate(values):
+                if value is None:
+                    continue
+                self._strings.write(f'<si><t xml:space="preserve">{escape(value)}</t></si>'.encode('utf-8'))
+                cells.append(f'<c r="{_column_letter(col)}{self._row}" t="s"><v>{self._string_count}</v></c>')
+                self._string_count += 1
+            parts.append(f'<row r="{self._row}">{"".join(cells)}</row>')
+        self._sheet.write(''.join(parts).encode('utf-8'))
+
+    def close(self):
+        self._sheet.write(b'</sheetData></worksheet>')
+        self._sheet.close()
+        with self._archive.open('xl/sharedStrings.xml', 'w', force_zip64=True) as f:
+            f.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    f'<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                    f'count="{self._string_count}" uniqueCount="{self._string_count}">'.encode('utf-8'))
+            self._strings.seek(0)
+            shutil.copyfileobj(self._strings, f)
+            f.write(b'</sst>')
+        self._strings.close()
+        self._archive.writestr('[Content_Types].xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '<Override PartName="/xl/sharedStrings.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+            '</Types>'))
+        self._archive.writestr('_rels/.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="xl/workbook.xml"/></Relationships>'))
+        self._archive.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>'))
+        self._archive.writestr('xl/_rels/workbook.xml.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            'Target="worksheets/sheet1.xml"/>'
+            '<Relationship Id="rId2" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" '
+            'Target="sharedStrings.xml"/></Relationships>'))
+        self._archive.close()
+
+
+def write_source(source, path, rows, seed=0, mean_words=DEFAULT_WORDS):
+    """按数据源的读取方式（xlsx / latin-1 CSV，有无表头）把合成数据写入 path"""
+    options = source['read_options']
+    header = SOURCE_PROFILES[source['name']].get('header')
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    if options['reader'] == 'csv':
+        with open(tmp_path, 'w', encoding=options.get('encoding', 'utf-8'), newline='') as f:
+            for df in generate_rows(source['name'], rows, seed, mean_words):
+                df.to_csv(f, index=False, header=False)
+    else:
+        writer = XlsxWriter(tmp_path)
+        if options.get('header'):
+            writer.write_rows([header])
+        for df in generate_rows(source['name'], rows, seed, mean_words):
+            if options.get('header'):
+                columns = source['columns']
+                df = df.rename(columns={'DATE': columns['date'], 'TITLE': columns['title'],
+                                        'CONTENT': columns['content']})[header]
+            writer.write_rows(df.astype(object).where(df.notna(), None).to_numpy().tolist())
+        writer.close()
+    os.replace(tmp_path, path)
+
+
+def synthetic_sources(rows, directory, names=None, seed=0, mean_words=DEFAULT_WORDS):
+    """
+    返回与 pipeline_config.SOURCES 形状相同、但指向 directory 中合成文件的数据源配置，
+    缺少的合成文件会先生成（同样的参数总是生成同样的文件）。
+    """
+    sources = []
+    for source in SOURCES:
+        if names and source['name'] not in names:
+            continue
+        if source['name'] not in SOURCE_PROFILES:
+            continue
+        extension = os.path.splitext(source['path'])[1]
+        path = os.path.join(directory, f"{source['name']}_{rows}_s{seed}_w{mean_words}{extension}")
+        if not os.path.exists(path):
+            print(f"正在生成合成数据 '{path}'（{rows} 行）...")
+            write_source(source, path, rows, seed, mean_words)
+        sources.append({**source, 'path': path,
+                        'output': os.path.join(directory, f"final_{source['name']}_{rows}_combined.csv")})
+    return sources
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='按各数据源的形状生成可复现的合成数据')
+    parser.add_argument('--rows', type=int, default=10000, help='每个数据源的行数')
+    parser.add_argument('--output-dir', default='数据/benchmark/data', help='合成文件的保存目录')
+    parser.add_argument('--sources', nargs='*', help='只生成这些数据源，默认为全部')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+    parser.add_argument('--words', type=int, default=DEFAULT_WORDS, help='正文平均词数')
+    args = parser.parse_args()
+    for source in synthetic_sources(args.rows, args.output_dir, args.sources, args.seed, args.words):
+        print(f"{source['name']}: {source['path']}（{os.path.getsize(source['path']) / 1024 / 1024:.1f} MB）")
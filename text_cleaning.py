@@ -0,0 +1,281 @@
+import argparse
+import os
+import re
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from article_store import ArticleStore, ArticleView
+from csv_output import read_csv_chunks
+from parquet_corpus import corpus_files
+from parquet_corpus import pa, pq
+from process_pool import ordered_map
+
+_NAT_KEY = np.iinfo(np.int64).max
+# 按 latin-1 读入的 cp1252 文本中，弯引号、破折号等字符会变成 C1 控制字符
+_C1_CONTROLS = re.compile('[\x80-\x9f]')
+
+DEFAULT_OPTIONS = {
+    # Unicode 规范化形式（'NFC' / 'NFKC' 等），None 表示不做规范化
+    'normalization': 'NFKC',
+    # 合并连续的空格、制表符和空行，并去掉首尾空白
+    'collapse_whitespace': True,
+    # 去掉标题合并时缺失的标题或正文留下的字面量 'nan'（'nan\n正文'、'标题\nnan'）
+    'strip_missing_title': True,
+    # 需要修复乱码的来源（合并结果中的 SOURCE，即各数据源的结果文件名）；输入没有来源信息（CSV）时对所有行尝试修复
+    'repair_mojibake_sources': [],
+    # 删除清理后为空的行
+    'drop_empty': True,
+    # 进程数，None 表示 CPU 核数；每个任务处理 chunk_rows 行
+    'workers': None,
+    'chunk_rows': 20000,
+}
+# 清理每一行时的计数项
+COUNT_FIELDS = ['missing_title', 'repaired', 'changed', 'empty']
+
+
+def repair_mojibake(text):
+    """
+    修复以 latin-1 读入造成的乱码：原文为 UTF-8 时（如 'Ã©' -> 'é'）按 UTF-8 重新解码，
+    原文为 cp1252 时（弯引号等变成 C1 控制字符）按 cp1252 重新解码。两种解码都不成立的文本原样返回。
+    """
+    if text.isascii():
+        return text
+    try:
+        raw = text.encode('latin-1')
+    except UnicodeEncodeError:
+        # 含有 latin-1 以外的字符，说明不是按 latin-1 读入的
+        return text
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        pass
+    if _C1_CONTROLS.search(text):
+        try:
+            return raw.decode('cp1252')
+        except UnicodeDecodeError:
+            pass
+    return text
+
+
+def _collapse_whitespace(text):
+    """每行内连续的空白合并为一个空格并去掉行首行尾的空白，删除空行（标题与正文之间的换行保留）"""
+    return '\n'.join(filter(None, [' '.join(line.split()) for line in text.split('\n')]))
+
+
+def clean_texts(texts, repair, normalization='NFKC', collapse_whitespace=True, strip_missing_title=True):
+    """
+    逐条清理文本，repair 为每条文本是否需要修复乱码。缺失值视为空文本。
+    返回 (清理后的文本列表, 各计数项)，计数项见 COUNT_FIELDS。
+    """
+    counts = dict.fromkeys(COUNT_FIELDS, 0)
+    cleaned = []
+    for text, needs_repair in zip(texts, repair):
+        original = text if isinstance(text, str) else ''
+        text = original
+        if strip_missing_title:
+            if text.startswith('nan\n'):
+                text = text[4:]
+                counts['missing_title'] += 1
+            if text == 'nan':
+                text = ''
+            elif text.endswith('\nnan'):
+                text = text[:-4]
+        if needs_repair:
+            repaired = repair_mojibake(text)
+            if repaired != text:
+                counts['repaired'] += 1
+                text = repaired
+        if normalization:
+            text = unicodedata.normalize(normalization, text)
+        if collapse_whitespace:
+            text = _collapse_whitespace(text)
+        counts['changed'] += text != original
+        counts['empty'] += not text
+        cleaned.append(text)
+    return cleaned, counts
+
+
+def _read_chunk(kind, data):
+    """
+    把一块输入还原为 (排序键, 正文, 来源编号)。文章库返回其中记录的来源编号（缺失为 -1）；
+    Parquet 和 CSV 的来源编号已在主进程中确定，返回 None
+    """
+    if kind == 'parquet':
+        table = pa.concat_tables([pq.read_table(path, columns=['DATE', 'CONTENT']) for path in data])
+        keys = table.column('DATE').to_numpy().view(np.int64).copy()
+        keys[keys == np.iinfo(np.int64).min] = _NAT_KEY
+        return keys, table.column('CONTENT').to_numpy(), None
+    if kind == 'store':
+        path, start, stop = data
+        with ArticleStore(path) as store:
+            records = np.array(store.records[start:stop])
+            texts = list(ArticleView(store, start, stop))
+        return records['date'], texts, records['source']
+    dates = pd.to_datetime(data['DATE'], errors='coerce')
+    keys = dates.to_numpy(dtype='datetime64[ns]').view(np.int64).copy()
+    keys[dates.isna().to_numpy()] = _NAT_KEY
+    return keys, data['CONTENT'].to_numpy(dtype=object), None
+
+
+def _clean_worker(args):
+    """
+    在子进程中完成一块数据的读取、清理和各输出格式的编码（见各输出的 encode_block），主进程只需按顺序追加写入。
+    source_map 把输入中的来源编号换成输出中的编号（末尾一项对应缺失的来源），repair_map 为输出中每个来源是否修复乱码。
+    """
+    kind, data, sources, source_map, repair_map, options, encoders = args
+    start = time.perf_counter()
+    keys, texts, codes = _read_chunk(kind, data)
+    if codes is not None:
+        sources = source_map[codes]
+    cleaned, counts = clean_texts(texts, repair_map[sources], **options['text'])
+    cleaned = np.array(cleaned, dtype=object)
+    rows_in = len(cleaned)
+    if options['drop_empty']:
+        keep = cleaned != ''
+        keys, cleaned, sources = keys[keep], cleaned[keep], sources[keep]
+    block = pd.DataFrame({'KEY': keys, 'CONTENT': pd.Series(cleaned, dtype=object), 'SOURCE': sources})
+    encoded = {name: encoder.encode_block(block) for name, encoder in encoders.items()}
+    return encoded, counts, rows_in, len(block), time.perf_counter() - start, os.getpid()
+
+
+def clean_corpus(input_format, input_path, outputs, log_file_name='processing_log.txt', **options):
+    """
+    清理合并结果（input_format 为 'parquet' / 'store' / 'csv'）中的正文：去掉缺失标题留下的 'nan'、修复指定来源的乱码、
+    Unicode 规范化、合并空白，按原来的顺序写入 outputs（merge.build_outputs 创建的输出，格式与合并结果相同）。
+    数据按 chunk_rows 行一块分给进程池，读取、清理和编码都在子进程中完成，主进程只负责分块和按顺序追加写入。
+    返回统计信息字典，并向日志追加一段清理日志。
+    """
+    if input_format not in ('parquet', 'store', 'csv'):
+        raise ValueError(f"未知的输入格式: {input_format}")
+    unknown = set(options) - set(DEFAULT_OPTIONS)
+    if unknown:
+        raise ValueError(f"未知的文本清理参数: {sorted(unknown)}")
+    options = {**DEFAULT_OPTIONS, **options}
+    workers = options['workers'] or os.cpu_count() or 1
+    chunk_rows = options['chunk_rows']
+    repair_sources = set(options['repair_mojibake_sources'])
+    text_options = ('normalization', 'collapse_whitespace', 'strip_missing_title')
+    task_options = {'text': {key: options[key] for key in text_options}, 'drop_empty': options['drop_empty']}
+    encoders = {name: type(output) for name, output in outputs.items()}
+    # 输出中的来源列表；输出与这里是同一个列表对象，读取过程中遇到的新来源也会写入输出
+    source_names = []
+
+    def source_ids(names):
+        """输入中的来源名称对应的输出编号，末尾加上缺失来源的 -1"""
+        for name in names:
+            if name not in source_names:
+                source_names.append(name)
+        return np.array([source_names.index(name) for name in names] + [-1], dtype=np.int16)
+
+    def repair_map():
+        # CSV 中没有来源，来源缺失的行在指定了修复来源时都尝试修复
+        return np.array([name in repair_sources for name in source_names]
+                        + [input_format == 'csv' and bool(repair_sources)])
+
+    def task(kind, data, sources=None, source_map=None):
+        return kind, data, sources, source_map, repair_map(), task_options, encoders
+
+    def tasks():
+        if input_format == 'parquet':
+            # 按文件分块，凑满 chunk_rows 行再交给子进程读取；这里只读取字典编码的 SOURCE 列，换成输出中的来源编号
+            paths, sources, rows = [], [], 0
+            for path in corpus_files(input_path):
+                source_column = pq.read_table(path, columns=['SOURCE']).column('SOURCE')
+                for chunk in source_column.chunks:
+                    lookup = source_ids(chunk.dictionary.to_pylist())
+                    sources.append(lookup[chunk.indices.fill_null(-1).to_numpy()])
+                paths.append(path)
+                rows += len(source_column)
+                if rows >= chunk_rows:
+                    yield task('parquet', paths, np.concatenate(sources))
+                    paths, sources, rows = [], [], 0
+            if paths:
+                yield task('parquet', paths, np.concatenate(sources))
+        elif input_format == 'store':
+            with ArticleStore(input_path) as store:
+                total, source_map = len(store), source_ids(store.sources)
+            for start in range(0, total, chunk_rows):
+                yield task('store', (input_path, start, min(start + chunk_rows, total)), source_map=source_map)
+        else:
+            for chunk in read_csv_chunks(input_path, chunk_rows, usecols=['DATE', 'CONTENT'], encoding='utf-8-sig'):
+                yield task('csv', chunk, np.full(len(chunk), -1, dtype=np.int16))
+
+    start = time.time()
+    stats = {'input': input_path, 'rows_in': 0, 'rows_out': 0, **dict.fromkeys(COUNT_FIELDS, 0)}
+    worker_stats = {}
+    output_names = ', '.join(output.path for output in outputs.values())
+    print(f"正在用 {workers} 个进程清理 {input_path} 中的文本，结果写入 {output_names}...")
+    for output in outputs.values():
+        output.source_names = source_names
+        output.open_full()
+    for encoded, counts, rows_in, rows_out, seconds, pid in ordered_map(_clean_worker, tasks(), workers):
+        for name, output in outputs.items():
+            output.write_encoded(encoded[name])
+        stats['rows_in'] += rows_in
+        stats['rows_out'] += rows_out
+        for key, value in counts.items():
+            stats[key] += value
+        worker = worker_stats.setdefault(pid, [0, 0.0])
+        worker[0] += rows_in
+        worker[1] += seconds
+    for output in outputs.values():
+        output.close()
+
+    stats['seconds'] = round(time.time() - start, 2)
+    stats['workers'] = {pid: {'rows': rows, 'seconds': round(seconds, 2),
+                              'rows_per_sec': round(rows / seconds) if seconds else None}
+                        for pid, (rows, seconds) in worker_stats.items()}
+    stats['rows_per_sec'] = round(stats['rows_in'] / stats['seconds']) if stats['seconds'] else None
+    print(f"文本清理完成：读取 {stats['rows_in']} 条，保留 {stats['rows_out']} 条，"
+          f"耗时 {stats['seconds']} 秒（{stats['rows_per_sec']} 条/秒）。")
+    for pid, worker in stats['workers'].items():
+        print(f"    进程 {pid}: {worker['rows']} 条，清理耗时 {worker['seconds']} 秒（{worker['rows_per_sec']} 条/秒）")
+    _append_cleaning_log(log_file_name, stats, options, outputs)
+    return stats
+
+
+def _append_cleaning_log(log_file_name, stats, options, outputs):
+    """将文本清理的统计信息追加到日志文件"""
+    current_time = time.strftime("%Y-%m-%d %H:%M:%S")
+    worker_lines = ''.join(f"    进程 {pid}: {worker['rows']} 条，{worker['seconds']} 秒，{worker['rows_per_sec']} 条/秒\n"
+                           for pid, worker in stats['workers'].items())
+    log_content = f"""
+
+==================================================
+文本清理日志
+==================================================
+处理时间: {current_time}
+输入: {stats['input']}
+输出: {', '.join(output.path for output in outputs.values())}
+清理选项: Unicode 规范化 {options['normalization'] or '无'}，合并空白 {'是' if options['collapse_whitespace'] else '否'}，修复乱码的来源 {', '.join(options['repair_mojibake_sources']) or '无'}
+
+------------------ 统计摘要 ------------------
+读取条数: {stats['rows_in']}
+去掉缺失标题 'nan' 的条数: {stats['missing_title']}
+修复乱码条数: {stats['repaired']}
+文本有改动的条数: {stats['changed']}
+清理后为空的条数: {stats['empty']}{'（已删除）' if options['drop_empty'] else ''}
+清理后剩余条数: {stats['rows_out']}
+处理耗时: {stats['seconds']} 秒（{stats['rows_per_sec']} 条/秒）
+各进程吞吐量:
+{worker_lines}----------------------------------------------
+"""
+    try:
+        with open(log_file_name, 'a', encoding='utf-8') as f:
+            f.write(log_content)
+        print(f"统计信息已成功追加到文件：{log_file_name}")
+    except Exception as e:
+        print(f"错误：无法写入日志文件。原因: {e}")
+
+
+if __name__ == '__main__':
+    from pipeline import clean_all
+
+    parser = argparse.ArgumentParser(description='清理合并结果中的正文（配置见 pipeline_config.py 中的文本清理配置）')
+    parser.add_argument('--workers', type=int, default=None, help='进程数，默认为 CPU 核数')
+    parser.add_argument('--chunk-rows', type=int, default=None, help='每个任务处理的行数')
+    args = parser.parse_args()
+    clean_all(workers=args.workers, chunk_rows=args.chunk_rows)
@@ -0,0 +1,407 @@
+import argparse
+import importlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from keyword_index import read_segment, segment_parts, tokenize
+from process_pool import ordered_map
+
+FORMAT_VERSION = 1
+_NAT_KEY = np.iinfo(np.int64).max
+# 编号 0 保留给词表之外的词（出现次数低于 min_count 或超出 max_size 的词）
+UNKNOWN = '<unk>'
+# 每次分词的文章数，限制分词时临时列表的大小
+_CHUNK_DOCS = 5000
+# 把局部编号换成全局编号时每次处理的词数
+_REMAP_TOKENS = 1 << 24
+
+META_FILE = 'meta.json'
+VOCAB_FILE = 'vocab.json'
+COUNTS_FILE = 'vocab_counts.npy'
+SHARD_DIR = 'shards'
+_WORK_DIR = 'work'
+
+
+def split_whitespace(text):
+    """按空白切分，保留大小写和标点"""
+    return text.split() if isinstance(text, str) else []
+
+
+# 内置的分词方式：words 与关键词索引、近似去重相同（小写的连续字母、数字和下划线），whitespace 按空白切分。
+# 其他分词函数以 '模块:函数名' 指定，函数接受一篇正文（缺失值为 None 或 NaN），返回词（字符串）的列表
+TOKENIZERS = {'words': tokenize, 'whitespace': split_whitespace}
+
+
+def resolve_tokenizer(spec):
+    """分词方式：内置名称（见 TOKENIZERS）、'模块:函数名' 或函数本身，返回 (名称, 函数)"""
+    if callable(spec):
+        return f'{spec.__module__}:{spec.__qualname__}', spec
+    if spec in TOKENIZERS:
+        return spec, TOKENIZERS[spec]
+    module_name, _, function_name = spec.partition(':')
+    if not function_name:
+        raise ValueError(f"未知的分词方式: {spec}（可选 {list(TOKENIZERS)}，或以 '模块:函数名' 指定）")
+    return spec, getattr(importlib.import_module(module_name), function_name)
+
+
+def _shard_paths(directory, name):
+    shard_dir = os.path.join(directory, SHARD_DIR)
+    return {kind: os.path.join(shard_dir, f'{name}.{kind}.npy') for kind in ('tokens', 'offsets', 'dates')}
+
+
+def _work_path(directory, name):
+    return os.path.join(directory, _WORK_DIR, f'{name}.u32')
+
+
+def _tokenize_worker(args):
+    """
+    在子进程中读取一段（一年）的正文并分词。词按本段中第一次出现的顺序编号（局部编号），
+    编号序列写入临时文件；返回排序键、每篇的词数、本段的词表和各词的出现次数，由主进程合并为全局词表
+    """
+    directory, name, input_format, input_path, part, tokenizer = args
+    start = time.perf_counter()
+    keys, texts, _ = read_segment(input_format, input_path, part, with_digests=False)
+    tokenize_text = resolve_tokenizer(tokenizer)[1]
+    vocab = {}
+    counts = np.zeros(0, dtype=np.int64)
+    lengths = np.zeros(len(keys), dtype=np.int64)
+    with open(_work_path(directory, name), 'wb') as f:
+        for base in range(0, len(texts), _CHUNK_DOCS):
+            token_lists = [tokenize_text(text) for text in texts[base:base + _CHUNK_DOCS]]
+            chunk_lengths = np.fromiter(map(len, token_lists), dtype=np.int64, count=len(token_lists))
+            lengths[base:base + len(token_lists)] = chunk_lengths
+            flat = np.empty(int(chunk_lengths.sum()), dtype=object)
+            flat[:] = [token for tokens in token_lists for token in tokens]
+            # 先在这一批中分类，只对不同的词查词表
+            codes, uniques = pd.factorize(flat)
+            local = np.fromiter((vocab.setdefault(token, len(vocab)) for token in uniques), dtype=np.uint32,
+                                count=len(uniques))
+            ids = local[codes]
+            f.write(ids.astype('<u4').tobytes())
+            counts = np.concatenate([counts, np.zeros(len(vocab) - len(counts), dtype=np.int64)])
+            counts += np.bincount(ids, minlength=len(vocab))
+    return name, keys, lengths, list(vocab), counts, round(time.perf_counter() - start, 2)
+
+
+def _remap_worker(args):
+    """在子进程中把一段的局部编号换成全局编号，写出词元数组（.npy，可以内存映射读取），并删除临时文件"""
+    directory, name, mapping = args
+    work_path = _work_path(directory, name)
+    tokens_path = _shard_paths(directory, name)['tokens']
+    total = os.path.getsize(work_path) // 4
+    if not total:
+        # 长度为 0 的文件无法内存映射
+        _save_array(tokens_path, np.zeros(0, dtype=np.uint32))
+    else:
+        local = np.memmap(work_path, dtype='<u4', mode='r')
+        tokens = np.lib.format.open_memmap(tokens_path + '.tmp', mode='w+', dtype=np.uint32, shape=(total,))
+        for base in range(0, total, _REMAP_TOKENS):
+            tokens[base:base + _REMAP_TOKENS] = mapping[local[base:base + _REMAP_TOKENS]]
+        tokens.flush()
+        del tokens, local
+        os.replace(tokens_path + '.tmp', tokens_path)
+    os.remove(work_path)
+    return name, total
+
+
+def _build_vocabulary(segment_vocabs, min_count, max_size):
+    """
+    把各段的词表合并为全局词表：按总出现次数从多到少编号（次数相同时按词排序，结果与分段方式无关），编号 0 为 UNKNOWN。
+    返回 (词表, 各词的出现次数, 各段从局部编号到全局编号的映射)
+    """
+    terms = np.empty(sum(len(terms) for terms, _ in segment_vocabs), dtype=object)
+    terms[:] = [term for segment_terms, _ in segment_vocabs for term in segment_terms]
+    codes, uniques = pd.factorize(terms)
+    totals = (np.bincount(codes, weights=np.concatenate([counts for _, counts in segment_vocabs]),
+                          minlength=len(uniques)).astype(np.int64) if len(terms) else np.zeros(0, np.int64))
+    table = pd.DataFrame({'term': np.asarray(uniques, dtype=object), 'count': totals})
+    order = table.sort_values(['count', 'term'], ascending=[False, True], kind='mergesort').index.to_numpy()
+    kept = order[totals[order] >= min_count]
+    if max_size is not None:
+        kept = kept[:max(max_size - 1, 0)]
+    global_ids = np.zeros(len(uniques), dtype=np.uint32)
+    global_ids[kept] = np.arange(1, len(kept) + 1, dtype=np.uint32)
+    vocab = [UNKNOWN] + table['term'].to_numpy()[kept].tolist()
+    vocab_counts = np.concatenate([[int(totals.sum() - totals[kept].sum())], totals[kept]]).astype(np.int64)
+    mappings, start = [], 0
+    for segment_terms, _ in segment_vocabs:
+        mappings.append(global_ids[codes[start:start + len(segment_terms)]])
+        start += len(segment_terms)
+    return vocab, vocab_counts, mappings
+
+
+def _save_array(path, array):
+    with open(path + '.tmp', 'wb') as f:
+        np.save(f, array)
+    os.replace(path + '.tmp', path)
+
+
+def _save_json(path, value, indent=None):
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(value, f, ensure_ascii=False, indent=indent)
+    os.replace(path + '.tmp', path)
+
+
+def _load_meta(directory):
+    try:
+        with open(os.path.join(directory, META_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def export_tokens(input_format, input_path, directory, tokenizer='words', min_count=1, max_size=None, workers=None,
+                  log_file_name='processing_log.txt'):
+    """
+    把合并（或清理）结果的正文分词后导出为按年份分片的词元数组，input_format 为 'parquet' 或 'store'
+    （CSV 没有按年份划分的结构，不支持）。分三步：
+    1. 各年份在进程池中并行读取正文、分词，词按本段中第一次出现的顺序编号，编号序列写入临时文件；
+    2. 主进程把各段的词表合并为全局词表（按出现次数编号，min_count / max_size 之外的词编号为 0，即 UNKNOWN）；
+    3. 各年份在进程池中把局部编号换成全局编号，写出 shards/<年份>.tokens.npy（uint32，全部文章的词首尾相接）、
+       .offsets.npy（int64，第 i 篇为 tokens[offsets[i]:offsets[i + 1]]）和 .dates.npy（int64 排序键，缺失日期为 int64 最大值）。
+    全局编号取决于全部语料，每次导出都重新处理所有年份。返回统计信息字典，并向日志追加一段导出日志。
+    """
+    if input_format not in ('parquet', 'store'):
+        raise ValueError(f"不支持的导出输入格式: {input_format}")
+    tokenizer_name, _ = resolve_tokenizer(tokenizer)
+    workers = workers or os.cpu_count() or 1
+    start = time.time()
+    os.makedirs(os.path.join(directory, SHARD_DIR), exist_ok=True)
+    shutil.rmtree(os.path.join(directory, _WORK_DIR), ignore_errors=True)
+    os.makedirs(os.path.join(directory, _WORK_DIR))
+
+    parts = segment_parts(input_format, input_path)
+    print(f"正在用 {workers} 个进程把 {input_path} 分词导出为词元数组（{len(parts)} 个年份，分词方式 {tokenizer_name}），"
+          f"结果写入 {directory}...")
+    tasks = [(directory, name, input_format, input_path, part, tokenizer) for name, part in parts]
+    tokenized = list(ordered_map(_tokenize_worker, tasks, min(workers, len(tasks))))
+    tokenize_seconds = round(time.time() - start, 2)
+
+    vocab_start = time.time()
+    vocab, vocab_counts, mappings = _build_vocabulary([(terms, counts) for _, _, _, terms, counts, _ in tokenized],
+                                                      min_count, max_size)
+    shards = []
+    for name, keys, lengths, terms, _, seconds in tokenized:
+        paths = _shard_paths(directory, name)
+        _save_array(paths['offsets'], np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64))
+        _save_array(paths['dates'], np.asarray(keys, dtype=np.int64))
+        dated = keys[keys != _NAT_KEY]
+        shards.append({'name': name, 'rows': len(keys), 'tokens': int(lengths.sum()), 'terms': len(terms),
+                       'first': int(dated[0]) if len(dated) else None, 'last': int(dated[-1]) if len(dated) else None,
+                       'seconds': seconds})
+    _save_json(os.path.join(directory, VOCAB_FILE), vocab)
+    _save_array(os.path.join(directory, COUNTS_FILE), vocab_counts)
+    vocab_seconds = round(time.time() - vocab_start, 2)
+
+    remap_tasks = [(directory, name, mapping) for (name, *_), mapping in zip(tokenized, mappings)]
+    list(ordered_map(_remap_worker, remap_tasks, min(workers, len(remap_tasks))))
+    current = {shard['name'] for shard in shards}
+    for file_name in os.listdir(os.path.join(directory, SHARD_DIR)):
+        if file_name.split('.')[0] not in current:
+            os.remove(os.path.join(directory, SHARD_DIR, file_name))
+    os.rmdir(os.path.join(directory, _WORK_DIR))
+    meta = {'version': FORMAT_VERSION, 'input': {'format': input_format, 'path': input_path},
+            'tokenizer': tokenizer_name, 'min_count': min_count, 'max_size': max_size, 'vocab_size': len(vocab),
+            'rows': sum(shard['rows'] for shard in shards), 'tokens': sum(shard['tokens'] for shard in shards),
+            'shards': shards}
+    _save_json(os.path.join(directory, META_FILE), meta, indent=1)
+
+    stats = {'input': input_path, 'output': directory, 'tokenizer': tokenizer_name, 'workers': workers,
+             'rows': meta['rows'], 'tokens': meta['tokens'], 'vocab_size': len(vocab),
+             'unknown_tokens': int(vocab_counts[0]), 'shards': len(shards),
+             'bytes': sum(os.path.getsize(path) for name in current for path in _shard_paths(directory, name).values()),
+             'tokenize_seconds': tokenize_seconds, 'vocab_seconds': vocab_seconds,
+             'seconds': round(time.time() - start, 2)}
+    stats['tokens_per_sec'] = round(stats['tokens'] / stats['seconds']) if stats['seconds'] else None
+    for shard in shards:
+        print(f"    {shard['name']}: {shard['rows']} 篇，{shard['tokens']} 个词，{shard['terms']} 个不同的词，"
+              f"分词耗时 {shard['seconds']} 秒")
+    print(f"词元导出完成：共 {stats['rows']} 篇、{stats['tokens']} 个词，词表 {stats['vocab_size']} 个词，"
+          f"{stats['bytes'] / 1024 / 1024:.1f} MB，耗时 {stats['seconds']} 秒（{stats['tokens_per_sec']} 词/秒）。")
+    _append_export_log(log_file_name, stats)
+    return stats
+
+
+def _append_export_log(log_file_name, stats):
+    """将词元导出的统计信息追加到日志文件"""
+    current_time = time.strftime("%Y-%m-%d %H:%M:%S")
+    log_content = f"""
+
+==================================================
+词元导出日志
+==================================================
+处理时间: {current_time}
+输入: {stats['input']}
+输出: {stats['output']}
+分词方式: {stats['tokenizer']}
+进程数: {stats['workers']}
+
+------------------ 统计摘要 ------------------
+文章数: {stats['rows']}
+词数: {stats['tokens']}（其中词表之外 {stats['unknown_tokens']}）
+词表大小: {stats['vocab_size']}
+分片数（按年份）: {stats['shards']}
+词元数组大小: {stats['bytes'] / 1024 / 1024:.1f} MB
+分词耗时: {stats['tokenize_seconds']} 秒，合并词表耗时: {stats['vocab_seconds']} 秒
+处理耗时: {stats['seconds']} 秒（{stats['tokens_per_sec']} 词/秒）
+----------------------------------------------
+"""
+    try:
+        with open(log_file_name, 'a', encoding='utf-8') as f:
+            f.write(log_content)
+        print(f"统计信息已成功追加到文件：{log_file_name}")
+    except Exception as e:
+        print(f"错误：无法写入日志文件。原因: {e}")
+
+
+class TokenBlock:
+    """
+    一个分片中日期范围内的文章：dates 为排序键（int64 纳秒，缺失为 int64 最大值），
+    第 i 篇的词编号为 tokens[offsets[i]:offsets[i + 1]]。tokens 为整个分片的内存映射数组，offsets 为分片内的位置，
+    都不复制数据；stream() 为这些文章的词首尾相接的一段（同样是内存映射的视图）
+    """
+
+    def __init__(self, name, dates, offsets, tokens):
+        self.name = name
+        self.dates = dates
+        self.offsets = offsets
+        self.tokens = tokens
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __getitem__(self, i):
+        return self.tokens[self.offsets[i]:self.offsets[i + 1]]
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def stream(self):
+        return self.tokens[self.offsets[0]:self.offsets[-1]]
+
+
+class TokenCorpus:
+    """
+    以内存映射方式打开 export_tokens 导出的词元数组，不需要读取或重新分词正文：
+    corpus = TokenCorpus('final_all_news_tokens')
+    for block in corpus.blocks('2020-01-01', '2020-06-30'):   # 每个年份一块（TokenBlock）
+        model.feed(block.stream(), block.offsets - block.offsets[0])
+    for date, ids in corpus.documents('2020-01-01', '2020-01-31'): ...   # 逐篇遍历
+    corpus.decode(ids) 把编号还原为词，corpus.encode(words) 查词的编号（词表之外为 0）。
+    只有日期的 end 包含当天；指定了日期范围时缺失日期的文章不在任何范围内，不指定时全部文章都遍历（缺失日期的在最后）。
+    """
+
+    def __init__(self, directory):
+        self.path = directory
+        meta = _load_meta(directory)
+        if meta is None:
+            raise FileNotFoundError(f"找不到词元数组: {directory}")
+        if meta.get('version') != FORMAT_VERSION:
+            raise ValueError(f"词元数组的格式版本 {meta.get('version')} 与当前版本 {FORMAT_VERSION} 不同，请重新导出")
+        self.meta = meta
+        self.shards = meta['shards']
+        self._arrays = {}
+        self._vocab = None
+        self._ids = None
+
+    def __len__(self):
+        return self.meta['rows']
+
+    @property
+    def vocab(self):
+        """词表（列表，下标为编号）"""
+        if self._vocab is None:
+            with open(os.path.join(self.path, VOCAB_FILE), encoding='utf-8') as f:
+                self._vocab = json.load(f)
+        return self._vocab
+
+    def vocab_counts(self):
+        """各词在全部语料中的出现次数（下标为编号，编号 0 为词表之外的词的总数）"""
+        return np.load(os.path.join(self.path, COUNTS_FILE), mmap_mode='r')
+
+    def encode(self, words):
+        if self._ids is None:
+            self._ids = {word: i for i, word in enumerate(self.vocab)}
+        return np.array([self._ids.get(word, 0) for word in words], dtype=np.uint32)
+
+    def decode(self, ids):
+        vocab = self.vocab
+        return [vocab[i] for i in np.asarray(ids).tolist()]
+
+    def _shard(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = {kind: np.load(path, mmap_mode='r')
+                                  for kind, path in _shard_paths(self.path, name).items()}
+        return self._arrays[name]
+
+    def blocks(self, start=None, end=None):
+        """依次产出与日期范围相交的各分片中范围内的文章（TokenBlock），没有文章的分片跳过"""
+        low = pd.Timestamp(start).value if start is not None else None
+        high = None
+        if end is not None:
+            end = pd.Timestamp(end)
+            high = (end + pd.Timedelta(days=1)).value if end == end.normalize() else end.value + 1
+        ranged = low is not None or high is not None
+        for shard in self.shards:
+            if ranged and (shard['first'] is None or (low is not None and shard['last'] < low)
+                           or (high is not None and shard['first'] >= high)):
+                continue
+            arrays = self._shard(shard['name'])
+            dates = arrays['dates']
+            # 分片内按日期排列，缺失日期（int64 最大值）在最后
+            first = int(np.searchsorted(dates, low)) if low is not None else 0
+            last = int(np.searchsorted(dates, min(high, _NAT_KEY) if high is not None else _NAT_KEY)) if ranged \
+                else len(dates)
+            if last > first:
+                yield TokenBlock(shard['name'], dates[first:last], arrays['offsets'][first:last + 1], arrays['tokens'])
+
+    def documents(self, start=None, end=None):
+        """逐篇产出 (日期, 词编号)，词编号为内存映射数组的视图；缺失日期为 NaT"""
+        for block in self.blocks(start, end):
+            for i, key in enumerate(block.dates.tolist()):
+                yield (pd.NaT if key == _NAT_KEY else pd.Timestamp(key)), block[i]
+
+
+if __name__ == '__main__':
+    import pipeline_config as config
+
+    parser = argparse.ArgumentParser(description='把合并结果分词导出为按年份分片的词元数组，或查看已导出的词元数组')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='导出词元数组，配置见 pipeline_config.py')
+    build_parser.add_argument('--workers', type=int, default=None, help='进程数，默认为 CPU 核数')
+    build_parser.add_argument('--tokenizer', default=None, help="分词方式：words、whitespace 或 '模块:函数名'")
+    show_parser = subparsers.add_parser('show', help='统计日期范围内的文章数和词数，并显示第一篇文章的开头')
+    show_parser.add_argument('--start', default=None, help='起始日期（包含）')
+    show_parser.add_argument('--end', default=None, help='结束日期（包含当天）')
+    show_parser.add_argument('--dir', default=config.token_export_dir, help='词元数组目录')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        from pipeline import export_token_shards
+
+        export_token_shards(workers=args.workers, tokenizer=args.tokenizer)
+    else:
+        try:
+            corpus = TokenCorpus(args.dir)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"错误：{e}")
+            raise SystemExit(1)
+        scan_start = time.perf_counter()
+        docs, tokens, first_block = 0, 0, None
+        for token_block in corpus.blocks(args.start, args.end):
+            docs += len(token_block)
+            tokens += int(token_block.offsets[-1] - token_block.offsets[0])
+            if first_block is None:
+                first_block = token_block
+        elapsed = (time.perf_counter() - scan_start) * 1000
+        print(f"词表 {corpus.meta['vocab_size']} 个词（分词方式 {corpus.meta['tokenizer']}）；"
+              f"范围内 {docs} 篇文章、{tokens} 个词，耗时 {elapsed:.1f} 毫秒。")
+        if first_block is not None:
+            key = int(first_block.dates[0])
+            date = '日期缺失' if key == _NAT_KEY else pd.Timestamp(key).date()
+            print(f"[{date}] {' '.join(corpus.decode(first_block[0][:30]))}")
@@ -0,0 +1,291 @@
+import array
+import datetime
+import mmap
+import re
+import tempfile
+import zipfile
+import xml.etree.ElementTree as ET
+
+import pandas as pd
+
+# xlsx 文件中使用的 XML 命名空间
+NS_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+NS_PKG_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+# Excel 内置的日期/时间数字格式编号
+BUILTIN_DATE_FORMATS = set(range(14, 23)) | set(range(27, 37)) | {45, 46, 47} | set(range(50, 59))
+
+# 默认每批返回的行数
+DEFAULT_BATCH_SIZE = 50000
+
+# 与 pd.read_excel 默认行为保持一致：这些字符串会被识别为缺失值
+NA_STRINGS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+}
+
+
+def _column_index(cell_ref):
+    """将单元格引用（如 'AB12'）中的列字母转换为从 0 开始的列号"""
+    index = 0
+    for char in cell_ref:
+        if 'A' <= char <= 'Z':
+            index = index * 26 + (ord(char) - 64)
+        else:
+            break
+    return index - 1
+
+
+def _is_date_format(format_code):
+    """判断自定义数字格式是否为日期格式"""
+    # 去掉引号中的文字、方括号中的颜色/区域设置以及转义字符后再判断
+    code = re.sub(r'"[^"]*"|\[[^\]]*\]|\\.', '', format_code)
+    return re.search(r'[dmyhs]', code, flags=re.IGNORECASE) is not None
+
+
+class _SharedStrings:
+    """共享字符串表，写入磁盘临时文件并通过内存映射按需读取，避免整表常驻内存"""
+
+    def __init__(self, archive, member):
+        self._offsets = array.array('Q', [0])
+        self._file = tempfile.TemporaryFile()
+        self._map = None
+        if member is None:
+            return
+        with archive.open(member) as source:
+            root = None
+            for event, elem in ET.iterparse(source, events=('start', 'end')):
+                if event == 'start':
+                    if root is None:
+                        root = elem
+                    continue
+                if elem.tag != NS_MAIN + 'si':
+                    continue
+                # 富文本由多个 <r><t> 片段组成，注音 <rPh> 中的文字不属于正文
+                parts = [t.text or '' for t in elem.iter(NS_MAIN + 't')]
+                phonetic = [t.text or '' for ph in elem.iter(NS_MAIN + 'rPh') for t in ph.iter(NS_MAIN + 't')]
+                if phonetic:
+                    parts = parts[:len(parts) - len(phonetic)]
+                data = ''.join(parts).encode('utf-8')
+                self._file.write(data)
+                self._offsets.append(self._offsets[-1] + len(data))
+                root.clear()
+        self._file.flush()
+        if self._offsets[-1] > 0:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        start, end = self._offsets[index], self._offsets[index + 1]
+        if start == end:
+            return ''
+        return self._map[start:end].decode('utf-8')
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+
+def _read_styles(archive):
+    """读取 styles.xml，返回每个单元格样式是否为日期格式的列表"""
+    try:
+        root = ET.fromstring(archive.read('xl/styles.xml'))
+    except KeyError:
+        return []
+    custom_formats = {}
+    num_fmts = root.find(NS_MAIN + 'numFmts')
+    if num_fmts is not None:
+        for num_fmt in num_fmts.findall(NS_MAIN + 'numFmt'):
+            custom_formats[int(num_fmt.get('numFmtId'))] = num_fmt.get('formatCode', '')
+    date_styles = []
+    cell_xfs = root.find(NS_MAIN + 'cellXfs')
+    if cell_xfs is not None:
+        for xf in cell_xfs.findall(NS_MAIN + 'xf'):
+            fmt_id = int(xf.get('numFmtId', 0))
+            if fmt_id in custom_formats:
+                date_styles.append(_is_date_format(custom_formats[fmt_id]))
+            else:
+                date_styles.append(fmt_id in BUILTIN_DATE_FORMATS)
+    return date_styles
+
+
+def _locate_sheet(archive, sheet_index):
+    """根据 workbook.xml 及其关系文件找到第 sheet_index 个工作表的路径，并返回是否使用 1904 日期系统"""
+    workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+    workbook_pr = workbook.find(NS_MAIN + 'workbookPr')
+    date1904 = workbook_pr is not None and workbook_pr.get('date1904') in ('1', 'true')
+
+    sheets = workbook.find(NS_MAIN + 'sheets')
+    sheet_list = [] if sheets is None else sheets.findall(NS_MAIN + 'sheet')
+    if sheet_index >= len(sheet_list):
+        raise ValueError(f"工作簿中只有 {len(sheet_list)} 个工作表，无法读取第 {sheet_index + 1} 个。")
+    rel_id = sheet_list[sheet_index].get(NS_REL + 'id')
+
+    rels = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    for rel in rels.findall(NS_PKG_REL + 'Relationship'):
+        if rel.get('Id') == rel_id:
+            target = rel.get('Target')
+            if target.startswith('/'):
+                return target.lstrip('/'), date1904
+            return 'xl/' + target, date1904
+    return f'xl/worksheets/sheet{sheet_index + 1}.xml', date1904
+
+
+def _iter_sheet_rows(path, sheet_index=0):
+    """
+    逐行解析工作表 XML，每次产出一行的单元格值列表（缺失单元格为 None）。
+    与 pd.read_excel 相同：XML 中省略的行作为空行产出，末尾没有任何内容的行（如只设置了格式的行）不产出。
+    """
+    with zipfile.ZipFile(path) as archive:
+        names = set(archive.namelist())
+        sheet_member, date1904 = _locate_sheet(archive, sheet_index)
+        shared = _SharedStrings(archive, 'xl/sharedStrings.xml' if 'xl/sharedStrings.xml' in names else None)
+        date_styles = _read_styles(archive)
+        epoch = datetime.datetime(1904, 1, 1) if date1904 else datetime.datetime(1899, 12, 30)
+
+        def convert(cell):
+            cell_type = cell.get('t', 'n')
+            if cell_type == 'inlineStr':
+                return ''.join(t.text or '' for t in cell.iter(NS_MAIN + 't'))
+            value_elem = cell.find(NS_MAIN + 'v')
+            if value_elem is None or value_elem.text is None:
+                return None
+            text = value_elem.text
+            if cell_type == 's':
+                return shared[int(text)]
+            if cell_type in ('str', 'e'):
+                return text
+            if cell_type == 'b':
+                return text == '1'
+            if cell_type == 'd':
+                return pd.Timestamp(text).to_pydatetime()
+            # 数值单元格：若样式为日期格式，则按 Excel 序列号转换为日期
+            style = int(cell.get('s', 0))
+            if style < len(date_styles) and date_styles[style]:
+                return epoch + datetime.timedelta(days=float(text))
+            if any(char in text for char in '.eE'):
+                return float(text)
+            return int(text)
+
+        try:
+            with archive.open(sheet_member) as source:
+                sheet_data = None
+                # 已解析但尚未产出的空行数：后面还有内容时才补上，到表尾时丢弃
+                blank_rows = 0
+                row_number = 0
+                for event, elem in ET.iterparse(source, events=('start', 'end')):
+                    if event == 'start':
+                        if elem.tag == NS_MAIN + 'sheetData':
+                            sheet_data = elem
+                        continue
+                    if elem.tag != NS_MAIN + 'row':
+                        continue
+                    ref = elem.get('r')
+                    number = int(ref) if ref else row_number + 1
+                    blank_rows += number - row_number - 1
+                    row_number = number
+                    values = []
+                    next_col = 0
+                    for cell in elem.findall(NS_MAIN + 'c'):
+                        ref = cell.get('r')
+                        col = _column_index(ref) if ref else next_col
+                        if col >= len(values):
+                            values.extend([None] * (col + 1 - len(values)))
+                        values[col] = convert(cell)
+                        next_col = col + 1
+                    if all(value is None or value == '' for value in values):
+                        blank_rows += 1
+                    else:
+                        for _ in range(blank_rows):
+                            yield []
+                        blank_rows = 0
+                        yield values
+                    # 处理完的行立即从树中移除，保证内存占用不随行数增长
+                    if sheet_data is not None:
+                        sheet_data.clear()
+                    else:
+                        elem.clear()
+        finally:
+            shared.close()
+
+
+def _cell_or_nan(values, index):
+    """取出一行中的某个单元格，缺失值统一为 NaN（与 pd.read_excel 一致）"""
+    if index >= len(values):
+        return float('nan')
+    value = values[index]
+    if value is None or (isinstance(value, str) and value in NA_STRINGS):
+        return float('nan')
+    return value
+
+
+def iter_xlsx_batches(path, usecols=None, header=False, names=None, batch_size=DEFAULT_BATCH_SIZE, sheet_index=0):
+    """
+    以流式方式读取 xlsx 工作表，按固定行数分批产出 DataFrame。
+
+    - header=False 时，usecols 为列号列表（如 [0, 1, 2]）；
+    - header=True 时，第一行作为列名，usecols 可以是列名列表，为 None 时读取全部列；
+    - names 用于为输出的列重新命名。
+
+    每批的列均为 object 类型，保证不同批次中同一取值的类型一致。
+    """
+    rows = _iter_sheet_rows(path, sheet_index)
+    columns = None
+    indices = None
+
+    if header:
+        header_row = next(rows, None)
+        if header_row is None:
+            return
+        header_names = [f'Unnamed: {i}' if value is None else str(value) for i, value in enumerate(header_row)]
+        if usecols is None:
+            indices = list(range(len(header_names)))
+        else:
+            missing = [col for col in usecols if col not in header_names]
+            if missing:
+                raise KeyError(f"工作表中缺少列: {missing}，现有列为: {header_names}")
+            indices = [header_names.index(col) for col in usecols]
+        columns = [header_names[i] for i in indices]
+    elif usecols is not None:
+        indices = list(usecols)
+        columns = indices
+
+    if names is not None:
+        columns = list(names)
+
+    buffer = []
+    for values in rows:
+        if indices is None:
+            # 未指定列时，以第一行的宽度作为列数
+            indices = list(range(len(values)))
+            columns = indices if names is None else columns
+        buffer.append([_cell_or_nan(values, i) for i in indices])
+        if len(buffer) >= batch_size:
+            yield pd.DataFrame(buffer, columns=columns, dtype=object)
+            buffer = []
+    if buffer:
+        yield pd.DataFrame(buffer, columns=columns, dtype=object)
+
+
+def count_xlsx_rows(path, sheet_index=0):
+    """统计工作表的行数（流式遍历，不保存任何单元格内容）"""
+    return sum(1 for _ in _iter_sheet_rows(path, sheet_index))
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) < 2:
+        print("用法: python xlsx_stream.py <xlsx 文件路径> [每批行数]")
+        sys.exit(1)
+    file_name = sys.argv[1]
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_BATCH_SIZE
+    total = 0
+    for batch_number, batch in enumerate(iter_xlsx_batches(file_name, batch_size=size), start=1):
+        total += len(batch)
+        print(f"第 {batch_number} 批: {len(batch)} 行，累计 {total} 行")
+    print(f"读取完成，共 {total} 行。")